@@ -4,6 +4,8 @@ from __future__ import absolute_import, division, print_function
 
 from warnings import warn
 
+from .headers import ImageInfo, probe
+
 
 def get_image_class(backend):
     """
@@ -13,17 +15,30 @@ def get_image_class(backend):
 
     Callers must be prepared to handle ImportErrors when a given backend
     cannot be loaded and KeyError when an unknown backend is requested
+
+    The native backends only check that their library can be found: it is
+    loaded and initialized when the first image is opened. Call the backend
+    module's ``initialize()`` to do that earlier.
+
+    "auto" returns a class whose open() sniffs each image's format and uses
+    the fastest available backend for it: see :mod:`NativeImaging.routing`
     """
 
-    if backend == "aware":
-        from .backends.aware import AwareImage
+    if backend == "auto":
+        from .routing import AutoImage
+        return AutoImage
+    elif backend == "aware":
+        from .backends.aware import AwareImage, library_path
+        library_path()
         return AwareImage
     if backend == "aware_cext":
         warn('The "aware_cext" backend should just be "aware"', DeprecationWarning)
-        from .backends.aware import AwareImage
+        from .backends.aware import AwareImage, library_path
+        library_path()
         return AwareImage
     elif backend.lower() == "graphicsmagick":
-        from .backends.GraphicsMagick import GraphicsMagickImage
+        from .backends.GraphicsMagick import GraphicsMagickImage, library_path
+        library_path()
         return GraphicsMagickImage
     elif backend.lower() == "java":
         from .backends.java import JavaImage
@@ -0,0 +1,195 @@
+# encoding: utf-8
+"""
+An asyncio facade for any backend
+
+Decoding, resizing and encoding run on a dedicated thread pool so they never
+block the event loop and the pool's size bounds how many native operations
+run at once::
+
+    from NativeImaging.aio import AsyncBackend
+
+    images = AsyncBackend("GraphicsMagick", max_workers=4)
+
+    async def make_thumbnail(data):
+        async with await images.open(memoryview(data)) as img:
+            await img.thumbnail((256, 256))
+            output = BytesIO()
+            await img.save(output, format="JPEG")
+            return output.getvalue()
+
+Cancelling a task which is waiting for an operation removes the operation
+from the queue if it hasn't started. Native calls which are already running
+cannot be interrupted but any image they return is closed as soon as they
+finish rather than when it is garbage-collected. Closing an AsyncImage while
+one of its operations is still running on the pool closes it once the last of
+them has finished.
+"""
+from __future__ import absolute_import, division, print_function
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from .batch import resolve_backend
+
+
+def _is_image(value):
+    return value is not None and hasattr(value, "save") and hasattr(value, "size")
+
+
+def _close_result(future):
+    """Closes the image returned by a future nobody is waiting for any more"""
+
+    if future.cancelled() or future.exception() is not None:
+        return
+
+    result = future.result()
+
+    if _is_image(result) and hasattr(result, "close"):
+        result.close()
+
+
+async def _wait(future):
+    """Awaits a concurrent.futures.Future from the backend's thread pool"""
+
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # wrap_future() will already have cancelled the job if it hadn't
+        # started; otherwise release whatever it produces immediately:
+        future.add_done_callback(_close_result)
+        raise
+
+
+class AsyncBackend(object):
+    """
+    Runs the image operations for a backend name or class on a pool of at most
+    max_workers threads
+    """
+
+    def __init__(self, backend="GraphicsMagick", max_workers=None):
+        self.image_class = resolve_backend(backend)
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="NativeImaging")
+
+    def _submit(self, func, *args, **kwargs):
+        return self._executor.submit(partial(func, *args, **kwargs))
+
+    async def run(self, func, *args, **kwargs):
+        """Awaits func(*args, **kwargs) run on the backend's thread pool"""
+
+        return await _wait(self._submit(func, *args, **kwargs))
+
+    async def open(self, fp, *args, **kwargs):
+        """Awaitable version of the backend's open(), returning an AsyncImage"""
+
+        image = await self.run(self.image_class.open, fp, *args, **kwargs)
+        return AsyncImage(self, image)
+
+    def close(self, wait=True):
+        """Shuts down the thread pool once any queued operations complete"""
+
+        self._executor.shutdown(wait=wait)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await asyncio.get_running_loop().run_in_executor(None, self.close)
+
+
+def _async_method(name):
+    async def method(self, *args, **kwargs):
+        return await self.call(name, *args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = "Awaitable version of :meth:`NativeImaging.api.Image.%s`" % name
+
+    return method
+
+
+class AsyncImage(object):
+    """
+    Wraps an image so its methods can be awaited. Methods which return a new
+    image return an AsyncImage wrapping it. The wrapped image is available as
+    the image attribute for anything which doesn't need to block.
+    """
+
+    def __init__(self, backend, image):
+        self.backend = backend
+        self.image = image
+
+        # Operations submitted to the pool which haven't finished, so close()
+        # can wait for them rather than freeing an image which is in use:
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._closing = False
+
+    def __repr__(self):
+        return "<%s %r>" % (self.__class__.__name__, self.image)
+
+    async def call(self, name, *args, **kwargs):
+        """Awaits the image method name on the backend's thread pool"""
+
+        future = self.backend._submit(getattr(self.image, name), *args, **kwargs)
+
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._finished)
+
+        result = await _wait(future)
+
+        if _is_image(result) and result is not self.image:
+            return AsyncImage(self.backend, result)
+        else:
+            return result
+
+    load = _async_method("load")
+    copy = _async_method("copy")
+    crop = _async_method("crop")
+    draft = _async_method("draft")
+    resize = _async_method("resize")
+    rotate = _async_method("rotate")
+    transpose = _async_method("transpose")
+    thumbnail = _async_method("thumbnail")
+    derivatives = _async_method("derivatives")
+    seek = _async_method("seek")
+    save = _async_method("save")
+
+    def _finished(self, future):
+        with self._lock:
+            self._pending.discard(future)
+            close = self._closing and not self._pending
+
+        if close:
+            self._close_image()
+
+    def _close_image(self):
+        close = getattr(self.image, "close", None)
+        if close is not None:
+            close()
+
+    def close(self):
+        """
+        Releases the wrapped image's native resources immediately or, if any
+        operation on it is still running, as soon as the last one finishes
+        """
+
+        with self._lock:
+            if self._closing:
+                return
+
+            self._closing = True
+            close = not self._pending
+
+        if close:
+            self._close_image()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
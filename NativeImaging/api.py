@@ -10,6 +10,8 @@ Backends are implemented by subclassing and actually doing something with the
 results
 """
 
+from io import BytesIO
+
 # Constants defined to match PIL:
 
 # transpose
@@ -49,6 +51,69 @@ NORMAL = 0
 SEQUENCE = 1
 CONTAINER = 2
 
+# The number of 8-bit samples per pixel for modes supported by the array
+# interface:
+ARRAY_MODE_BANDS = {
+    "L": 1,
+    "RGB": 3,
+    "RGBA": 4,
+    "RGBX": 4,
+    "CMYK": 4,
+}
+
+
+def fit_size(size, bounds):
+    """
+    Returns size scaled down to fit within bounds, preserving its aspect
+    ratio, as :meth:`Image.thumbnail` does
+    """
+
+    width, height = size
+
+    if width > bounds[0]:
+        height = max(height * bounds[0] // width, 1)
+        width = bounds[0]
+
+    if height > bounds[1]:
+        width = max(width * bounds[1] // height, 1)
+        height = bounds[1]
+
+    return (width, height)
+
+
+def save_derivatives(image, sizes, format="JPEG", destinations=None, resample=None,
+                     **save_options):
+    """
+    Saves a copy of image scaled to fit within each of sizes by resizing from
+    the largest to the smallest so each output is produced from the previous
+    one rather than the full-size image
+
+    Works with any object providing size, resize() and save(), including PIL
+    images. See :meth:`Image.derivatives` for the arguments.
+    """
+
+    targets = [fit_size(image.size, bounds) for bounds in sizes]
+    results = [None] * len(targets)
+
+    if destinations is not None and len(destinations) != len(targets):
+        raise ValueError("A destination is needed for each size")
+
+    resize_args = () if resample is None else (resample, )
+
+    for i in sorted(range(len(targets)), key=lambda i: targets[i], reverse=True):
+        if image.size != targets[i]:
+            image = image.resize(targets[i], *resize_args)
+
+        if destinations is None:
+            output = BytesIO()
+            image.save(output, format, **save_options)
+            results[i] = output.getvalue()
+        else:
+            image.save(destinations[i], format, **save_options)
+            results[i] = destinations[i]
+
+    return results
+
 
 class Image(object):
     """
@@ -73,6 +138,20 @@ class Image(object):
     def open(cls, fp, mode="r"):
         raise NotImplementedError()
 
+    def close(self):
+        """
+        Releases any native resources held by this image. Backends release
+        them when the image is garbage-collected but closing an image does so
+        immediately. The image cannot be used afterwards.
+        """
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
     def __repr__(self):
         return "%(module)s.%(classname)s(%(id)s) <%(width)sx%(height)s, mode=%(mode)s>" % {
             'module': self.__class__.__module__,
@@ -95,6 +174,70 @@ class Image(object):
     def tostring(self, encoder_name="raw", *args):
         raise NotImplementedError()
 
+    @property
+    def __array_interface__(self):
+        """
+        Allows numpy.asarray(image) and friends to use raw pixels from tostring()
+
+        Backends which can expose their pixel data without an intermediate
+        copy override this.
+        """
+
+        mode = self.mode or "RGB"
+        if mode not in ARRAY_MODE_BANDS:
+            raise ValueError("Mode %s is not supported by the array interface" % mode)
+
+        width, height = self.size
+        bands = ARRAY_MODE_BANDS[mode]
+
+        return {
+            "version": 3,
+            "shape": (height, width) if bands == 1 else (height, width, bands),
+            "typestr": "|u1",
+            "data": self.tostring("raw", mode),
+        }
+
+    @classmethod
+    def frombuffer(cls, mode, size, data, decoder_name="raw", *args):
+        """
+        Creates an image from raw pixel data in any object supporting the buffer
+        protocol, without copying it where possible
+        """
+        raise NotImplementedError()
+
+    @classmethod
+    def fromarray(cls, obj, mode=None):
+        """
+        Creates an image from a C-contiguous array of 8-bit samples such as a
+        numpy array with shape (height, width) or (height, width, bands)
+
+        :param obj: Any object with an ``__array_interface__``
+        :param mode: Optional mode. If omitted it is L, RGB or RGBA depending on
+            the number of bands.
+        :rtype: :class:Image object
+        """
+
+        interface = obj.__array_interface__
+        shape = interface["shape"]
+
+        if interface["typestr"][1:] != "u1":
+            raise ValueError("Arrays must contain 8-bit unsigned samples, not %s"
+                             % interface["typestr"])
+
+        if interface.get("strides") is not None:
+            raise ValueError("Arrays must be C-contiguous")
+
+        bands = shape[2] if len(shape) == 3 else 1
+
+        if mode is None:
+            mode = {1: "L", 3: "RGB", 4: "RGBA"}.get(bands)
+
+        if len(shape) not in (2, 3) or ARRAY_MODE_BANDS.get(mode) != bands:
+            raise ValueError("Cannot create a %s image from an array with shape %r"
+                             % (mode, shape))
+
+        return cls.frombuffer(mode, (shape[1], shape[0]), obj, "raw", mode, 0, 1)
+
     def tobitmap(self, name="image"):
         "Return image as an XBM bitmap"
         raise NotImplementedError()
@@ -517,6 +660,41 @@ class Image(object):
 
         raise NotImplementedError()
 
+    def derivatives(self, sizes, format="JPEG", destinations=None, resample=None,
+                    **save_options):
+        """
+        Creates a thumbnail of this image for each of sizes from a single decode
+
+        The image is drafted for the largest size, as :meth:`thumbnail` would,
+        and then repeatedly downscaled from the largest output to the smallest.
+        This image is not otherwise modified.
+
+        :param sizes: A sequence of (width, height) bounds
+        :param format: The output format
+        :param destinations: Optional filenames or file objects, one per size.
+            If omitted, the encoded images are returned.
+        :param resample: Optional resampling filter; defaults to ANTIALIAS.
+        :param save_options: Extra parameters to the image writer.
+        :return: A list of the encoded images or destinations in the same
+            order as sizes
+        """
+
+        if not sizes:
+            return []
+
+        largest = max(fit_size(self.size, bounds) for bounds in sizes)
+
+        try:
+            self.draft(self.mode, largest)
+        except NotImplementedError:
+            pass
+
+        if resample is None:
+            resample = getattr(self, "ANTIALIAS", ANTIALIAS)
+
+        return save_derivatives(self, sizes, format, destinations, resample,
+                                **save_options)
+
     def transform(self, size, method, data=None, resample=NEAREST, fill=1):
         """
         Transforms this image. This method creates a new image with the given
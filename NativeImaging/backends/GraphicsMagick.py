@@ -1,22 +1,196 @@
 # encoding: utf-8
 """
 An Image-compatible backend using GraphicsMagick
+
+GraphicsMagick is loaded and initialized the first time an image is opened or
+created rather than when this module is imported; call :func:`initialize` to
+control when that happens.
 """
 from __future__ import absolute_import, division, print_function
 
+import mmap
+import os
+import re
 import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from copy import deepcopy
+from importlib import import_module
 from io import FileIO
 
-from NativeImaging.api import Image
+from NativeImaging.api import ARRAY_MODE_BANDS, Image, fit_size
 
-from . import wand_wrapper
+from .lazy import LazyBinding, find_native_library, register_fork_handlers
+from .wand_common import FilterTypes, ImageTypes, ResourceTypes, StorageTypes
 
 if sys.version_info >= (3, ):
     basestring = str
 else:
     pass
 
+
+def _load_wand_binding():
+    """
+    Returns the module used to call GraphicsMagick
+
+    The NATIVEIMAGING_GM_BINDING environment variable may be set to "ctypes"
+    (wand_wrapper) or "cffi" (wand_cffi). By default CFFI is used on PyPy, where
+    it is much faster, if it is installed and ctypes everywhere else.
+    """
+
+    binding = os.environ.get("NATIVEIMAGING_GM_BINDING", "auto").lower()
+
+    if binding == "auto":
+        if sys.implementation.name == "pypy":
+            try:
+                return import_module(".wand_cffi", __package__)
+            except ImportError:
+                pass
+        binding = "ctypes"
+
+    if binding == "ctypes":
+        return import_module(".wand_wrapper", __package__)
+    elif binding == "cffi":
+        return import_module(".wand_cffi", __package__)
+    else:
+        raise ImportError("Unknown GraphicsMagick binding %s" % binding)
+
+
+def library_path():
+    """
+    Returns the path to the GraphicsMagickWand library without loading it,
+    raising ImportError if it cannot be found
+    """
+
+    return find_native_library("GraphicsMagickWand")
+
+
+def initialize():
+    """
+    Loads and initializes GraphicsMagick, returning the binding module
+
+    This happens automatically the first time it's needed so calling it is
+    only necessary to control when the cost is paid, e.g. while a server
+    starts, and repeated calls do nothing. Raises ImportError if GraphicsMagick
+    cannot be loaded.
+
+    Pre-fork servers should let each worker initialize GraphicsMagick after it
+    has forked. If the parent has already processed images, limit children to
+    ``set_resource_limits(threads=1)`` as GraphicsMagick's OpenMP thread pool
+    does not survive fork().
+    """
+
+    global wand_wrapper, PIXEL_PACKET_SIZE
+
+    if isinstance(wand_wrapper, LazyBinding):
+        with _initialize_lock:
+            if isinstance(wand_wrapper, LazyBinding):
+                binding = _load_wand_binding()
+                PIXEL_PACKET_SIZE = 4 * binding.MagickGetQuantumDepth() // 8
+                wand_wrapper = binding
+
+                configure_resources_from_environment()
+
+    return wand_wrapper
+
+
+def is_initialized():
+    """Returns whether GraphicsMagick has been loaded by initialize()"""
+
+    return not isinstance(wand_wrapper, LazyBinding)
+
+
+# Replaced with the binding module by initialize():
+wand_wrapper = LazyBinding(initialize)
+
+_initialize_lock = threading.Lock()
+
+RESOURCE_TYPES = {
+    "disk": ResourceTypes["DiskResource"],
+    "file": ResourceTypes["FileResource"],
+    "map": ResourceTypes["MapResource"],
+    "memory": ResourceTypes["MemoryResource"],
+    "pixels": ResourceTypes["PixelsResource"],
+    "threads": ResourceTypes["ThreadsResource"],
+    "width": ResourceTypes["WidthResource"],
+    "height": ResourceTypes["HeightResource"],
+}
+
+RESOURCE_ENVIRONMENT_PREFIX = "NATIVEIMAGING_GM_LIMIT_"
+
+_SIZE_SUFFIXES = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def _parse_limit(value):
+    """Converts values like 4096, "512MB" or "2GiB" into an integer"""
+
+    if isinstance(value, int):
+        return value
+
+    match = re.match(r"^\s*(\d+)\s*([KMGT]?)(?:i?B)?\s*$", value, re.IGNORECASE)
+    if not match:
+        raise ValueError("Invalid resource limit: %r" % value)
+
+    number, suffix = match.groups()
+    return int(number) * _SIZE_SUFFIXES[suffix.upper()]
+
+
+def set_resource_limits(**limits):
+    """
+    Sets process-wide GraphicsMagick resource limits
+
+    Keyword arguments are the keys of RESOURCE_TYPES: disk, map and memory are
+    in bytes (strings like "512MB" are accepted), threads controls the number
+    of OpenMP threads GraphicsMagick uses per operation and file, pixels,
+    width and height are counts. For example, to keep pixel caches in memory
+    and avoid competing with Python-level worker threads::
+
+        set_resource_limits(memory="4GB", map="8GB", threads=1)
+    """
+
+    for name, limit in limits.items():
+        if name not in RESOURCE_TYPES:
+            raise KeyError("Unknown GraphicsMagick resource %s" % name)
+
+        wand_wrapper.SetMagickResourceLimit(RESOURCE_TYPES[name], _parse_limit(limit))
+
+
+def get_resource_limits():
+    "Returns a dictionary of the current limit for each resource"
+
+    return dict((name, wand_wrapper.GetMagickResourceLimit(resource_type))
+                for name, resource_type in RESOURCE_TYPES.items())
+
+
+def get_resource_usage():
+    "Returns a dictionary of the amount of each resource currently in use"
+
+    return dict((name, wand_wrapper.GetMagickResource(resource_type))
+                for name, resource_type in RESOURCE_TYPES.items())
+
+
+def configure_resources_from_environment(environ=None):
+    """
+    Applies limits from NATIVEIMAGING_GM_LIMIT_<RESOURCE> environment variables,
+    e.g. NATIVEIMAGING_GM_LIMIT_MEMORY=2GB or NATIVEIMAGING_GM_LIMIT_THREADS=1
+
+    This is called automatically by :func:`initialize`. GraphicsMagick's
+    own MAGICK_LIMIT_* and OMP_NUM_THREADS variables are also honored.
+    """
+
+    if environ is None:
+        environ = os.environ
+
+    limits = {}
+    for name in RESOURCE_TYPES:
+        value = environ.get(RESOURCE_ENVIRONMENT_PREFIX + name.upper())
+        if value:
+            limits[name] = value
+
+    set_resource_limits(**limits)
+
+
 DEFAULT_ENCODING = sys.getdefaultencoding()
 FILESYSTEM_ENCODING = sys.getfilesystemencoding()
 
@@ -28,117 +202,1023 @@ def force_bytes(i):
         return i.encode(DEFAULT_ENCODING)
 
 
+_FILENAME = "filename"
+_BLOB = "blob"
+
+# The raw modes supported by readpixels() and writepixels() and the
+# GraphicsMagick pixel map for each. All use 8 bits per sample:
+RAW_MODES = {
+    "RGB": b"RGB",
+    "RGBA": b"RGBA",
+    "RGBX": b"RGBP",
+    "L": b"I",
+    "CMYK": b"CMYK",
+}
+
+
+# The array interface exports each type of image in a mode which keeps all of its
+# samples and which fromarray() will infer from the array's shape. Others,
+# including CMYK images, are exported as RGB:
+ARRAY_MODES = {
+    ImageTypes['BilevelType']: "L",
+    ImageTypes['GrayscaleType']: "L",
+    ImageTypes['GrayscaleMatteType']: "RGBA",
+    ImageTypes['PaletteMatteType']: "RGBA",
+    ImageTypes['TrueColorMatteType']: "RGBA",
+}
+
+# The quality search used by save(..., max_bytes=N) stops as soon as it finds an
+# output within this fraction of the limit:
+MAX_BYTES_TOLERANCE = 0.05
+
+# GraphicsMagick's DefaultCompressionQuality, which a new wand encodes with:
+DEFAULT_QUALITY = 75
+
+
+def _region_box(region, size=None):
+    """
+    Returns region as a (left, upper, right, lower) box of ints, checking that
+    it lies within an image of the given size if one is known
+    """
+
+    x0, y0, x1, y1 = (int(v) for v in region)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError("Invalid region %r" % (region, ))
+
+    if size is not None and (x0 < 0 or y0 < 0 or x1 > size[0] or y1 > size[1]):
+        raise ValueError("Region %r is outside the %dx%d image" % ((region, ) + tuple(size)))
+
+    return (x0, y0, x1, y1)
+
+
+def _pixel_map(rawmode):
+    try:
+        return RAW_MODES[rawmode]
+    except KeyError:
+        raise ValueError("Unsupported raw mode %s" % rawmode)
+
+
+def _raw_mode_args(codec_name, args, default_mode):
+    """Returns the raw mode from PIL-style "raw" codec arguments"""
+
+    if codec_name != "raw":
+        raise ValueError("Only the raw codec is supported, not %s" % codec_name)
+
+    if args[1:] not in ((), (0, ), (0, 1)):
+        raise ValueError("Only packed, top-to-bottom raw data is supported")
+
+    return args[0] if args else default_mode
+
+
+def _resize_wand(wand, width, height, resample):
+    """
+    Resizes the current image in wand using the cheapest method which honors
+    the requested resampling filter
+    """
+
+    if resample == GraphicsMagickImage.NEAREST:
+        wand_wrapper.MagickSampleImage(wand, width, height)
+    elif resample == GraphicsMagickImage.FAST:
+        wand_wrapper.MagickScaleImage(wand, width, height)
+    else:
+        wand_wrapper.MagickResizeImage(wand, width, height, resample, 1.0)
+
+
+class WandPool(object):
+    """
+    A bounded, thread-safe pool of reusable MagickWands
+
+    Assign an instance to GraphicsMagickImage.wand_pool to avoid allocating
+    and destroying a wand for every image, which is noticeable when processing
+    many small images. Wands are reset using ClearMagickWand before being
+    returned to the pool; any released while the pool is full are destroyed.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.discards = 0
+        self._wands = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._wands)
+
+    def acquire(self):
+        with self._lock:
+            if self._wands:
+                self.hits += 1
+                return self._wands.pop()
+            self.misses += 1
+
+        return wand_wrapper.NewMagickWand()
+
+    def release(self, wand):
+        wand_wrapper.ClearMagickWand(wand)
+
+        with self._lock:
+            if len(self._wands) < self.maxsize:
+                self._wands.append(wand)
+                return
+            self.discards += 1
+
+        wand_wrapper.DestroyMagickWand(wand)
+
+    def clear(self):
+        """Destroys all of the pooled wands"""
+
+        with self._lock:
+            wands, self._wands = self._wands, []
+
+        for wand in wands:
+            wand_wrapper.DestroyMagickWand(wand)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "discards": self.discards, "size": len(self._wands),
+                "maxsize": self.maxsize}
+
+    def _after_fork(self):
+        # Another thread may have held the lock when the process forked:
+        self._lock = threading.Lock()
+
+
+def _new_wand(pool):
+    if pool is None:
+        return wand_wrapper.NewMagickWand()
+    else:
+        return pool.acquire()
+
+
+def _destroy_wand(wand, pool):
+    if pool is None:
+        wand_wrapper.DestroyMagickWand(wand)
+    else:
+        pool.release(wand)
+
+
+# Each pixel in GraphicsMagick's pixel cache is a PixelPacket of four samples.
+# Their size depends on how GraphicsMagick was built and is set by initialize():
+PIXEL_PACKET_SIZE = None
+
+
+class MasterCache(object):
+    """
+    A bounded, thread-safe, process-wide LRU cache of decoded images
+
+    Assign an instance to GraphicsMagickImage.master_cache and open() will
+    decode each file once and return copy-on-write copies of the cached image
+    until the file changes or it is evicted, which makes repeatedly cropping
+    tiles from the same large master cheap. Only filenames are cached.
+
+    max_bytes limits the native pixel cache memory used by the cached images,
+    as opposed to the size of the Python objects. An evicted image's memory
+    is freed once no copies of it remain.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 ** 2):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def footprint(image):
+        """Returns the bytes of pixel cache memory used by a decoded image"""
+
+        width, height = image.size
+        return width * height * image.n_frames * PIXEL_PACKET_SIZE
+
+    def open(self, image_class, filename):
+        """Returns a copy of the decoded image for filename"""
+
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            # Let open() report the error:
+            return image_class._open(filename, lazy=False)
+
+        key = (image_class, os.path.abspath(filename), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            master = self._entries.get(key, (None, ))[0]
+
+            if master is not None:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+
+        if master is None:
+            master = image_class._open(filename, lazy=False)
+            self._insert(key, master)
+
+        return master.copy()
+
+    def _insert(self, key, image):
+        cost = self.footprint(image)
+
+        if cost > self.max_bytes:
+            return
+
+        # Evicted images are released when this returns, outside the lock:
+        evicted = []
+
+        with self._lock:
+            if key in self._entries:
+                # Another thread decoded it first:
+                return
+
+            self._entries[key] = (image, cost)
+            self._total_bytes += cost
+
+            while self._total_bytes > self.max_bytes:
+                old_key, (old_image, old_cost) = self._entries.popitem(last=False)
+                self._total_bytes -= old_cost
+                self.evictions += 1
+                evicted.append(old_image)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        requests = self.hits + self.misses
+
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / requests if requests else 0.0,
+                "evictions": self.evictions, "entries": len(self._entries),
+                "bytes": self._total_bytes, "max_bytes": self.max_bytes}
+
+    def _after_fork(self):
+        # Another thread may have held these locks when the process forked:
+        self._lock = threading.Lock()
+
+        for image, cost in self._entries.values():
+            image._shared.lock = threading.Lock()
+
+
+class _SharedWand(object):
+    """
+    A MagickWand shared by one or more copy-on-write GraphicsMagickImages
+
+    The lock guards the reference count and the output settings stored on the
+    wand by save(). If the wand belongs to a WandPool it is returned to it
+    when the last reference is released.
+    """
+
+    def __init__(self, wand, pool=None):
+        self.wand = wand
+        self.pool = pool
+        self.refs = 1
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            self.refs += 1
+        return self
+
+    def release(self):
+        with self.lock:
+            self.refs -= 1
+            last_reference = self.refs == 0
+
+        if last_reference:
+            _destroy_wand(self.wand, self.pool)
+            self.wand = None
+
+
 class GraphicsMagickImage(Image):
-    _wand = None
+    _shared = None
 
+    # open() reads bytearray, memoryview and mmap sources in place:
+    opens_buffers = True
+
+    # Set to a WandPool to reuse wands rather than allocating new ones:
+    wand_pool = None
+
+    # Set to a MasterCache to reuse decoded images opened from filenames:
+    master_cache = None
+
+    # Lazily-opened images keep their (_FILENAME | _BLOB, data) source here
+    # until they are loaded along with the attributes read from the header of
+    # each frame and any hints which should be applied when decoding:
+    _source = None
+    _header = None
+    _draft_size = None
+    _crop_box = None
+
+    # Multi-frame images track the current frame, the number of frames and
+    # either the filename source to read other frames from or, for blobs which
+    # can't be read a frame at a time, a _SharedWand holding every frame:
+    _frame = 0
+    _n_frames = None
+    _frames = None
+
+    # NEAREST uses point sampling and FAST uses GraphicsMagick's box-averaging
+    # scale, both of which are considerably faster than the filtered resize
+    # used for everything else. Any of wand_common.FilterTypes may also be
+    # used as a resample value.
     NONE = NEAREST = 0
-    ANTIALIAS = wand_wrapper.FilterTypes['LanczosFilter']
-    CUBIC = BICUBIC = wand_wrapper.FilterTypes['CubicFilter']
+    FAST = -1
+    LINEAR = BILINEAR = FilterTypes['TriangleFilter']
+    ANTIALIAS = FilterTypes['LanczosFilter']
+    CUBIC = BICUBIC = FilterTypes['CubicFilter']
 
     def __init__(self, magick_wand=None):
         if magick_wand is None:
-            self._wand = wand_wrapper.NewMagickWand()
-        else:
-            self._wand = magick_wand
-        assert self._wand, "NewMagickWand() failed???"
+            magick_wand = _new_wand(self.wand_pool)
+        assert magick_wand, "NewMagickWand() failed???"
+        self._shared = _SharedWand(magick_wand, self.wand_pool)
 
     def __del__(self):
-        if self._wand:
-            self._wand = wand_wrapper.DestroyMagickWand(self._wand)
+        self.close()
+
+    def close(self):
+        """
+        Releases this image's wand immediately rather than when it is
+        garbage-collected. The image cannot be used afterwards.
+        """
+
+        if self._shared is not None:
+            self._shared.release()
+            self._shared = None
+
+        if isinstance(self._frames, _SharedWand):
+            self._frames.release()
+            self._frames = None
+
+    @property
+    def _wand(self):
+        """Our wand, which must not be modified as copies may share it"""
+        return self._shared.wand
+
+    def _writable_wand(self):
+        """Returns our wand, first cloning it if any copies share it"""
+
+        shared = self._shared
+
+        if shared.refs > 1:
+            # Our reference keeps the shared wand alive until we're done:
+            self._shared = _SharedWand(wand_wrapper.CloneMagickWand(shared.wand),
+                                       self.wand_pool)
+            shared.release()
+
+        return self._shared.wand
 
     @classmethod
-    def open(cls, fp, mode="rb"):
+    def open(cls, fp, mode="rb", lazy=True, region=None):
+        """
+        Opens an image from a filename, file-like object or in-memory buffer
+
+        By default only the image header is read: size, format and n_frames are
+        available immediately but decoding is deferred until the pixel data is
+        first needed so that :meth:`draft` and :meth:`crop` can still configure
+        the decoder. :meth:`thumbnail` does this automatically. Pass
+        lazy=False to decode immediately.
+
+        A bytearray, memoryview or mmap is read in place rather than copied,
+        which means it must stay open and unmodified until the image has been
+        loaded. Call :meth:`load` (or pass lazy=False) before closing an mmap.
+
+        region is an optional (left, upper, right, lower) box and is equivalent
+        to calling :meth:`crop` before the image is loaded: for filenames the
+        region is passed to GraphicsMagick with the filename so only it is
+        returned. Most coders, including JPEG and PNG, still decode the whole
+        image before cropping it so this saves a separate full-size copy rather
+        than the decode itself.
+
+        If :attr:`master_cache` is set, filenames are instead decoded in full
+        once and later calls return copy-on-write copies of the cached image,
+        cropped to region if one was given.
+        """
+
+        if region is not None:
+            region = _region_box(region)
+
+        if cls.master_cache is not None and isinstance(fp, basestring):
+            i = cls.master_cache.open(cls, fp)
+            return i if region is None else i.crop(region)
+
+        return cls._open(fp, lazy=lazy, region=region)
+
+    @classmethod
+    def _open(cls, fp, lazy=True, region=None):
         i = cls()
 
+        if isinstance(fp, FileIO) and not lazy and region is None:
+            wand_wrapper.MagickReadImageFile(i._wand, fp)
+            i._split_frames()
+            return i
+
         if isinstance(fp, basestring):
-            wand_wrapper.MagickReadImage(i._wand, fp.encode(FILESYSTEM_ENCODING))
+            i._source = (_FILENAME, fp.encode(FILESYSTEM_ENCODING))
         elif isinstance(fp, bytes):
-            wand_wrapper.MagickReadImage(i._wand, fp)
-        elif isinstance(fp, FileIO):
-            wand_wrapper.MagickReadImageFile(i._wand, fp)
+            i._source = (_FILENAME, fp)
+        elif isinstance(fp, (bytearray, memoryview, mmap.mmap)):
+            # In-memory image data is handed to GraphicsMagick without copying,
+            # even when it's read-only; wrap a bytes payload in memoryview() to
+            # avoid it being treated as a filename. The buffer is only read when
+            # the image is loaded so it must not be closed or modified before:
+            i._source = (_BLOB, fp)
+        elif hasattr(fp, "getbuffer") and not lazy:
+            # BytesIO exposes its storage directly, which avoids the copy read()
+            # would make. Lazy images read() instead so they don't prevent the
+            # caller from modifying the BytesIO before the image is loaded:
+            i._source = (_BLOB, fp.getbuffer()[fp.tell():])
         elif hasattr(fp, "read"):
-            wand_wrapper.MagickReadImageBlob(i._wand, fp.read())
+            i._source = (_BLOB, fp.read())
         else:
             raise IOError("Cannot open %r object" % fp)
 
+        if region is not None:
+            i._crop_box = _region_box(region)
+
+        if lazy:
+            i._ping()
+
+            if region is not None and i._header is not None:
+                _region_box(region, i._header[i._frame]["size"])
+        else:
+            i.load()
+
         return i
 
+    def _ping(self):
+        """Reads the image attributes from the header of our pending source"""
+
+        source_type, source = self._source
+
+        if source_type == _BLOB and wand_wrapper.MagickPingImageBlob is None:
+            # We'll have to wait until the image is decoded:
+            return
+
+        pool = self.wand_pool
+        wand = _new_wand(pool)
+        try:
+            if source_type == _FILENAME:
+                wand_wrapper.MagickPingImage(wand, source)
+            else:
+                wand_wrapper.MagickPingImageBlob(wand, source)
+
+            self._n_frames = wand_wrapper.MagickGetNumberImages(wand)
+
+            # Frames may differ in size so seek() can't reuse the first's:
+            self._header = []
+            for frame in range(self._n_frames):
+                wand_wrapper.MagickSetImageIndex(wand, frame)
+                self._header.append({
+                    "size": (wand_wrapper.MagickGetImageWidth(wand),
+                             wand_wrapper.MagickGetImageHeight(wand)),
+                    "format": wand_wrapper.MagickGetImageFormat(wand).decode("ascii"),
+                })
+        finally:
+            _destroy_wand(wand, pool)
+
+    def load(self):
+        "Explicitly load pixel data."
+
+        if self._source is None:
+            return
+
+        source_type, source = self._source
+        crop_box = self._crop_box
+
+        self._source = self._header = self._crop_box = None
+
+        wand = self._writable_wand()
+
+        if self._draft_size is not None:
+            wand_wrapper.MagickSetSize(wand, *self._draft_size)
+
+        if source_type == _FILENAME and self._n_frames is not None and self._n_frames > 1:
+            # Only the current frame is decoded. The filename is kept so other
+            # frames can be read by seek():
+            self._frames = (source_type, source)
+            wand_wrapper.MagickReadImage(wand, source + b"[%d]" % self._frame)
+        else:
+            if source_type == _FILENAME:
+                if crop_box is not None:
+                    # GraphicsMagick crops to the region as part of reading:
+                    x0, y0, x1, y1 = crop_box
+                    source += b"[%dx%d+%d+%d]" % (x1 - x0, y1 - y0, x0, y0)
+                    crop_box = None
+
+                wand_wrapper.MagickReadImage(wand, source)
+            else:
+                wand_wrapper.MagickReadImageBlob(wand, source)
+
+            self._split_frames()
+            wand = self._wand
+
+        if crop_box is not None:
+            x0, y0, x1, y1 = crop_box
+            wand_wrapper.MagickCropImage(wand, x1 - x0, y1 - y0, x0, y0)
+
+    def _split_frames(self):
+        """
+        Called after every frame has been decoded into our wand to keep them in
+        self._frames and replace our wand with the current frame
+        """
+
+        self._n_frames = wand_wrapper.MagickGetNumberImages(self._wand)
+
+        if self._n_frames > 1:
+            self._frames, self._shared = self._shared, None
+            self._select_frame(self._frame)
+
+    def _select_frame(self, frame):
+        """Replaces our wand with a new one containing frame from self._frames"""
+
+        frames = self._frames
+
+        with frames.lock:
+            wand_wrapper.MagickSetImageIndex(frames.wand, frame)
+            wand = wand_wrapper.MagickGetImage(frames.wand)
+
+        if self._shared is not None:
+            self._shared.release()
+
+        self._shared = _SharedWand(wand, self.wand_pool)
+        self._frame = frame
+
+    def seek(self, frame):
+        """
+        Seeks to the given frame of a multi-frame image such as an animated GIF
+        or multi-page TIFF, discarding any changes made to the current frame
+
+        Images opened from a filename only ever decode the current frame, which
+        is read from the file when it's first needed, so :meth:`draft` and
+        :meth:`crop` work on each frame as they would on a single image. Other
+        sources are decoded in full on first use.
+        """
+
+        if frame == self._frame:
+            return
+
+        if not 0 <= frame < self.n_frames:
+            raise EOFError("Frame %d is outside the range 0-%d" % (frame, self.n_frames - 1))
+
+        if self._source is not None:
+            self._frame = frame
+        elif isinstance(self._frames, _SharedWand):
+            self._select_frame(frame)
+        else:
+            # Read the new frame lazily from the original filename:
+            self._source, self._frames = self._frames, None
+            self._shared.release()
+            self._shared = _SharedWand(_new_wand(self.wand_pool), self.wand_pool)
+            self._frame = frame
+
+    def tell(self):
+        return self._frame
+
+    def frames(self):
+        """
+        Iterates over every frame, seeking to each in turn and yielding this
+        image as PIL's ImageSequence.Iterator does
+        """
+
+        for frame in range(self.n_frames):
+            self.seek(frame)
+            yield self
+
+    def draft(self, mode, size):
+        """
+        Configures the decoder to return an image as close as possible to, but
+        no smaller than, size
+
+        For JPEGs this lets libjpeg scale by 1/2, 1/4 or 1/8 in the DCT domain
+        which is far faster than decoding the full image and resizing it. This
+        only has an effect on images opened lazily which haven't been loaded
+        yet and haven't been cropped. mode is currently ignored.
+        """
+
+        if self._source is not None and self._crop_box is None:
+            self._draft_size = (int(size[0]), int(size[1]))
+
     def copy(self):
         return deepcopy(self)
 
     def __deepcopy__(self, memo):
         # We have a little bit of song-and-dance here because we need to avoid
-        # deepcopy() attempting to copy _wand, which would be pointless since
-        # we're about to replace it anyway:
-        new_wand = wand_wrapper.CloneMagickWand(self._wand)
-        new_image = GraphicsMagickImage(magick_wand=new_wand)
+        # deepcopy() attempting to copy the wand. Decoded images are
+        # copy-on-write: both images share the same wand until one of them is
+        # modified. An image which hasn't been loaded yet shares its source
+        # data with the copy and both are decoded independently:
+        if self._source is None:
+            new_image = self.__class__.__new__(self.__class__)
+            new_image._shared = self._shared.acquire()
+        else:
+            new_image = self.__class__()
 
         for k in self.__dict__:
-            if k == "_wand":
+            if k == "_shared":
                 continue
-            setattr(new_image, k, deepcopy(getattr(self, k), memo))
+            elif k == "_source":
+                new_image._source = self._source
+            elif k == "_frames" and isinstance(self._frames, _SharedWand):
+                new_image._frames = self._frames.acquire()
+            else:
+                setattr(new_image, k, deepcopy(getattr(self, k), memo))
 
         return new_image
 
     @property
     def size(self):
+        if self._source is not None and self._draft_size is None:
+            if self._crop_box is not None:
+                x0, y0, x1, y1 = self._crop_box
+                return (x1 - x0, y1 - y0)
+            elif self._header is not None:
+                return self._header[self._frame]["size"]
+
+        self.load()
         width = wand_wrapper.MagickGetImageWidth(self._wand)
         height = wand_wrapper.MagickGetImageHeight(self._wand)
         return (width, height)
 
+    @property
+    def format(self):
+        if self._header is not None:
+            return self._header[self._frame]["format"]
+
+        self.load()
+        return wand_wrapper.MagickGetImageFormat(self._wand).decode("ascii")
+
+    @property
+    def n_frames(self):
+        if self._n_frames is None:
+            self.load()
+
+        if self._n_frames is None:
+            # Images created by crop() rather than read from a source:
+            return wand_wrapper.MagickGetNumberImages(self._wand)
+
+        return self._n_frames
+
     def thumbnail(self, size, resample=ANTIALIAS):
-        width, height = self.size
+        # This is a no-op unless the image was opened lazily:
+        self.draft(self.mode, size)
+
+        width, height = fit_size(self.size, size)
+
+        wand = self._writable_wand()
+        wand_wrapper.MagickStripImage(wand)
+        _resize_wand(wand, width, height, resample)
+
+    def derivatives(self, sizes, format=b"JPEG", destinations=None, resample=ANTIALIAS,
+                    **save_options):
+        """
+        Creates a thumbnail of this image for each of sizes from a single decode
+
+        A copy of this image is drafted for the largest size, decoded once and
+        then stripped and resized in place from the largest size to the
+        smallest, encoding each in turn. See :meth:`api.Image.derivatives`.
+        Unless destinations are given the encoded images are returned as
+        buffers as :meth:`encode` does.
+        """
+
+        targets = [fit_size(self.size, bounds) for bounds in sizes]
+        results = [None] * len(targets)
 
-        if width > size[0]:
-            height = max(height * size[0] // width, 1)
-            width = size[0]
+        if not targets:
+            return results
 
-        if height > size[1]:
-            width = max(width * size[1] // height, 1)
-            height = size[1]
+        if destinations is not None and len(destinations) != len(targets):
+            raise ValueError("A destination is needed for each size")
 
-        wand_wrapper.MagickStripImage(self._wand)
-        wand_wrapper.MagickResizeImage(self._wand, width, height, resample, 1)
+        image = self.copy()
+        image.draft(self.mode, max(targets))
+        image.load()
+
+        wand = image._writable_wand()
+        wand_wrapper.MagickStripImage(wand)
+
+        for i in sorted(range(len(targets)), key=lambda i: targets[i], reverse=True):
+            if image.size != targets[i]:
+                _resize_wand(wand, targets[i][0], targets[i][1], resample)
+
+            if destinations is None:
+                results[i] = image.encode(format, **save_options)
+            else:
+                image.save(destinations[i], format, **save_options)
+                results[i] = destinations[i]
+
+        return results
 
     def resize(self, size, resample=ANTIALIAS):
         width, height = int(size[0]), int(size[1])
 
+        self.load()
         im = self.copy()
 
-        wand_wrapper.MagickResizeImage(im._wand, width, height, resample, 1)
+        # This clones the wand shared with self. GraphicsMagick's CloneImage()
+        # shares the pixel cache until either image is modified and resizing
+        # only reads from it, so no pixels are copied:
+        _resize_wand(im._writable_wand(), width, height, resample)
 
         return im
 
     def crop(self, box):
-        # TODO: Investigate whether this can be further optimized by using the
-        # lower-level GraphicsMagick CropImage function directly since that is
-        # non-destructive:
-        # http://www.graphicsmagick.org/api/transform.html#cropimage
-        x0, y0, x1, y1 = box
+        # Both paths reject the same boxes; the size is read from the header
+        # if the image hasn't been loaded:
+        x0, y0, x1, y1 = _region_box(box, self.size)
         width = x1 - x0
         height = y1 - y0
 
-        im = self.copy()
+        if self._source is not None and self._draft_size is None:
+            # Defer the crop until the copy is decoded:
+            im = self.copy()
+            if self._crop_box is not None:
+                x_offset, y_offset = self._crop_box[:2]
+                x0, y0, x1, y1 = (x0 + x_offset, y0 + y_offset,
+                                  x1 + x_offset, y1 + y_offset)
+            im._crop_box = (x0, y0, x1, y1)
+            return im
 
-        wand_wrapper.MagickCropImage(im._wand, width, height, x0, y0)
+        self.load()
 
-        return im
+        # MagickGetImageRegion uses the non-destructive CropImage to build a new
+        # wand containing only the requested region rather than cloning the
+        # wand, with every frame and its attributes, only to crop the clone:
+        region = wand_wrapper.MagickGetImageRegion(self._wand, width, height, x0, y0)
 
-    def save(self, fp, format=b"JPEG", **kwargs):
-        if 'quality' in kwargs:
-            wand_wrapper.MagickSetCompressionQuality(self._wand, kwargs['quality'])
+        return self.__class__(magick_wand=region)
+
+    def _pixel_region(self, box, rawmode):
+        """Returns (x, y, width, height, pixel_map, length in bytes) for box"""
+
+        if box is None:
+            box = (0, 0) + tuple(self.size)
+
+        x0, y0, x1, y1 = box
+        pixel_map = _pixel_map(rawmode)
+
+        return (x0, y0, x1 - x0, y1 - y0, pixel_map,
+                (x1 - x0) * (y1 - y0) * len(pixel_map))
+
+    def readpixels(self, buffer=None, rawmode="RGB", box=None):
+        """
+        Copies the 8-bit raw pixels for box, which defaults to the entire image,
+        into buffer and returns it
+
+        buffer may be any writable object supporting the buffer protocol
+        (bytearray, mmap, numpy arrays, shared memory, etc.) with room for
+        width * height * len(rawmode) bytes and a bytearray is allocated if it
+        is None. See :meth:`strips` for processing large images in pieces.
+        """
+
+        self.load()
+
+        x, y, width, height, pixel_map, length = self._pixel_region(box, rawmode)
+
+        if buffer is None:
+            buffer = bytearray(length)
+        elif memoryview(buffer).nbytes < length:
+            raise ValueError("%d bytes are needed for %dx%d %s pixels"
+                             % (length, width, height, rawmode))
+
+        # Reading pixels uses the image's default cache view, which copies
+        # sharing the wand must not use concurrently:
+        with self._shared.lock:
+            wand_wrapper.MagickGetImagePixels(self._wand, x, y, width, height, pixel_map,
+                                              StorageTypes["CharPixel"], buffer)
+
+        return buffer
+
+    def writepixels(self, data, rawmode="RGB", box=None):
+        """
+        Replaces the pixels in box, which defaults to the entire image, with
+        8-bit raw pixel data from any object supporting the buffer protocol
+        """
+
+        self.load()
+
+        x, y, width, height, pixel_map, length = self._pixel_region(box, rawmode)
+
+        if memoryview(data).nbytes < length:
+            raise ValueError("%d bytes are needed for %dx%d %s pixels"
+                             % (length, width, height, rawmode))
+
+        wand_wrapper.MagickSetImagePixels(self._writable_wand(), x, y, width, height,
+                                          pixel_map, StorageTypes["CharPixel"],
+                                          data)
+
+    def strips(self, height=256, rawmode="RGB"):
+        """
+        Yields (top, pixels) for successive bands of up to height rows so large
+        images can be processed without a buffer for every pixel
+
+        pixels is a memoryview of a single buffer which is reused for each
+        strip: copy it if it is needed after the next iteration.
+        """
+
+        width, image_height = self.size
+        row_length = width * len(_pixel_map(rawmode))
+        view = memoryview(bytearray(row_length * min(height, image_height)))
+
+        for top in range(0, image_height, height):
+            bottom = min(top + height, image_height)
+            pixels = view[:row_length * (bottom - top)]
+            self.readpixels(pixels, rawmode, (0, top, width, bottom))
+            yield top, pixels
+
+    @property
+    def __array_interface__(self):
+        # GraphicsMagick doesn't expose its pixel cache as a contiguous buffer
+        # so the pixels are exported once, straight into the array's storage.
+        # To fill an existing array use readpixels(array, mode) instead:
+        self.load()
+        width, height = self.size
+
+        # Finding the type reads pixels through the default cache view too:
+        with self._shared.lock:
+            mode = ARRAY_MODES.get(wand_wrapper.MagickGetImageType(self._wand), "RGB")
+
+        bands = ARRAY_MODE_BANDS[mode]
+
+        return {
+            "version": 3,
+            "shape": (height, width) if bands == 1 else (height, width, bands),
+            "typestr": "|u1",
+            "data": self.readpixels(rawmode=mode),
+        }
+
+    def tobytes(self, encoder_name="raw", *args):
+        "Returns the image as a string of raw pixels; see :meth:`readpixels`"
+
+        rawmode = _raw_mode_args(encoder_name, args, "RGB")
+        return bytes(self.readpixels(rawmode=rawmode))
+
+    tostring = tobytes
+
+    def frombytes(self, data, decoder_name="raw", *args):
+        "Load data to image from binary string"
+
+        self.writepixels(data, _raw_mode_args(decoder_name, args, "RGB"))
+
+    fromstring = frombytes
+
+    @classmethod
+    def frombuffer(cls, mode, size, data, decoder_name="raw", *args):
+        """
+        Creates an image of the given size from raw pixel data in any object
+        supporting the buffer protocol, as PIL.Image.frombuffer() does
+
+        The data is copied into GraphicsMagick's pixel cache without any
+        intermediate copies.
+        """
+
+        rawmode = _raw_mode_args(decoder_name, args, mode)
+        pixel_map = _pixel_map(rawmode)
+
+        i = cls()
+        wand = i._writable_wand()
+
+        # Create a blank canvas to write the pixels into:
+        wand_wrapper.MagickSetSize(wand, int(size[0]), int(size[1]))
+        wand_wrapper.MagickReadImage(wand, b"xc:transparent" if b"A" in pixel_map else b"xc:black")
+
+        i.writepixels(data, rawmode)
+
+        return i
+
+    @contextmanager
+    def _output_format(self, format, quality=DEFAULT_QUALITY, **kwargs):
+        """
+        Applies the output format and quality to our wand while encoding
+
+        Callers must hold self._shared.lock. Copies may share the wand so both
+        settings are restored afterwards rather than leaking into the next
+        encode by another copy.
+        """
+
+        wand = self._wand
+        original_format = wand_wrapper.MagickGetImageFormat(wand)
 
         # Python 3 means anything string-like needs encoding before calling C:
         format = force_bytes(format)
-        wand_wrapper.MagickSetImageFormat(self._wand, format)
-        assert format == wand_wrapper.MagickGetImageFormat(self._wand)
 
-        if isinstance(fp, basestring):
-            wand_wrapper.MagickWriteImage(self._wand, fp)
-        elif isinstance(fp, FileIO):
-            wand_wrapper.MagickWriteImageFile(self._wand, fp)
+        try:
+            wand_wrapper.MagickSetCompressionQuality(wand, quality)
+            wand_wrapper.MagickSetImageFormat(wand, format)
+            assert format == wand_wrapper.MagickGetImageFormat(wand)
+
+            yield wand
+        finally:
+            wand_wrapper.MagickSetCompressionQuality(wand, DEFAULT_QUALITY)
+            if original_format:
+                wand_wrapper.MagickSetImageFormat(wand, original_format)
+
+    def encode(self, format=b"JPEG", max_bytes=None, **kwargs):
+        """
+        Returns the image encoded in the requested format without copying it
+        out of GraphicsMagick's memory
+
+        The result supports the buffer protocol and can be passed directly to
+        file.write(), socket.send(), memoryview(), etc. The native memory is
+        freed when it is garbage-collected or by calling its release() method
+        once no views of it remain.
+
+        If max_bytes is given, the highest quality between min_quality
+        (default 10) and quality (default 95) which produces no more than
+        max_bytes is found by bisection, re-encoding the same decoded image
+        each time. The quality used and the number of encode passes are
+        recorded in self.info as "quality" and "encode_passes". ValueError is
+        raised if even min_quality is too large.
+        """
+
+        self.load()
+
+        if max_bytes is not None:
+            return self._encode_within(format, max_bytes, **kwargs)
+
+        with self._shared.lock, self._output_format(format, **kwargs) as wand:
+            return wand_wrapper.MagickWriteImageBuffer(wand)
+
+    def _encode_within(self, format, max_bytes, min_quality=10, quality=95, **kwargs):
+        low, high = min_quality, quality
+        candidate = high
+        best = None
+        passes = 0
+
+        while low <= high:
+            # Each pass restores the wand's quality, which copies may share, so
+            # the last candidate tried isn't left behind for their encodes:
+            data = self.encode(format, quality=candidate, **kwargs)
+            passes += 1
+
+            if len(data) <= max_bytes:
+                if best is not None:
+                    best[1].release()
+                best = (candidate, data)
+
+                if len(data) >= max_bytes * (1 - MAX_BYTES_TOLERANCE):
+                    break
+
+                low = candidate + 1
+            else:
+                data.release()
+                high = candidate - 1
+
+            candidate = (low + high) // 2
+
+        self.info = dict(self.info, encode_passes=passes,
+                         quality=best[0] if best is not None else None)
+
+        if best is None:
+            raise ValueError("Unable to encode within %d bytes at quality %d"
+                             % (max_bytes, min_quality))
+
+        return best[1]
+
+    def save(self, fp, format=b"JPEG", **kwargs):
+        if kwargs.get("max_bytes") is not None and isinstance(fp, basestring):
+            # The quality search happens in memory so only the result is written:
+            data = self.encode(format, **kwargs)
+            with open(fp, "wb") as f:
+                f.write(data)
+        elif isinstance(fp, (basestring, FileIO)) and kwargs.get("max_bytes") is None:
+            self.load()
+
+            with self._shared.lock, self._output_format(format, **kwargs) as wand:
+                if isinstance(fp, basestring):
+                    wand_wrapper.MagickWriteImage(wand, fp.encode(FILESYSTEM_ENCODING))
+                else:
+                    wand_wrapper.MagickWriteImageFile(wand, fp)
         elif hasattr(fp, "write"):
-            data = wand_wrapper.MagickWriteImageBlob(self._wand)
-            fp.write(data)
+            # The native buffer is freed as soon as the last reference to it
+            # goes away, which is immediately unless fp.write() kept one:
+            fp.write(self.encode(format, **kwargs))
         else:
             raise ValueError("Don't know how to write to a %r" % fp)
+
+
+def _before_fork():
+    # Never fork while another thread is part-way through initialize():
+    _initialize_lock.acquire()
+
+
+def _after_fork_in_parent():
+    _initialize_lock.release()
+
+
+def _after_fork_in_child():
+    global _initialize_lock
+    _initialize_lock = threading.Lock()
+
+    for shared in (GraphicsMagickImage.wand_pool, GraphicsMagickImage.master_cache):
+        if shared is not None:
+            shared._after_fork()
+
+
+register_fork_handlers(_before_fork, _after_fork_in_parent, _after_fork_in_child)
@@ -1,112 +1,80 @@
 """
 An Image-compatible backend using Aware via ctypes
+
+The Aware library is loaded the first time an image is opened rather than when
+this module is imported; call :func:`initialize` to control when that happens.
 """
 
 import ctypes
-from ctypes.util import find_library
-
-from NativeImaging.api import Image
-from PIL import Image as PILImage
-
-_path = find_library("awj2k")
-
-if not _path:
-    raise ImportError("Unable to find aware library!")
-
-_lib = ctypes.CDLL(_path)
+import threading
+from importlib import import_module
 
+from NativeImaging.api import Image, fit_size, save_derivatives
 
-def _aware_errcheck(rc, func, args):
-    if rc:
-        raise AwareException("Error: '%s' returned '%d'" % (func.__name__, rc))
-    else:
-        return rc
+from .lazy import LazyBinding, find_native_library, register_fork_handlers
+from .wand_common import native_buffer
 
 
-class AwareException(Exception):
-    pass
+def library_path():
+    """
+    Returns the path to the Aware library without loading it, raising
+    ImportError if it cannot be found
+    """
 
+    return find_native_library("awj2k")
 
-class J2KObject(ctypes.Structure):
-    pass
 
+def initialize():
+    """
+    Loads the Aware library, returning the binding module
 
-J2K_OBJECT_P = ctypes.POINTER(J2KObject)
+    This happens automatically the first time it's needed and repeated calls
+    do nothing. Raises ImportError if Aware cannot be loaded.
+    """
 
-AW_J2K_PRESERVE_ASPECT_RATIO = -1
-AW_J2K_PRESERVE_ASPECT_RATIO_NO_PAD = -2
-AW_J2K_MODIFY_ASPECT_RATIO = -3
+    global aware_wrapper
 
+    if isinstance(aware_wrapper, LazyBinding):
+        with _initialize_lock:
+            if isinstance(aware_wrapper, LazyBinding):
+                aware_wrapper = import_module(".aware_wrapper", __package__)
 
-aw_j2k_create = _lib.aw_j2k_create
-aw_j2k_create.restype = ctypes.c_uint
-aw_j2k_create.argtypes = [ctypes.c_void_p]
-aw_j2k_create.errcheck = _aware_errcheck
+    return aware_wrapper
 
-aw_j2k_destroy = _lib.aw_j2k_destroy
-aw_j2k_destroy.restype = ctypes.c_uint
-aw_j2k_destroy.argtypes = [ctypes.c_void_p]
 
-aw_j2k_set_input_image = _lib.aw_j2k_set_input_image
-aw_j2k_set_input_image.restype = ctypes.c_uint
-aw_j2k_set_input_image.argtypes = [ctypes.c_void_p,
-                                   ctypes.c_void_p, ctypes.c_size_t]
-aw_j2k_set_input_image.errcheck = _aware_errcheck
+# Replaced with the binding module by initialize():
+aware_wrapper = LazyBinding(initialize)
 
-aw_j2k_get_input_image_info = _lib.aw_j2k_get_input_image_info
-aw_j2k_get_input_image_info.restype = ctypes.c_uint
-aw_j2k_get_input_image_info.argtypes = [ctypes.c_void_p,
-                                        ctypes.POINTER(ctypes.c_ulong),
-                                        ctypes.POINTER(ctypes.c_ulong),
-                                        ctypes.POINTER(ctypes.c_ulong),
-                                        ctypes.POINTER(ctypes.c_ulong)]
-aw_j2k_set_input_image.errcheck = _aware_errcheck
+_initialize_lock = threading.Lock()
 
-aw_j2k_set_input_j2k_region_level = _lib.aw_j2k_set_input_j2k_region_level
-aw_j2k_set_input_j2k_region_level.restype = ctypes.c_uint
-aw_j2k_set_input_j2k_region_level.argtypes = [ctypes.c_void_p,
-                                              ctypes.c_int, ctypes.c_int,
-                                              ctypes.c_int, ctypes.c_int]
-aw_j2k_set_input_j2k_region_level.errcheck = _aware_errcheck
 
+# The binding's public names, which used to be defined in this module:
+_WRAPPER_NAMES = frozenset([
+    "AwareException", "J2KObject", "J2K_OBJECT_P",
+    "AW_J2K_PRESERVE_ASPECT_RATIO", "AW_J2K_PRESERVE_ASPECT_RATIO_NO_PAD",
+    "AW_J2K_MODIFY_ASPECT_RATIO",
+    "aw_j2k_create", "aw_j2k_destroy", "aw_j2k_free", "aw_j2k_set_input_image",
+    "aw_j2k_get_input_image_info", "aw_j2k_set_input_j2k_region_level",
+    "aw_j2k_set_input_j2k_resolution_level", "aw_j2k_set_output_com_image_size",
+    "aw_j2k_get_output_image_raw",
+])
 
-aw_j2k_set_output_com_image_size = _lib.aw_j2k_set_output_com_image_size
-aw_j2k_set_output_com_image_size.restype = ctypes.c_uint
-aw_j2k_set_output_com_image_size.argtypes = [ctypes.c_void_p,
-                                             ctypes.c_int, ctypes.c_int,
-                                             ctypes.c_int]
-aw_j2k_set_output_com_image_size.errcheck = _aware_errcheck
 
+def __getattr__(name):
+    # Only these load the library, so introspection such as hasattr() still
+    # works without it:
+    if name not in _WRAPPER_NAMES:
+        raise AttributeError(name)
 
-aw_j2k_get_output_image_raw = _lib.aw_j2k_get_output_image_raw
-aw_j2k_get_output_image_raw.restype = ctypes.c_uint
-aw_j2k_get_output_image_raw.argtypes = [ctypes.c_void_p,
-                                        ctypes.POINTER(ctypes.POINTER(ctypes.c_char)),
-                                        ctypes.POINTER(ctypes.c_size_t),
-                                        ctypes.POINTER(ctypes.c_ulong),
-                                        ctypes.POINTER(ctypes.c_ulong),
-                                        ctypes.POINTER(ctypes.c_ulong),
-                                        ctypes.POINTER(ctypes.c_ulong),
-                                        ctypes.c_int]
-aw_j2k_get_output_image_raw.errcheck = _aware_errcheck
-
-aw_j2k_free = _lib.aw_j2k_free
-aw_j2k_free.restype = ctypes.c_uint
-aw_j2k_free.argtypes = [ctypes.c_void_p,
-                        ctypes.POINTER(ctypes.c_char)]
-aw_j2k_free.errcheck = _aware_errcheck
-
-aw_j2k_set_input_j2k_resolution_level = _lib.aw_j2k_set_input_j2k_resolution_level
-aw_j2k_set_input_j2k_resolution_level.restype = ctypes.c_uint
-aw_j2k_set_input_j2k_resolution_level.argtypes = [ctypes.c_void_p,
-                                                  ctypes.c_int,
-                                                  ctypes.c_int]
-aw_j2k_set_input_j2k_resolution_level.errcheck = _aware_errcheck
+    return getattr(initialize(), name)
 
 
 MAX_PROGRESSION_LEVEL = 6
 FULL_XFORM_FLAG = 0
 
+# Array interface types for Aware's 8 and 16-bit output samples:
+SAMPLE_TYPES = {1: "|u1", 2: "<u2"}
+
 
 def scaled_dimension(progression_level, dimension):
     scale_factor = 2 << (progression_level - 1)
@@ -131,13 +99,13 @@ class AwareImage(Image):
         self.__crop = None
         self.__resize = None
         self._j2k_object_p = ctypes.c_void_p()
-        aw_j2k_create(ctypes.byref(self._j2k_object_p))
+        aware_wrapper.aw_j2k_create(ctypes.byref(self._j2k_object_p))
         assert self._j2k_object_p.value, "failed to create j2k_object"
 
     def __del__(self):
-        if self._j2k_object_p:
-            if aw_j2k_destroy:
-                aw_j2k_destroy(self._j2k_object_p)
+        # Module globals may already be None during interpreter shutdown:
+        if self._j2k_object_p and aware_wrapper is not None:
+            aware_wrapper.aw_j2k_destroy(self._j2k_object_p)
 
     @classmethod
     def open(cls, fp, mode="rb"):
@@ -147,7 +115,7 @@ class AwareImage(Image):
             fp = open(fp, "rb")
 
         b = ctypes.create_string_buffer(fp.read())
-        aw_j2k_set_input_image(i._j2k_object_p, b, ctypes.sizeof(b))
+        aware_wrapper.aw_j2k_set_input_image(i._j2k_object_p, b, ctypes.sizeof(b))
 
         return i
 
@@ -157,11 +125,11 @@ class AwareImage(Image):
         cols = ctypes.c_ulong()
         bpp = ctypes.c_ulong()
         nChannels = ctypes.c_ulong()
-        aw_j2k_get_input_image_info(self._j2k_object_p,
-                                    ctypes.byref(cols),
-                                    ctypes.byref(rows),
-                                    ctypes.byref(bpp),
-                                    ctypes.byref(nChannels))
+        aware_wrapper.aw_j2k_get_input_image_info(self._j2k_object_p,
+                                                  ctypes.byref(cols),
+                                                  ctypes.byref(rows),
+                                                  ctypes.byref(bpp),
+                                                  ctypes.byref(nChannels))
         return (cols.value, rows.value)
 
     def thumbnail(self, size, resample=ANTIALIAS):
@@ -180,25 +148,50 @@ class AwareImage(Image):
     def resize(self, size, resample=ANTIALIAS):
         width, height = int(size[0]), int(size[1])
         self.__resize = (width, height)
-        aw_j2k_set_output_com_image_size(self._j2k_object_p, height, width,
-                                         AW_J2K_PRESERVE_ASPECT_RATIO_NO_PAD)
+        aware_wrapper.aw_j2k_set_output_com_image_size(
+            self._j2k_object_p, height, width, aware_wrapper.AW_J2K_PRESERVE_ASPECT_RATIO_NO_PAD)
         # TODO: remove preserve aspect ratio out into chronam code.
         return self.copy()
 
+    def derivatives(self, sizes, format="JPEG", destinations=None, resample=ANTIALIAS,
+                    **save_options):
+        """
+        Creates a thumbnail of this image for each of sizes from a single decode
+
+        Aware decodes only the wavelet resolution levels needed for the
+        largest size and PIL cascades the rest down from that output. See
+        :meth:`api.Image.derivatives`.
+        """
+
+        if not sizes:
+            return []
+
+        largest = max(fit_size(self.size, bounds) for bounds in sizes)
+
+        return save_derivatives(self.resize(largest, resample), sizes, format,
+                                destinations, resample, **save_options)
+
     def crop(self, box):
         x1, y1, x2, y2 = box
         self.__crop = box
-        aw_j2k_set_input_j2k_region_level(self._j2k_object_p, x1, y1, x2, y2)
+        aware_wrapper.aw_j2k_set_input_j2k_region_level(self._j2k_object_p, x1, y1, x2, y2)
         return self
 
-    def copy(self):
+    def _get_output_raw(self):
+        """
+        Decodes the image, returning (pixels, size, channels, bits per pixel)
+
+        pixels is a ctypes array over Aware's output buffer which is freed when
+        it is garbage-collected or its release() method is called
+        """
+
         if self.__crop:
             x1, y1, x2, y2 = self.__crop
             width, height = self.__resize
             level = desired_progression_level(x1, x2, y1, y2, width, height)
-            aw_j2k_set_input_j2k_resolution_level(self._j2k_object_p,
-                                                  level,
-                                                  FULL_XFORM_FLAG)
+            aware_wrapper.aw_j2k_set_input_j2k_resolution_level(self._j2k_object_p,
+                                                                level,
+                                                                FULL_XFORM_FLAG)
 
         data_p = ctypes.pointer(ctypes.POINTER(ctypes.c_char)())
         data_length = ctypes.c_size_t()
@@ -207,20 +200,67 @@ class AwareImage(Image):
         nChannels = ctypes.c_ulong()
         bpp = ctypes.c_ulong()
 
-        aw_j2k_get_output_image_raw(self._j2k_object_p,
-                                    data_p,
-                                    ctypes.byref(data_length),
-                                    ctypes.byref(rows),
-                                    ctypes.byref(cols),
-                                    ctypes.byref(nChannels),
-                                    ctypes.byref(bpp), 0)
-        data = data_p.contents[0:data_length.value]
-
-        image = PILImage.frombuffer("L", (cols.value, rows.value),
-                                    data,
-                                    "raw", "L", 0, 1)
-        aw_j2k_free(self._j2k_object_p, data_p.contents)
+        aware_wrapper.aw_j2k_get_output_image_raw(self._j2k_object_p,
+                                                  data_p,
+                                                  ctypes.byref(data_length),
+                                                  ctypes.byref(rows),
+                                                  ctypes.byref(cols),
+                                                  ctypes.byref(nChannels),
+                                                  ctypes.byref(bpp), 0)
+
+        # The bound method keeps this object alive until the buffer is freed:
+        pixels = native_buffer(ctypes.addressof(data_p.contents.contents),
+                               data_length.value, self._free_raw, data_p.contents)
+
+        return pixels, (cols.value, rows.value), nChannels.value, bpp.value
+
+    def _free_raw(self, data):
+        aware_wrapper.aw_j2k_free(self._j2k_object_p, data)
+
+    @property
+    def __array_interface__(self):
+        # This exposes Aware's output buffer without copying it:
+        pixels, (cols, rows), channels, bpp = self._get_output_raw()
+
+        # bpp is a precision which needn't be a whole number of bytes, e.g. 12
+        # bits, so the size of each sample is derived from the buffer's length:
+        sample_bytes = len(pixels) // (rows * cols * channels)
+        if sample_bytes not in SAMPLE_TYPES:
+            pixels.release()
+            raise ValueError("Unsupported %d-byte samples for %d-bit channels"
+                             % (sample_bytes, bpp))
+
+        return {
+            "version": 3,
+            "shape": (rows, cols) if channels == 1 else (rows, cols, channels),
+            "typestr": SAMPLE_TYPES[sample_bytes],
+            "data": pixels,
+        }
+
+    def copy(self):
+        from PIL import Image as PILImage
+
+        pixels, size, channels, bpp = self._get_output_raw()
+
+        image = PILImage.frombuffer("L", size, pixels[:], "raw", "L", 0, 1)
+        pixels.release()
         return image
 
     def save(self, fp, format="JPEG", **kwargs):
         return self.copy().save(fp, format, **kwargs)
+
+
+def _before_fork():
+    _initialize_lock.acquire()
+
+
+def _after_fork_in_parent():
+    _initialize_lock.release()
+
+
+def _after_fork_in_child():
+    global _initialize_lock
+    _initialize_lock = threading.Lock()
+
+
+register_fork_handlers(_before_fork, _after_fork_in_parent, _after_fork_in_child)
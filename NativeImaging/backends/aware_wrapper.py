@@ -0,0 +1,101 @@
+# encoding: utf-8
+"""
+ctypes wrappers for the Aware JPEG 2000 library
+
+This is loaded by :func:`NativeImaging.backends.aware.initialize` the first
+time the backend is used.
+"""
+
+import ctypes
+
+from .lazy import find_native_library
+
+_lib = ctypes.CDLL(find_native_library("awj2k"))
+
+
+def _aware_errcheck(rc, func, args):
+    if rc:
+        raise AwareException("Error: '%s' returned '%d'" % (func.__name__, rc))
+    else:
+        return rc
+
+
+class AwareException(Exception):
+    pass
+
+
+class J2KObject(ctypes.Structure):
+    pass
+
+
+J2K_OBJECT_P = ctypes.POINTER(J2KObject)
+
+AW_J2K_PRESERVE_ASPECT_RATIO = -1
+AW_J2K_PRESERVE_ASPECT_RATIO_NO_PAD = -2
+AW_J2K_MODIFY_ASPECT_RATIO = -3
+
+
+aw_j2k_create = _lib.aw_j2k_create
+aw_j2k_create.restype = ctypes.c_uint
+aw_j2k_create.argtypes = [ctypes.c_void_p]
+aw_j2k_create.errcheck = _aware_errcheck
+
+aw_j2k_destroy = _lib.aw_j2k_destroy
+aw_j2k_destroy.restype = ctypes.c_uint
+aw_j2k_destroy.argtypes = [ctypes.c_void_p]
+
+aw_j2k_set_input_image = _lib.aw_j2k_set_input_image
+aw_j2k_set_input_image.restype = ctypes.c_uint
+aw_j2k_set_input_image.argtypes = [ctypes.c_void_p,
+                                   ctypes.c_void_p, ctypes.c_size_t]
+aw_j2k_set_input_image.errcheck = _aware_errcheck
+
+aw_j2k_get_input_image_info = _lib.aw_j2k_get_input_image_info
+aw_j2k_get_input_image_info.restype = ctypes.c_uint
+aw_j2k_get_input_image_info.argtypes = [ctypes.c_void_p,
+                                        ctypes.POINTER(ctypes.c_ulong),
+                                        ctypes.POINTER(ctypes.c_ulong),
+                                        ctypes.POINTER(ctypes.c_ulong),
+                                        ctypes.POINTER(ctypes.c_ulong)]
+aw_j2k_set_input_image.errcheck = _aware_errcheck
+
+aw_j2k_set_input_j2k_region_level = _lib.aw_j2k_set_input_j2k_region_level
+aw_j2k_set_input_j2k_region_level.restype = ctypes.c_uint
+aw_j2k_set_input_j2k_region_level.argtypes = [ctypes.c_void_p,
+                                              ctypes.c_int, ctypes.c_int,
+                                              ctypes.c_int, ctypes.c_int]
+aw_j2k_set_input_j2k_region_level.errcheck = _aware_errcheck
+
+
+aw_j2k_set_output_com_image_size = _lib.aw_j2k_set_output_com_image_size
+aw_j2k_set_output_com_image_size.restype = ctypes.c_uint
+aw_j2k_set_output_com_image_size.argtypes = [ctypes.c_void_p,
+                                             ctypes.c_int, ctypes.c_int,
+                                             ctypes.c_int]
+aw_j2k_set_output_com_image_size.errcheck = _aware_errcheck
+
+
+aw_j2k_get_output_image_raw = _lib.aw_j2k_get_output_image_raw
+aw_j2k_get_output_image_raw.restype = ctypes.c_uint
+aw_j2k_get_output_image_raw.argtypes = [ctypes.c_void_p,
+                                        ctypes.POINTER(ctypes.POINTER(ctypes.c_char)),
+                                        ctypes.POINTER(ctypes.c_size_t),
+                                        ctypes.POINTER(ctypes.c_ulong),
+                                        ctypes.POINTER(ctypes.c_ulong),
+                                        ctypes.POINTER(ctypes.c_ulong),
+                                        ctypes.POINTER(ctypes.c_ulong),
+                                        ctypes.c_int]
+aw_j2k_get_output_image_raw.errcheck = _aware_errcheck
+
+aw_j2k_free = _lib.aw_j2k_free
+aw_j2k_free.restype = ctypes.c_uint
+aw_j2k_free.argtypes = [ctypes.c_void_p,
+                        ctypes.POINTER(ctypes.c_char)]
+aw_j2k_free.errcheck = _aware_errcheck
+
+aw_j2k_set_input_j2k_resolution_level = _lib.aw_j2k_set_input_j2k_resolution_level
+aw_j2k_set_input_j2k_resolution_level.restype = ctypes.c_uint
+aw_j2k_set_input_j2k_resolution_level.argtypes = [ctypes.c_void_p,
+                                                  ctypes.c_int,
+                                                  ctypes.c_int]
+aw_j2k_set_input_j2k_resolution_level.errcheck = _aware_errcheck
@@ -0,0 +1,62 @@
+# encoding: utf-8
+"""
+Support for backends which load their native libraries on first use
+
+Importing a backend module only defines its classes. The library is found,
+loaded and initialized by the backend's ``initialize()`` the first time it's
+needed, so importing NativeImaging is cheap and processes which fork before
+using a backend initialize it separately in each child.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+
+_library_paths = {}
+
+
+def find_native_library(name):
+    """
+    Returns the path to the shared library name without loading it, raising
+    ImportError if it cannot be found
+    """
+
+    # find_library() can run ldconfig or a compiler so the result is cached.
+    # ctypes.util itself is slow to import:
+    if name not in _library_paths:
+        from ctypes.util import find_library
+        _library_paths[name] = find_library(name)
+
+    path = _library_paths[name]
+
+    if not path:
+        raise ImportError("Unable to find %s library!" % name)
+
+    return path
+
+
+class LazyBinding(object):
+    """
+    Stands in for a backend's binding module until it has been initialized
+
+    The first attribute lookup calls initialize(), which must load the
+    binding, replace the backend's reference to this object with it and
+    return it. Code which imported this object directly keeps working, at the
+    cost of an extra lookup for each attribute.
+    """
+
+    def __init__(self, initialize):
+        self._initialize = initialize
+
+    def __getattr__(self, name):
+        return getattr(self._initialize(), name)
+
+    def __repr__(self):
+        return "<%s for %s>" % (self.__class__.__name__, self._initialize.__module__)
+
+
+def register_fork_handlers(before, after_in_parent, after_in_child):
+    """Calls os.register_at_fork() on platforms which support it"""
+
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(before=before, after_in_parent=after_in_parent,
+                            after_in_child=after_in_child)
@@ -0,0 +1,91 @@
+# encoding: utf-8
+"""
+Declarations shared by the ctypes and CFFI GraphicsMagick bindings
+"""
+
+import ctypes
+import weakref
+
+# ENUM declarations:
+FilterTypes = {
+    'UndefinedFilter': 0,
+    'PointFilter': 1,
+    'BoxFilter': 2,
+    'TriangleFilter': 3,
+    'HermiteFilter': 4,
+    'HanningFilter': 5,
+    'HammingFilter': 6,
+    'BlackmanFilter': 7,
+    'GaussianFilter': 8,
+    'QuadraticFilter': 9,
+    'CubicFilter': 10,
+    'CatromFilter': 11,
+    'MitchellFilter': 12,
+    'LanczosFilter': 13,
+    'BesselFilter': 14,
+    'SincFilter': 15,
+}
+
+# Resources which can be limited using SetMagickResourceLimit. Limits are in
+# bytes except for file (open files), pixels, threads, width and height:
+ResourceTypes = {
+    'UndefinedResource': 0,
+    'DiskResource': 1,
+    'FileResource': 2,
+    'MapResource': 3,
+    'MemoryResource': 4,
+    'PixelsResource': 5,
+    'ThreadsResource': 6,
+    'WidthResource': 7,
+    'HeightResource': 8,
+}
+
+# Sample formats for MagickGetImagePixels and MagickSetImagePixels:
+StorageTypes = {
+    'CharPixel': 0,
+    'ShortPixel': 1,
+    'IntegerPixel': 2,
+    'LongPixel': 3,
+    'FloatPixel': 4,
+    'DoublePixel': 5,
+}
+
+# Values returned by MagickGetImageType:
+ImageTypes = {
+    'UndefinedType': 0,
+    'BilevelType': 1,
+    'GrayscaleType': 2,
+    'GrayscaleMatteType': 3,
+    'PaletteType': 4,
+    'PaletteMatteType': 5,
+    'TrueColorType': 6,
+    'TrueColorMatteType': 7,
+    'ColorSeparationType': 8,
+    'ColorSeparationMatteType': 9,
+    'OptimizeType': 10,
+}
+
+# ExceptionType value reported for "Unable to open file":
+FILE_OPEN_ERROR = 430
+
+
+class WandException(Exception):
+    pass
+
+
+def native_buffer(address, length, free, *free_args):
+    """
+    Returns a ctypes char array over length bytes of native memory at address
+
+    The array supports the buffer protocol so it may be passed directly to
+    file.write(), socket.send(), memoryview(), etc. free(*free_args) is called
+    as soon as the array and every view of it have been garbage-collected or
+    when its release() attribute is called, which must only be done once you
+    are certain no views remain.
+    """
+
+    buf = (ctypes.c_char * length).from_address(address)
+    buf.release = weakref.finalize(buf, free, *free_args)
+    buf.release.atexit = False
+
+    return buf
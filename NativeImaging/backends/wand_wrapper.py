@@ -8,12 +8,14 @@ and the ctypes documentation is advised
 
 import ctypes
 import sys
+from contextlib import contextmanager
 from ctypes.util import find_library
 
-_wandlib_path = find_library("GraphicsMagickWand")
+from .lazy import find_native_library
+from .wand_common import (FILE_OPEN_ERROR, FilterTypes, ImageTypes,  # noqa
+                          ResourceTypes, StorageTypes, WandException, native_buffer)
 
-if not _wandlib_path:
-    raise ImportError("Unable to find GraphicsMagicWand library!")
+_wandlib_path = find_native_library("GraphicsMagickWand")
 
 _wandlib = ctypes.CDLL(_wandlib_path)
 _wandlib.InitializeMagick(sys.argv[0])
@@ -32,7 +34,7 @@ def _wand_errcheck(rc, func, args):
         err_type = ExceptionType()
         description = MagickGetException(args[0], err_type)
 
-        if err_type.value == 430:  # "Unable to open file"
+        if err_type.value == FILE_OPEN_ERROR:
             raise IOError(description)
         else:
             raise WandException(description)
@@ -40,31 +42,6 @@ def _wand_errcheck(rc, func, args):
         return rc
 
 
-# ENUM declarations:
-FilterTypes = {
-    'UndefinedFilter': 0,
-    'PointFilter': 1,
-    'BoxFilter': 2,
-    'TriangleFilter': 3,
-    'HermiteFilter': 4,
-    'HanningFilter': 5,
-    'HammingFilter': 6,
-    'BlackmanFilter': 7,
-    'GaussianFilter': 8,
-    'QuadraticFilter': 9,
-    'CubicFilter': 10,
-    'CatromFilter': 11,
-    'MitchellFilter': 12,
-    'LanczosFilter': 13,
-    'BesselFilter': 14,
-    'SincFilter': 15,
-}
-
-
-class WandException(Exception):
-    pass
-
-
 class MagickWand(ctypes.Structure):
     pass
 
@@ -77,6 +54,9 @@ class FILE(ctypes.Structure):
 
 
 ExceptionType = ctypes.c_int  # TODO: Expand enum choices
+FilterType = ctypes.c_int  # See FilterTypes
+ResourceType = ctypes.c_int  # See ResourceTypes
+StorageType = ctypes.c_int  # See StorageTypes
 MagickBooleanType = ctypes.c_uint
 
 FILE_P = ctypes.POINTER(FILE)
@@ -105,10 +85,15 @@ CloneMagickWand.restype = WAND_P
 CloneMagickWand.argtypes = [WAND_P]
 CloneMagickWand.errcheck = _wand_errcheck
 
+# Unlike ImageMagick, GraphicsMagick's DestroyMagickWand() returns void:
 DestroyMagickWand = _wandlib.DestroyMagickWand
 DestroyMagickWand.argtypes = [WAND_P]
-DestroyMagickWand.restype = MagickBooleanType
-DestroyMagickWand.errcheck = _wand_errcheck
+DestroyMagickWand.restype = None
+
+# Resets a wand to its newly-allocated state so it can be reused:
+ClearMagickWand = _wandlib.ClearMagickWand
+ClearMagickWand.argtypes = [WAND_P]
+ClearMagickWand.restype = None
 
 MagickStripImage = _wandlib.MagickStripImage
 MagickStripImage.argtypes = [WAND_P]
@@ -123,9 +108,74 @@ _MagickReadImageBlob.argtypes = [WAND_P, ctypes.c_void_p, ctypes.c_size_t]
 _MagickReadImageBlob.errcheck = _wand_errcheck
 
 
+class _Py_buffer(ctypes.Structure):
+    _fields_ = [("buf", ctypes.c_void_p), ("obj", ctypes.c_void_p),
+                ("len", ctypes.c_ssize_t), ("itemsize", ctypes.c_ssize_t),
+                ("readonly", ctypes.c_int), ("ndim", ctypes.c_int),
+                ("format", ctypes.c_char_p), ("shape", ctypes.c_void_p),
+                ("strides", ctypes.c_void_p), ("suboffsets", ctypes.c_void_p),
+                ("internal", ctypes.c_void_p)]
+
+
+# ctypes.from_buffer() refuses read-only buffers so CPython's buffer API is
+# used directly to get the address of any buffer without copying it:
+try:
+    _PyObject_GetBuffer = ctypes.pythonapi.PyObject_GetBuffer
+except AttributeError:
+    _PyObject_GetBuffer = None
+else:
+    _PyObject_GetBuffer.restype = ctypes.c_int
+    _PyObject_GetBuffer.argtypes = [ctypes.py_object, ctypes.POINTER(_Py_buffer),
+                                    ctypes.c_int]
+    _PyBuffer_Release = ctypes.pythonapi.PyBuffer_Release
+    _PyBuffer_Release.restype = None
+    _PyBuffer_Release.argtypes = [ctypes.POINTER(_Py_buffer)]
+
+PyBUF_SIMPLE = 0
+
+
+@contextmanager
+def _as_c_buffer(blob):
+    """
+    Yields a (buffer, length) pair suitable for passing blob as a void*
+
+    bytes are passed as-is since ctypes hands C a pointer to the object's own
+    storage. Anything else supporting the buffer protocol (bytearray,
+    memoryview, mmap, etc.) is passed by address without copying, whether or
+    not it is writable, and remains exported until the block exits so an mmap
+    cannot be closed while C is reading from it.
+    """
+
+    if isinstance(blob, bytes):
+        yield blob, len(blob)
+        return
+
+    if _PyObject_GetBuffer is None:
+        # Other Python implementations can only wrap writable buffers in place:
+        view = memoryview(blob)
+        if not view.c_contiguous:
+            raise ValueError("Image data must be a contiguous buffer")
+        if view.readonly:
+            yield (ctypes.c_char * view.nbytes).from_buffer_copy(view), view.nbytes
+        else:
+            yield (ctypes.c_char * view.nbytes).from_buffer(view), view.nbytes
+        return
+
+    buf = _Py_buffer()
+    try:
+        _PyObject_GetBuffer(blob, ctypes.byref(buf), PyBUF_SIMPLE)
+    except BufferError:
+        raise ValueError("Image data must be a contiguous buffer")
+
+    try:
+        yield buf.buf, buf.len
+    finally:
+        _PyBuffer_Release(ctypes.byref(buf))
+
+
 def MagickReadImageBlob(wand, blob):
-    b = ctypes.create_string_buffer(blob)
-    return _MagickReadImageBlob(wand, b, ctypes.sizeof(b))
+    with _as_c_buffer(blob) as (buf, length):
+        return _MagickReadImageBlob(wand, buf, length)
 
 
 _MagickReadImageFile = _wandlib.MagickReadImageFile
@@ -143,6 +193,10 @@ MagickWriteImage.restype = MagickBooleanType
 MagickWriteImage.argtypes = [WAND_P, ctypes.c_char_p]
 MagickWriteImage.errcheck = _wand_errcheck
 
+MagickRelinquishMemory = _wandlib.MagickRelinquishMemory
+MagickRelinquishMemory.restype = ctypes.c_void_p
+MagickRelinquishMemory.argtypes = [ctypes.c_void_p]
+
 _MagickWriteImageBlob = _wandlib.MagickWriteImageBlob
 _MagickWriteImageBlob.restype = ctypes.POINTER(ctypes.c_char)
 _MagickWriteImageBlob.argtypes = [WAND_P, ctypes.POINTER(ctypes.c_size_t)]
@@ -152,7 +206,24 @@ _MagickWriteImageBlob.errcheck = _wand_errcheck
 def MagickWriteImageBlob(wand):
     length = ctypes.c_size_t()
     data = _MagickWriteImageBlob(wand, ctypes.pointer(length))
-    return data[0:length.value]
+    try:
+        return ctypes.string_at(data, length.value)
+    finally:
+        MagickRelinquishMemory(data)
+
+
+def MagickWriteImageBuffer(wand):
+    """
+    Like MagickWriteImageBlob but returns the encoded image without copying it
+
+    See :func:`wand_common.native_buffer` for the lifetime of the result
+    """
+
+    length = ctypes.c_size_t()
+    data = _MagickWriteImageBlob(wand, ctypes.pointer(length))
+
+    return native_buffer(ctypes.addressof(data.contents), length.value,
+                         MagickRelinquishMemory, data)
 
 
 _MagickWriteImageFile = _wandlib.MagickWriteImageFile
@@ -170,6 +241,47 @@ MagickReadImage.restype = MagickBooleanType
 MagickReadImage.argtypes = [WAND_P, ctypes.c_char_p]
 MagickReadImage.errcheck = _wand_errcheck
 
+# Ping functions read only enough of the file to populate the image attributes
+# without decoding any pixel data:
+MagickPingImage = _wandlib.MagickPingImage
+MagickPingImage.restype = MagickBooleanType
+MagickPingImage.argtypes = [WAND_P, ctypes.c_char_p]
+MagickPingImage.errcheck = _wand_errcheck
+
+try:
+    _MagickPingImageBlob = _wandlib.MagickPingImageBlob
+except AttributeError:
+    # Not provided by all GraphicsMagick releases:
+    MagickPingImageBlob = None
+else:
+    _MagickPingImageBlob.restype = MagickBooleanType
+    _MagickPingImageBlob.argtypes = [WAND_P, ctypes.c_void_p, ctypes.c_size_t]
+    _MagickPingImageBlob.errcheck = _wand_errcheck
+
+    def MagickPingImageBlob(wand, blob):
+        with _as_c_buffer(blob) as (buf, length):
+            return _MagickPingImageBlob(wand, buf, length)
+
+MagickGetNumberImages = _wandlib.MagickGetNumberImages
+MagickGetNumberImages.restype = ctypes.c_ulong
+MagickGetNumberImages.argtypes = (WAND_P, )
+
+MagickSetImageIndex = _wandlib.MagickSetImageIndex
+MagickSetImageIndex.restype = MagickBooleanType
+MagickSetImageIndex.argtypes = [WAND_P, ctypes.c_long]
+MagickSetImageIndex.errcheck = _wand_errcheck
+
+# Returns a new wand containing only the current image:
+MagickGetImage = _wandlib.MagickGetImage
+MagickGetImage.restype = WAND_P
+MagickGetImage.argtypes = [WAND_P]
+MagickGetImage.errcheck = _wand_errcheck
+
+MagickSetSize = _wandlib.MagickSetSize
+MagickSetSize.restype = MagickBooleanType
+MagickSetSize.argtypes = [WAND_P, ctypes.c_ulong, ctypes.c_ulong]
+MagickSetSize.errcheck = _wand_errcheck
+
 MagickGetImageHeight = _wandlib.MagickGetImageHeight
 MagickGetImageHeight.restype = ctypes.c_ulong
 MagickGetImageHeight.argtypes = (WAND_P, )
@@ -180,10 +292,26 @@ MagickGetImageWidth.restype = ctypes.c_ulong
 MagickGetImageWidth.argtypes = (WAND_P, )
 MagickGetImageWidth.errcheck = _wand_errcheck
 
-MagickGetImageFormat = _wandlib.MagickGetImageFormat
-MagickGetImageFormat.restype = ctypes.c_char_p
-MagickGetImageFormat.argtypes = (WAND_P, )
-MagickGetImageFormat.errcheck = _wand_errcheck
+# Returns an ImageTypes value. Telling greyscale images from colour ones may
+# require GraphicsMagick to inspect every pixel:
+MagickGetImageType = _wandlib.MagickGetImageType
+MagickGetImageType.restype = ctypes.c_int
+MagickGetImageType.argtypes = (WAND_P, )
+
+_MagickGetImageFormat = _wandlib.MagickGetImageFormat
+_MagickGetImageFormat.restype = ctypes.c_void_p
+_MagickGetImageFormat.argtypes = (WAND_P, )
+_MagickGetImageFormat.errcheck = _wand_errcheck
+
+
+def MagickGetImageFormat(wand):
+    # The returned string is allocated by GraphicsMagick and must be freed:
+    format_p = _MagickGetImageFormat(wand)
+    try:
+        return ctypes.string_at(format_p)
+    finally:
+        MagickRelinquishMemory(format_p)
+
 
 MagickSetImageFormat = _wandlib.MagickSetImageFormat
 MagickSetImageFormat.restype = MagickBooleanType
@@ -200,9 +328,15 @@ MagickScaleImage.restype = MagickBooleanType
 MagickScaleImage.argtypes = [WAND_P, ctypes.c_ulong, ctypes.c_ulong]
 MagickScaleImage.errcheck = _wand_errcheck
 
-MagickResizeImage = _wandlib.MagickScaleImage
+MagickSampleImage = _wandlib.MagickSampleImage
+MagickSampleImage.restype = MagickBooleanType
+MagickSampleImage.argtypes = [WAND_P, ctypes.c_ulong, ctypes.c_ulong]
+MagickSampleImage.errcheck = _wand_errcheck
+
+MagickResizeImage = _wandlib.MagickResizeImage
 MagickResizeImage.restype = MagickBooleanType
-MagickResizeImage.argtypes = [WAND_P, ctypes.c_ulong, ctypes.c_ulong]
+MagickResizeImage.argtypes = [WAND_P, ctypes.c_ulong, ctypes.c_ulong,
+                              FilterType, ctypes.c_double]
 MagickResizeImage.errcheck = _wand_errcheck
 
 MagickCropImage = _wandlib.MagickCropImage
@@ -210,3 +344,79 @@ MagickCropImage.restype = MagickBooleanType
 MagickCropImage.argtypes = [WAND_P, ctypes.c_ulong, ctypes.c_ulong,
                             ctypes.c_ulong, ctypes.c_ulong]
 MagickCropImage.errcheck = _wand_errcheck
+
+MagickGetImageRegion = _wandlib.MagickGetImageRegion
+MagickGetImageRegion.restype = WAND_P
+MagickGetImageRegion.argtypes = [WAND_P, ctypes.c_ulong, ctypes.c_ulong,
+                                 ctypes.c_long, ctypes.c_long]
+MagickGetImageRegion.errcheck = _wand_errcheck
+
+# Raw pixel access copies between the image and a caller-supplied buffer, which
+# must be large enough for columns * rows * len(map) samples:
+_MagickGetImagePixels = _wandlib.MagickGetImagePixels
+_MagickGetImagePixels.restype = MagickBooleanType
+_MagickGetImagePixels.argtypes = [WAND_P, ctypes.c_long, ctypes.c_long,
+                                  ctypes.c_ulong, ctypes.c_ulong, ctypes.c_char_p,
+                                  StorageType, ctypes.c_void_p]
+_MagickGetImagePixels.errcheck = _wand_errcheck
+
+
+def MagickGetImagePixels(wand, x, y, columns, rows, pixel_map, storage, pixels):
+    view = memoryview(pixels)
+    if view.readonly:
+        raise TypeError("Pixel buffer must be writable")
+    if not view.c_contiguous:
+        raise ValueError("Pixel buffer must be contiguous")
+
+    buf = (ctypes.c_char * view.nbytes).from_buffer(view)
+    return _MagickGetImagePixels(wand, x, y, columns, rows, pixel_map, storage, buf)
+
+
+_MagickSetImagePixels = _wandlib.MagickSetImagePixels
+_MagickSetImagePixels.restype = MagickBooleanType
+_MagickSetImagePixels.argtypes = [WAND_P, ctypes.c_long, ctypes.c_long,
+                                  ctypes.c_ulong, ctypes.c_ulong, ctypes.c_char_p,
+                                  StorageType, ctypes.c_void_p]
+_MagickSetImagePixels.errcheck = _wand_errcheck
+
+
+def MagickSetImagePixels(wand, x, y, columns, rows, pixel_map, storage, pixels):
+    with _as_c_buffer(pixels) as (buf, length):
+        return _MagickSetImagePixels(wand, x, y, columns, rows, pixel_map, storage, buf)
+
+
+_MagickGetQuantumDepth = _wandlib.MagickGetQuantumDepth
+_MagickGetQuantumDepth.restype = ctypes.c_char_p
+_MagickGetQuantumDepth.argtypes = [ctypes.POINTER(ctypes.c_ulong)]
+
+
+def MagickGetQuantumDepth():
+    "Returns the number of bits per sample GraphicsMagick was built with"
+
+    depth = ctypes.c_ulong()
+    _MagickGetQuantumDepth(ctypes.byref(depth))
+    return depth.value
+
+
+# Resource limits are process-wide and provided by the core GraphicsMagick
+# library rather than the wand API:
+
+
+def _resource_errcheck(rc, func, args):
+    if not rc:
+        raise WandException("%s%r failed" % (func.__name__, args))
+    return rc
+
+
+SetMagickResourceLimit = _wandlib.SetMagickResourceLimit
+SetMagickResourceLimit.restype = MagickBooleanType
+SetMagickResourceLimit.argtypes = [ResourceType, ctypes.c_int64]
+SetMagickResourceLimit.errcheck = _resource_errcheck
+
+GetMagickResourceLimit = _wandlib.GetMagickResourceLimit
+GetMagickResourceLimit.restype = ctypes.c_int64
+GetMagickResourceLimit.argtypes = [ResourceType]
+
+GetMagickResource = _wandlib.GetMagickResource
+GetMagickResource.restype = ctypes.c_int64
+GetMagickResource.argtypes = [ResourceType]
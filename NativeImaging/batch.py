@@ -0,0 +1,334 @@
+# encoding: utf-8
+"""
+Concurrent processing of many images using any backend
+
+Each job is a (source, operations, destination) tuple:
+
+source
+    Anything the backend's ``open()`` accepts
+operations
+    A sequence of ``(method_name, args)`` or ``(method_name, args, kwargs)``
+    tuples applied in order. Methods which return a new image (``resize``,
+    ``crop``, ``rotate``) replace the working image; in-place methods such as
+    ``thumbnail`` return None and keep it.
+destination
+    A filename or file-like object, optionally paired with a dictionary of
+    ``save()`` keyword arguments as ``(destination, save_kwargs)``. The format
+    defaults to the filename's extension or JPEG.
+
+For example::
+
+    from NativeImaging import batch
+
+    jobs = ((name, [("thumbnail", ((256, 256), ))], name + ".thumb.jpg")
+            for name in filenames)
+
+    for result in batch.run(jobs, "GraphicsMagick", max_workers=8):
+        if result.error:
+            print(result.source, result.error)
+
+The ctypes-based backends release the GIL while the native library is working
+so threads allow a single process to use multiple cores. Backends which hold
+the GIL for part of their work, such as PIL, can use ``processes=True``
+instead: each worker process loads and initializes the backend once when it
+starts and encoded output for file-like destinations is returned through
+:mod:`multiprocessing.shared_memory` rather than being pickled. In that mode
+the backend must be given by name and sources and filename destinations must
+be picklable.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import (FIRST_COMPLETED, Future, ProcessPoolExecutor,
+                                ThreadPoolExecutor, wait)
+from functools import partial
+from io import BytesIO
+from itertools import islice
+from timeit import default_timer
+
+from . import get_image_class
+
+EXTENSION_FORMATS = {
+    "jpg": "JPEG",
+    "jpe": "JPEG",
+    "tif": "TIFF",
+    "jp2": "JP2",
+}
+
+Job = namedtuple("Job", ["source", "operations", "destination"])
+
+
+class BatchResult(namedtuple("BatchResult", ["job", "error", "elapsed"])):
+    """
+    The outcome of a job: error is None or the exception which caused the job
+    to fail and elapsed is the time taken in seconds
+    """
+
+    @property
+    def source(self):
+        return self.job[0]
+
+    @property
+    def destination(self):
+        return self.job[2]
+
+
+def resolve_backend(backend):
+    """Accepts either a backend name for get_image_class() or an image class"""
+
+    if isinstance(backend, str):
+        return get_image_class(backend)
+    else:
+        return backend
+
+
+def apply_operations(image, operations):
+    """Applies a sequence of operations to image and returns the result"""
+
+    for operation in operations:
+        name, args = operation[:2]
+        kwargs = operation[2] if len(operation) > 2 else {}
+
+        result = getattr(image, name)(*args, **kwargs)
+        if result is not None:
+            image = result
+
+    return image
+
+
+def split_destination(destination):
+    """Returns (destination, save_kwargs) with the output format filled in"""
+
+    if isinstance(destination, tuple):
+        destination, save_kwargs = destination
+        save_kwargs = dict(save_kwargs)
+    else:
+        save_kwargs = {}
+
+    if "format" not in save_kwargs:
+        if isinstance(destination, str):
+            extension = os.path.splitext(destination)[1][1:].lower()
+            save_kwargs["format"] = EXTENSION_FORMATS.get(extension, extension.upper() or "JPEG")
+        else:
+            save_kwargs["format"] = "JPEG"
+
+    return destination, save_kwargs
+
+
+def process_job(image_class, job):
+    """Runs a single job, returning a BatchResult rather than raising errors"""
+
+    start_time = default_timer()
+
+    try:
+        source, operations, destination = job
+        destination, save_kwargs = split_destination(destination)
+
+        image = apply_operations(image_class.open(source), operations)
+        image.save(destination, **save_kwargs)
+    except Exception as exc:
+        return BatchResult(job, exc, default_timer() - start_time)
+
+    return BatchResult(job, None, default_timer() - start_time)
+
+
+# The image class used by process_worker_job(), set by initialize_worker():
+_worker_image_class = None
+
+
+def initialize_worker(backend):
+    """
+    Loads the backend once when a worker process starts so library loading and
+    initialization (e.g. InitializeMagick) are not repeated for each job
+    """
+
+    global _worker_image_class
+    _worker_image_class = resolve_backend(backend)
+
+    # get_image_class() only checks that a native library exists; backends
+    # which load it on first use provide initialize() to do so up front:
+    module = sys.modules.get(getattr(_worker_image_class, "__module__", None))
+    initialize = getattr(module, "initialize", None)
+    if initialize is not None:
+        initialize()
+
+
+def process_worker_job(job):
+    """
+    Runs a job in a worker process, returning (error, elapsed, shm_name, size)
+
+    A destination of None requests that the encoded image be returned in a new
+    shared memory block which the caller must unlink after reading size bytes
+    """
+
+    source, operations, (destination, save_kwargs) = job
+
+    if destination is not None:
+        result = process_job(_worker_image_class, job)
+        return result.error, result.elapsed, None, 0
+
+    output = BytesIO()
+    result = process_job(_worker_image_class, Job(source, operations, (output, save_kwargs)))
+
+    if result.error is not None:
+        return result.error, result.elapsed, None, 0
+
+    data = output.getbuffer()
+    shm = _create_shared_memory(max(len(data), 1))
+    try:
+        shm.buf[:len(data)] = data
+        return None, result.elapsed, shm.name, len(data)
+    finally:
+        del data
+        shm.close()
+
+
+def _create_shared_memory(size):
+    """
+    Creates a shared memory block which this process' resource tracker won't
+    unlink when it exits, as ownership passes to the caller
+    """
+
+    # Python 3.8+, so only required by processes=True:
+    from multiprocessing import resource_tracker
+    from multiprocessing.shared_memory import SharedMemory
+
+    try:
+        # Python 3.13+:
+        return SharedMemory(create=True, size=size, track=False)
+    except TypeError:
+        pass
+
+    shm = SharedMemory(create=True, size=size)
+
+    if os.name == "posix":
+        # The tracker knows POSIX blocks by their name with a leading slash:
+        resource_tracker.unregister("/" + shm.name, "shared_memory")
+
+    return shm
+
+
+def _read_shared_memory(name, size, destination):
+    from multiprocessing.shared_memory import SharedMemory
+
+    shm = SharedMemory(name=name)
+    try:
+        if destination is not None:
+            destination.write(shm.buf[:size])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def _submit_thread_job(executor, image_class, job):
+    return executor.submit(process_job, image_class, job)
+
+
+def _collect_thread_job(job, future):
+    return future.result()
+
+
+def _discard_thread_job(future):
+    pass
+
+
+def _submit_process_job(executor, job):
+    try:
+        source, operations, destination = job
+        destination, save_kwargs = split_destination(destination)
+    except Exception as exc:
+        # Report the bad job in its result as process_job() does for threads:
+        future = Future()
+        future.set_exception(exc)
+        return future
+
+    if not isinstance(destination, str):
+        # File-like objects stay in this process and are filled from shared memory:
+        destination = None
+
+    return executor.submit(process_worker_job, Job(source, operations, (destination, save_kwargs)))
+
+
+def _collect_process_job(job, future):
+    try:
+        error, elapsed, shm_name, size = future.result()
+    except Exception as exc:
+        # Unpicklable jobs or errors and worker crashes end up here:
+        return BatchResult(job, exc, 0.0)
+
+    if shm_name is not None:
+        try:
+            _read_shared_memory(shm_name, size, split_destination(job[2])[0])
+        except Exception as exc:
+            error = exc
+
+    return BatchResult(job, error, elapsed)
+
+
+def _discard_process_job(future):
+    """Frees the output of a job whose result will never be collected"""
+
+    try:
+        shm_name, size = future.result()[2:]
+    except Exception:
+        return
+
+    if shm_name is not None:
+        _read_shared_memory(shm_name, size, None)
+
+
+def run(jobs, backend="GraphicsMagick", max_workers=None, processes=False):
+    """
+    Processes jobs on a pool of max_workers threads, or worker processes if
+    processes is true, yielding a BatchResult for each as it completes
+
+    jobs may be any iterable, including a generator: only a small multiple of
+    max_workers jobs are queued at any time so memory use is bounded. Results
+    are yielded in completion order rather than submission order and errors
+    are reported in the results rather than raised. If iteration stops early,
+    queued jobs are cancelled and those already running are waited for.
+    """
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=max_workers,
+                                       initializer=initialize_worker,
+                                       initargs=(backend, ))
+        submit = partial(_submit_process_job, executor)
+        collect = _collect_process_job
+        discard = _discard_process_job
+    else:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        submit = partial(_submit_thread_job, executor, resolve_backend(backend))
+        collect = _collect_thread_job
+        discard = _discard_thread_job
+
+    jobs = iter(jobs)
+    pending = {}
+
+    with executor:
+        try:
+            pending.update((submit(job), job) for job in islice(jobs, 2 * max_workers))
+
+            while pending:
+                done = wait(pending, return_when=FIRST_COMPLETED)[0]
+
+                for future in done:
+                    yield collect(pending.pop(future), future)
+
+                for job in islice(jobs, len(done)):
+                    pending[submit(job)] = job
+        finally:
+            # Jobs are still outstanding if the caller stopped iterating early or
+            # the jobs iterable raised an exception. Those which haven't started
+            # are cancelled and the output of the rest is freed:
+            for future in pending:
+                future.cancel()
+
+            for future in pending:
+                if not future.cancelled():
+                    discard(future)
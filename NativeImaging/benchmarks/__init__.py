@@ -0,0 +1,62 @@
+# encoding: utf-8
+"""
+A repeatable benchmark of the available backends
+
+Each backend opens, thumbnails and encodes every image in a corpus, timing
+each phase separately after a number of warmup passes which are discarded.
+Every backend runs in its own process so its peak RSS can be reported. The
+results can be saved as JSON and two result files compared to find
+regressions::
+
+    python -m NativeImaging.benchmarks.run --output before.json PIL GraphicsMagick
+    # ... make changes ...
+    python -m NativeImaging.benchmarks.run --output after.json PIL GraphicsMagick
+    python -m NativeImaging.benchmarks.compare before.json after.json
+
+The corpus is either a directory of images, such as the checked-in
+``tests/samples``, given using ``--corpus`` or, by default, synthetic images
+generated once by :func:`NativeImaging.benchmarks.corpus.generate_corpus` so no
+network access is needed.
+
+Images are thumbnailed straight after they are opened, as applications do, so
+backends which defer decoding can use draft-mode shortcuts such as decoding a
+JPEG at a reduced scale. The open phase then only reads the header and
+decoding is counted in the thumbnail phase, while backends which decode
+eagerly do so during open, so only the total is directly comparable between
+them. ``--load`` adds an explicit full-size ``load()`` to the open phase so
+every backend decodes there, at the cost of defeating those shortcuts.
+
+The other modules in this package are focused benchmarks of particular
+features, each run with ``python -m NativeImaging.benchmarks.<module>``:
+
+``aio``
+    Event loop responsiveness with and without :mod:`NativeImaging.aio`
+``batch``
+    How :mod:`NativeImaging.batch` throughput scales with the number of workers
+``binding``
+    The ctypes and CFFI GraphicsMagick bindings on the current interpreter
+``blob``
+    Memory use and latency of GraphicsMagick's in-memory input paths
+``blob_soak``
+    Fails if repeatedly saving to file-like objects leaks memory
+``calibrate_routing``
+    Times the installed backends and saves a routing table for
+    ``get_image_class("auto")``
+``crop``
+    Cropping small tiles from a very large image
+``filters``
+    GraphicsMagick's resampling filters across source sizes
+``imports``
+    Import and initialization times of NativeImaging and its backends
+``pool``
+    The effect of ``GraphicsMagickImage.wand_pool`` on small images
+``probe``
+    :func:`NativeImaging.probe` against opening images with a backend
+``quality``
+    Bisecting the JPEG quality for ``save(max_bytes=...)``
+``threads``
+    GraphicsMagick's OpenMP threads against Python worker threads
+
+These use the sample images in a source checkout's ``tests/samples`` directory
+unless given others.
+"""
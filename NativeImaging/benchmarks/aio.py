@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Measure event loop responsiveness while thumbnails are being generated
+
+A ticker coroutine sleeps for --interval milliseconds in a loop and records how
+late it wakes up. "blocking" calls the backend directly from coroutines, as a
+naive asyncio service would; "async" uses NativeImaging.aio.AsyncBackend.
+"""
+from __future__ import absolute_import, division, print_function
+
+import asyncio
+import os
+import sys
+from io import BytesIO
+from optparse import OptionParser
+from timeit import default_timer
+
+from .. import get_image_class
+from ..aio import AsyncBackend
+from .corpus import SAMPLE_DIRECTORY
+
+
+async def ticker(interval, lags, stop):
+    while not stop.is_set():
+        start_time = default_timer()
+        await asyncio.sleep(interval)
+        lags.append(default_timer() - start_time - interval)
+
+
+async def blocking_job(image_class, sample, size):
+    img = image_class.open(sample)
+    img.thumbnail((size, size))
+    img.save(BytesIO(), format="JPEG")
+
+
+async def async_job(images, sample, size):
+    img = await images.open(sample)
+    await img.thumbnail((size, size))
+    await img.save(BytesIO(), format="JPEG")
+    img.close()
+
+
+async def run_variant(variant, backend_name, samples, options):
+    image_class = get_image_class(backend_name)
+    images = AsyncBackend(image_class, max_workers=options.max_workers)
+
+    lags = []
+    stop = asyncio.Event()
+    tick_task = asyncio.ensure_future(ticker(options.interval / 1000, lags, stop))
+
+    jobs = [samples[i % len(samples)] for i in range(options.jobs)]
+
+    start_time = default_timer()
+
+    if variant == "blocking":
+        await asyncio.gather(*(blocking_job(image_class, i, options.size) for i in jobs))
+    else:
+        await asyncio.gather(*(async_job(images, i, options.size) for i in jobs))
+
+    elapsed = default_timer() - start_time
+
+    stop.set()
+    await tick_task
+    images.close()
+
+    lags.sort()
+    return elapsed, len(jobs) / elapsed, lags[len(lags) // 2], lags[int(len(lags) * 0.99)], lags[-1]
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [backend ...]")
+    parser.add_option('--sample-dir', default=SAMPLE_DIRECTORY,
+                      help="Path to test images (default: %default)")
+    parser.add_option("-n", "--jobs", type="int", default=24)
+    parser.add_option("--max-workers", type="int", default=os.cpu_count())
+    parser.add_option("--size", type="int", default=256)
+    parser.add_option("--interval", type="float", default=5,
+                      help="Ticker interval in milliseconds (default: %default)")
+
+    (options, backend_names) = parser.parse_args()
+
+    if not backend_names:
+        backend_names = ('PIL', 'GraphicsMagick')
+
+    samples = [os.path.join(options.sample_dir, i) for i in sorted(os.listdir(options.sample_dir))
+               if i.endswith(".jpg")]
+
+    print("%16s\t%8s\t%10s\t%10s\t%10s\t%10s" % ("backend", "variant", "images/sec",
+                                                  "median lag", "p99 lag", "max lag"))
+
+    for backend_name in backend_names:
+        try:
+            get_image_class(backend_name)
+        except (ImportError, KeyError):
+            print("Can't load %s backend" % backend_name, file=sys.stderr)
+            continue
+
+        for variant in ("blocking", "async"):
+            elapsed, throughput, median, p99, worst = asyncio.run(
+                run_variant(variant, backend_name, samples, options))
+
+            print("%16s\t%8s\t%10.1f\t%8.1fms\t%8.1fms\t%8.1fms"
+                  % (backend_name, variant, throughput, 1000 * median, 1000 * p99, 1000 * worst))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
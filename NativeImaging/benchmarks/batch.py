@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Report how batch thumbnailing throughput scales with the number of workers
+"""
+from __future__ import absolute_import, division, print_function
+
+import multiprocessing
+import sys
+from io import BytesIO
+from optparse import OptionParser
+from timeit import default_timer
+
+from .. import batch, get_image_class
+from .corpus import SAMPLE_DIRECTORY, find_images
+
+
+def worker_counts(maximum):
+    count = 1
+    while count < maximum:
+        yield count
+        count *= 2
+    yield maximum
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [backend ...]")
+    parser.add_option('--sample-dir', default=SAMPLE_DIRECTORY,
+                      help="Path to test images (default: %default)")
+    parser.add_option("-n", "--repeat", type="int", default=20,
+                      help="Number of times to process each sample (default: %default)")
+    parser.add_option("--max-workers", type="int", default=multiprocessing.cpu_count())
+    parser.add_option("--processes", action="store_true", default=False,
+                      help="Use worker processes rather than threads")
+
+    (options, backend_names) = parser.parse_args()
+
+    if not backend_names:
+        backend_names = ('PIL', 'GraphicsMagick', 'aware')
+
+    samples = find_images(options.sample_dir)
+
+    for backend_name in backend_names:
+        try:
+            get_image_class(backend_name)
+        except (ImportError, KeyError):
+            print("Can't load %s backend" % backend_name, file=sys.stderr)
+            continue
+
+        print("%s:" % backend_name)
+
+        baseline = None
+
+        for workers in worker_counts(options.max_workers):
+            jobs = ((sample, [("thumbnail", ((256, 256), ))], (BytesIO(), {"format": "JPEG"}))
+                    for _ in range(options.repeat) for sample in samples)
+
+            count = errors = 0
+            start_time = default_timer()
+
+            for result in batch.run(jobs, backend_name, max_workers=workers,
+                                    processes=options.processes):
+                count += 1
+                if result.error is not None:
+                    errors += 1
+
+            throughput = count / (default_timer() - start_time)
+            if baseline is None:
+                baseline = throughput
+
+            print("\t%3d %s:\t%8.1f images/sec\t%5.2fx\t(%d errors)"
+                  % (workers, "processes" if options.processes else "threads", throughput,
+                     throughput / baseline, errors))
+
+        print()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
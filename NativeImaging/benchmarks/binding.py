@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare the ctypes and CFFI GraphicsMagick bindings
+
+Run this with each interpreter of interest (e.g. CPython and PyPy); each
+binding is measured in its own process
+"""
+from __future__ import absolute_import, division, print_function
+
+import platform
+import sys
+from io import BytesIO
+from optparse import SUPPRESS_HELP, OptionParser
+from timeit import default_timer
+
+from .corpus import SAMPLE_JPG
+from .processes import run_module
+
+BINDINGS = ("ctypes", "cffi")
+
+
+def per_call(func, iterations):
+    start_time = default_timer()
+    for _ in range(iterations):
+        func()
+    return (default_timer() - start_time) / iterations
+
+
+def child(calls, thumbnails):
+    from ..backends.GraphicsMagick import GraphicsMagickImage, wand_wrapper
+
+    img = GraphicsMagickImage.open(SAMPLE_JPG, lazy=False)
+    wand = img._wand
+
+    def size():
+        return (wand_wrapper.MagickGetImageWidth(wand),
+                wand_wrapper.MagickGetImageHeight(wand))
+
+    def get_format():
+        return wand_wrapper.MagickGetImageFormat(wand)
+
+    size_time = per_call(size, calls)
+    format_time = per_call(get_format, calls)
+
+    start_time = default_timer()
+    for _ in range(thumbnails):
+        thumb = GraphicsMagickImage.open(SAMPLE_JPG)
+        thumb.thumbnail((256, 256))
+        thumb.save(BytesIO(), "JPEG")
+    throughput = thumbnails / (default_timer() - start_time)
+
+    print(wand_wrapper.__name__, size_time, format_time, throughput)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("--calls", type="int", default=100000)
+    parser.add_option("--thumbnails", type="int", default=200)
+    parser.add_option("--child", action="store_true", help=SUPPRESS_HELP)
+
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        return child(options.calls, options.thumbnails)
+
+    print("%s %s" % (platform.python_implementation(), platform.python_version()))
+    print()
+    print("%8s\t%14s\t%14s\t%16s" % ("binding", "size (us)", "format (us)",
+                                     "thumbnails/sec"))
+
+    for binding in BINDINGS:
+        try:
+            output = run_module("NativeImaging.benchmarks.binding", "--child",
+                                "--calls", str(options.calls),
+                                "--thumbnails", str(options.thumbnails),
+                                NATIVEIMAGING_GM_BINDING=binding)
+        except Exception as exc:
+            print("%8s\tunavailable: %s" % (binding, exc))
+            continue
+
+        module, size_time, format_time, throughput = output.split()
+        print("%8s\t%14.2f\t%14.2f\t%16.1f" % (binding, 1e6 * float(size_time),
+                                               1e6 * float(format_time),
+                                               float(throughput)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
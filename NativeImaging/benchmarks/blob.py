@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare memory and latency of the GraphicsMagick blob input paths
+
+Each variant runs in its own process so peak RSS can be attributed to it
+"""
+from __future__ import absolute_import, division, print_function
+
+import ctypes
+import mmap
+import os
+import sys
+import tempfile
+from io import BytesIO
+from optparse import SUPPRESS_HELP, OptionParser
+from timeit import default_timer
+
+from .corpus import SAMPLE_JPG
+from .processes import run_module
+from .stats import format_bytes, peak_rss
+
+VARIANTS = ("copy", "bytes", "bytesio", "mmap")
+
+
+def make_large_tiff(path, size=(8192, 5440)):
+    from ..backends.GraphicsMagick import GraphicsMagickImage
+
+    master = GraphicsMagickImage.open(SAMPLE_JPG)
+    with open(path, "wb") as f:
+        master.resize(size).save(f, "TIFF")
+
+
+def read_with(variant, filename):
+    from ..backends.GraphicsMagick import GraphicsMagickImage, wand_wrapper
+
+    with open(filename, "rb") as f:
+        if variant == "copy":
+            # The previous behaviour: read() followed by a second copy into a
+            # ctypes string buffer:
+            img = GraphicsMagickImage()
+            wand_wrapper.MagickReadImageBlob(img._wand,
+                                             ctypes.create_string_buffer(f.read()))
+        elif variant == "bytes":
+            img = GraphicsMagickImage()
+            wand_wrapper.MagickReadImageBlob(img._wand, f.read())
+        elif variant == "bytesio":
+            img = GraphicsMagickImage.open(BytesIO(f.read()))
+        elif variant == "mmap":
+            # The mapping is read in place so it must stay open until loaded:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                img = GraphicsMagickImage.open(m, lazy=False)
+            finally:
+                m.close()
+        else:
+            raise ValueError("Unknown variant %s" % variant)
+
+    return img
+
+
+def child(variant, filename, iterations):
+    baseline = peak_rss()
+    times = []
+
+    for _ in range(iterations):
+        start_time = default_timer()
+        img = read_with(variant, filename)
+        times.append(default_timer() - start_time)
+        del img
+
+    print(min(times), sorted(times)[len(times) // 2], peak_rss() - baseline)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [large.tif]")
+    parser.add_option("-n", "--iterations", type="int", default=5)
+    parser.add_option("--child", help=SUPPRESS_HELP)
+
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        return child(options.child, args[0], options.iterations)
+
+    if args:
+        filename = args[0]
+    else:
+        filename = os.path.join(tempfile.gettempdir(), "blob-bench.tif")
+        if not os.path.exists(filename):
+            print("Generating %s" % filename)
+            make_large_tiff(filename)
+
+    print("%s: %s" % (filename, format_bytes(os.path.getsize(filename))))
+    print()
+    print("%10s\t%8s\t%8s\t%10s" % ("variant", "best", "median", "peak RSS"))
+
+    for variant in VARIANTS:
+        output = run_module("NativeImaging.benchmarks.blob", "--child", variant,
+                            "-n", str(options.iterations), filename)
+        best, median, rss = output.split()
+        print("%10s\t%8.3f\t%8.3f\t%10s" % (variant, float(best), float(median),
+                                            format_bytes(int(rss))))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
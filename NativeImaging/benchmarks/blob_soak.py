@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Confirm that saving GraphicsMagick images to file-like objects doesn't leak
+
+Repeatedly saves a small image into a BytesIO and fails if resident memory
+keeps growing once the allocator has warmed up
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys
+from io import BytesIO
+from optparse import OptionParser
+
+from ..backends.GraphicsMagick import GraphicsMagickImage
+from .corpus import SAMPLE_JPG
+from .stats import current_rss, format_bytes
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--iterations", type="int", default=100000)
+    parser.add_option("--sample-every", type="int", default=10000)
+    parser.add_option("--max-growth", type="int", default=4 * 1024 * 1024,
+                      help="Maximum RSS growth in bytes after warmup (default: %default)")
+    parser.add_option("--buffer", action="store_true",
+                      help="Use encode() rather than save()")
+
+    (options, args) = parser.parse_args()
+
+    if current_rss() is None:
+        print("Unable to measure RSS on this platform", file=sys.stderr)
+        return 2
+
+    img = GraphicsMagickImage.open(SAMPLE_JPG)
+    img.thumbnail((64, 64))
+
+    baseline = None
+
+    for i in range(1, options.iterations + 1):
+        if options.buffer:
+            data = img.encode("JPEG")
+            memoryview(data).tobytes()
+            data.release()
+        else:
+            img.save(BytesIO(), "JPEG")
+
+        if i % options.sample_every == 0:
+            rss = current_rss()
+            # The first sample is taken after the allocator has settled:
+            if baseline is None:
+                baseline = rss
+            print("%8d saves: RSS %s (%+d bytes)" % (i, format_bytes(rss), rss - baseline))
+
+    growth = current_rss() - baseline
+    if growth > options.max_growth:
+        print("RSS grew by %s" % format_bytes(growth), file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
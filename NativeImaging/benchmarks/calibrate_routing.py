@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Time each backend on the sample images and save a routing table for get_image_class("auto")
+
+Point the NATIVEIMAGING_ROUTING_TABLE environment variable at the output file
+to use it.
+"""
+from __future__ import absolute_import, division, print_function
+
+import logging
+import os
+import sys
+from collections import defaultdict
+from io import BytesIO
+from optparse import OptionParser
+from timeit import default_timer
+
+from .. import get_image_class
+from ..headers import read_header, sniff_format
+from ..routing import DEFAULT_ROUTES, Router
+from .corpus import SAMPLE_DIRECTORY, find_images
+
+
+def time_backend(image_class, filename, iterations):
+    """Returns the best time for open + thumbnail + save or None if it fails"""
+
+    best = None
+
+    for i in range(iterations):
+        start_time = default_timer()
+
+        try:
+            img = image_class.open(filename)
+            img.thumbnail((256, 256))
+            if getattr(img, "mode", "RGB") not in ("RGB", "L"):
+                img = img.convert("RGB")
+            img.save(BytesIO(), format="JPEG")
+        except Exception as exc:
+            logging.info("%s cannot process %s: %s", image_class, filename, exc)
+            return None
+
+        elapsed = default_timer() - start_time
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [BACKEND...]")
+    parser.add_option("-v", default=0, dest="verbosity", action="count")
+    parser.add_option('--sample-dir', default=SAMPLE_DIRECTORY,
+                      help="Path to test images (default: %default)")
+    parser.add_option("--iterations", type="int", default=5,
+                      help="Runs per backend and image (default: %default)")
+    parser.add_option("--output", default="routing.json",
+                      help="Routing table to write (default: %default)")
+
+    (options, backend_names) = parser.parse_args()
+
+    if options.verbosity > 1:
+        log_level = logging.DEBUG
+    elif options.verbosity > 0:
+        log_level = logging.INFO
+    else:
+        log_level = logging.WARNING
+
+    logging.basicConfig(format="%(asctime)s [%(levelname)s]: %(message)s",
+                        level=log_level)
+
+    if not backend_names:
+        backend_names = ('PIL', 'GraphicsMagick', 'aware', 'java')
+
+    backends = {}
+
+    for backend_name in backend_names:
+        try:
+            backends[backend_name] = get_image_class(backend_name)
+        except (ImportError, KeyError):
+            print("Can't load %s backend" % backend_name, file=sys.stderr)
+
+    # format -> backend name -> total time over every sample of that format:
+    totals = defaultdict(lambda: defaultdict(float))
+    failures = defaultdict(set)
+
+    for path in find_images(options.sample_dir):
+        filename = os.path.basename(path)
+        format = sniff_format(read_header(path))
+
+        if format is None:
+            logging.info("Skipping %s: unknown format", filename)
+            continue
+
+        for backend_name, image_class in sorted(backends.items()):
+            elapsed = time_backend(image_class, path, options.iterations)
+
+            if elapsed is None:
+                failures[format].add(backend_name)
+            else:
+                totals[format][backend_name] += elapsed
+                print("%-10s %-16s %-40s %0.3fs" % (format, backend_name, filename, elapsed))
+
+    routes = dict(DEFAULT_ROUTES)
+
+    for format, times in totals.items():
+        ranked = sorted((name for name in times if name not in failures[format]),
+                        key=times.get)
+        # Keep any backends we couldn't measure here as a last resort:
+        fallback = [name for name in DEFAULT_ROUTES.get(format, DEFAULT_ROUTES["*"])
+                    if name not in ranked]
+        routes[format] = ranked + fallback
+
+    Router(routes).save(options.output)
+
+    print()
+    for format in sorted(routes):
+        print("%-10s %s" % (format, ", ".join(routes[format])))
+    print("\nSaved routing table to %s" % options.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Compare two benchmark result files and report any regressions
+
+A phase has regressed when its median is more than the threshold slower than
+the baseline's and also slower than the baseline's 95th percentile, so
+ordinary run-to-run noise isn't reported. Peak RSS regresses when it grows by
+more than the threshold. The exit status is 1 if anything regressed.
+"""
+from __future__ import absolute_import, division, print_function
+
+import json
+import sys
+from collections import namedtuple
+from optparse import OptionParser
+
+from .run import PHASES, RESULTS_VERSION
+from .stats import format_bytes
+
+Change = namedtuple("Change", ["backend", "item", "metric", "baseline", "candidate", "ratio",
+                               "regression"])
+
+
+def load_results(path):
+    with open(path) as f:
+        results = json.load(f)
+
+    if results.get("version") != RESULTS_VERSION:
+        raise ValueError("%s contains version %s results, not version %d"
+                         % (path, results.get("version"), RESULTS_VERSION))
+
+    return results
+
+
+def _compare_timings(backend_name, item, baseline, candidate, threshold):
+    for phase in PHASES + ("total", ):
+        if phase not in baseline or phase not in candidate:
+            continue
+
+        old, new = baseline[phase], candidate[phase]
+        ratio = new["median"] / old["median"] if old["median"] else 1.0
+
+        regression = ratio > 1 + threshold and new["median"] > old["p95"]
+
+        yield Change(backend_name, item, phase, old["median"], new["median"], ratio,
+                     regression)
+
+
+def compare(baseline, candidate, threshold=0.1, files=False):
+    """
+    Yields a Change for each phase of each backend present in both results,
+    and for each file if files is true, and for peak RSS
+    """
+
+    for backend_name, new in candidate["backends"].items():
+        old = baseline["backends"].get(backend_name)
+        if old is None:
+            continue
+
+        for change in _compare_timings(backend_name, "corpus", old["phases"], new["phases"],
+                                       threshold):
+            yield change
+
+        if files:
+            for filename, new_file in new["files"].items():
+                if filename in old["files"]:
+                    for change in _compare_timings(backend_name, filename,
+                                                   old["files"][filename], new_file,
+                                                   threshold):
+                        yield change
+
+        if old.get("peak_rss") and new.get("peak_rss"):
+            ratio = new["peak_rss"] / old["peak_rss"]
+            yield Change(backend_name, "corpus", "peak_rss", old["peak_rss"], new["peak_rss"],
+                         ratio, ratio > 1 + threshold)
+
+
+def format_value(metric, value):
+    if metric == "peak_rss":
+        return format_bytes(value)
+    else:
+        return "%.1fms" % (value * 1000)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] BASELINE.json CANDIDATE.json")
+    parser.add_option("--threshold", type="float", default=0.1,
+                      help="Fractional slowdown treated as a regression (default: %default)")
+    parser.add_option("--files", action="store_true", default=False,
+                      help="Also compare the results for each file")
+
+    (options, args) = parser.parse_args()
+
+    if len(args) != 2:
+        parser.error("Two result files are required")
+
+    baseline, candidate = [load_results(path) for path in args]
+
+    if baseline["settings"] != candidate["settings"]:
+        print("Warning: the results were produced using different settings", file=sys.stderr)
+
+    regressions = 0
+
+    for change in compare(baseline, candidate, options.threshold, options.files):
+        if change.regression:
+            regressions += 1
+            flag = "REGRESSION"
+        elif change.ratio < 1 - options.threshold:
+            flag = "improved"
+        else:
+            flag = ""
+
+        print("%-16s %-32s %-10s %10s -> %10s %+7.1f%% %s"
+              % (change.backend, change.item, change.metric,
+                 format_value(change.metric, change.baseline),
+                 format_value(change.metric, change.candidate),
+                 (change.ratio - 1) * 100, flag))
+
+    if regressions:
+        print("\n%d regression(s) found" % regressions)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
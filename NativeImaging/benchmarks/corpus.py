@@ -0,0 +1,87 @@
+# encoding: utf-8
+"""
+Synthetic benchmark images which can be generated without network access
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import random
+import tempfile
+
+from ..batch import EXTENSION_FORMATS, resolve_backend
+
+DEFAULT_DIRECTORY = os.path.join(tempfile.gettempdir(), "NativeImaging-benchmark-corpus")
+
+# The sample images checked in alongside the tests, which are only available in
+# a source checkout:
+SAMPLE_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))), "tests", "samples")
+
+SAMPLE_JPG = os.path.join(SAMPLE_DIRECTORY, "5071384885_c5f331d337_b.jpg")
+
+DEFAULT_SIZES = ((1024, 768), (4000, 3000))
+
+DEFAULT_FORMATS = ("JPEG", "PNG", "TIFF")
+
+# Random noise enlarged from this size has smooth detail which compresses
+# roughly like a photograph:
+TILE_SIZE = 64
+
+FORMAT_EXTENSIONS = dict((format, extension) for extension, format in EXTENSION_FORMATS.items()
+                         if extension != "jpe")
+
+
+def find_images(directory):
+    """Returns the sorted paths of the non-hidden files in directory"""
+
+    return [os.path.join(directory, filename)
+            for filename in sorted(os.listdir(directory))
+            if not filename.startswith(".")
+            and os.path.isfile(os.path.join(directory, filename))]
+
+
+def generate_corpus(directory=DEFAULT_DIRECTORY, sizes=DEFAULT_SIZES, formats=DEFAULT_FORMATS,
+                    backend="PIL", seed=0):
+    """
+    Creates an image of each size in each format in directory, unless it
+    already exists, and returns their paths
+
+    The images are the same for a given seed regardless of the backend used to
+    create them, which must support frombuffer(), resize() and saving in each
+    format.
+    """
+
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    image_class = resolve_backend(backend)
+    tile = None
+    filenames = []
+
+    for width, height in sizes:
+        image = None
+
+        for format in formats:
+            extension = FORMAT_EXTENSIONS.get(format, format.lower())
+            filename = os.path.join(directory, "synthetic-%d-%dx%d.%s" % (seed, width, height,
+                                                                          extension))
+            filenames.append(filename)
+
+            if os.path.exists(filename):
+                continue
+
+            if image is None:
+                if tile is None:
+                    noise = random.Random(seed).randbytes(TILE_SIZE * TILE_SIZE * 3)
+                    tile = image_class.frombuffer("RGB", (TILE_SIZE, TILE_SIZE), noise,
+                                                  "raw", "RGB", 0, 1)
+
+                image = tile.resize((width, height), getattr(image_class, "BICUBIC", 3))
+
+            # Write to a temporary name so an interrupted run is regenerated:
+            temp_filename = "%s.%d.tmp" % (filename, os.getpid())
+            with open(temp_filename, "wb") as f:
+                image.save(f, format=format)
+            os.replace(temp_filename, filename)
+
+    return filenames
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare the cost of cropping small regions out of a very large image
+
+Each variant runs in its own process so peak RSS can be attributed to it
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+import tempfile
+from optparse import SUPPRESS_HELP, OptionParser
+from timeit import default_timer
+
+from .corpus import SAMPLE_JPG
+from .processes import run_module
+from .stats import format_bytes, peak_rss
+
+VARIANTS = ("clone", "region", "lazy", "open", "cached")
+
+
+def make_large_tiff(path, size):
+    from ..backends.GraphicsMagick import GraphicsMagickImage
+
+    master = GraphicsMagickImage.open(SAMPLE_JPG)
+    with open(path, "wb") as f:
+        master.resize((size, size), GraphicsMagickImage.FAST).save(f, "TIFF")
+
+
+def child(variant, filename, tile_size, tiles):
+    from ..backends.GraphicsMagick import GraphicsMagickImage, MasterCache, wand_wrapper
+
+    if variant == "cached":
+        # The master is decoded once, below, and each tile is a cache hit:
+        GraphicsMagickImage.master_cache = MasterCache(max_bytes=16 * 1024 ** 3)
+
+    master = GraphicsMagickImage.open(filename, lazy=(variant in ("lazy", "open")))
+    width, height = master.size
+
+    boxes = []
+    for i in range(tiles):
+        x0 = (i * 7919 * tile_size) % (width - tile_size)
+        y0 = (i * 104729 * tile_size) % (height - tile_size)
+        boxes.append((x0, y0, x0 + tile_size, y0 + tile_size))
+
+    baseline = peak_rss()
+    start_time = default_timer()
+
+    for box in boxes:
+        if variant == "clone":
+            # The previous behaviour: clone the entire wand and crop the copy:
+            x0, y0, x1, y1 = box
+            tile = GraphicsMagickImage(magick_wand=wand_wrapper.CloneMagickWand(master._wand))
+            wand_wrapper.MagickCropImage(tile._wand, x1 - x0, y1 - y0, x0, y0)
+        elif variant in ("open", "cached"):
+            # A one-off region read which doesn't keep a master image around:
+            tile = GraphicsMagickImage.open(filename, region=box)
+            tile.load()
+        else:
+            tile = master.crop(box)
+            tile.load()
+
+        assert tile.size == (tile_size, tile_size)
+        del tile
+
+    elapsed = default_timer() - start_time
+    print(elapsed / tiles, peak_rss() - baseline)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [large.tif]")
+    parser.add_option("--source-size", type="int", default=20000,
+                      help="Size of the generated test image (default: %default)")
+    parser.add_option("--tile-size", type="int", default=256)
+    parser.add_option("-n", "--tiles", type="int", default=20)
+    parser.add_option("--child", help=SUPPRESS_HELP)
+
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        return child(options.child, args[0], options.tile_size, options.tiles)
+
+    if args:
+        filename = args[0]
+    else:
+        filename = os.path.join(tempfile.gettempdir(),
+                                "crop-bench-%d.tif" % options.source_size)
+        if not os.path.exists(filename):
+            print("Generating %s" % filename)
+            make_large_tiff(filename, options.source_size)
+
+    print("%s: %s" % (filename, format_bytes(os.path.getsize(filename))))
+    print()
+    print("%10s\t%12s\t%18s" % ("variant", "ms per tile", "peak RSS increase"))
+
+    for variant in VARIANTS:
+        output = run_module("NativeImaging.benchmarks.crop", "--child", variant,
+                            "--tile-size", str(options.tile_size),
+                            "-n", str(options.tiles), filename)
+        per_tile, rss = output.split()
+        print("%10s\t%12.1f\t%18s" % (variant, 1000 * float(per_tile),
+                                      format_bytes(int(rss))))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
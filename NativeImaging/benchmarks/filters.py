@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare GraphicsMagick resampling filters across source image sizes
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys
+from optparse import OptionParser
+from timeit import default_timer
+
+from ..backends.GraphicsMagick import GraphicsMagickImage
+from ..backends.wand_common import FilterTypes
+from .corpus import SAMPLE_JPG
+
+FILTERS = [
+    ("NEAREST (sample)", GraphicsMagickImage.NEAREST),
+    ("FAST (scale)", GraphicsMagickImage.FAST),
+    ("Box", FilterTypes["BoxFilter"]),
+    ("Triangle", FilterTypes["TriangleFilter"]),
+    ("Cubic", FilterTypes["CubicFilter"]),
+    ("Mitchell", FilterTypes["MitchellFilter"]),
+    ("Lanczos", FilterTypes["LanczosFilter"]),
+]
+
+SOURCE_WIDTHS = (1024, 2048, 4096, 8192)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [image]")
+    parser.add_option("-n", "--iterations", type="int", default=5)
+    parser.add_option("--thumbnail-size", type="int", default=256)
+
+    (options, args) = parser.parse_args()
+
+    if args:
+        filename = args[0]
+    else:
+        filename = SAMPLE_JPG
+
+    master = GraphicsMagickImage.open(filename)
+    width, height = master.size
+
+    box = (options.thumbnail_size, options.thumbnail_size)
+
+    print("Best time in milliseconds to thumbnail to %dx%d" % box)
+    print()
+    print("%18s" % "", "\t".join("%8d" % w for w in SOURCE_WIDTHS))
+
+    sources = [master.resize((w, height * w // width), GraphicsMagickImage.ANTIALIAS)
+               for w in SOURCE_WIDTHS]
+
+    for name, resample in FILTERS:
+        row = []
+
+        for source in sources:
+            times = []
+
+            for _ in range(options.iterations):
+                img = source.copy()
+                start_time = default_timer()
+                img.thumbnail(box, resample)
+                times.append(default_timer() - start_time)
+
+            row.append("%8.1f" % (1000 * min(times)))
+
+        print("%18s" % name, "\t".join(row))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Measure the import time of NativeImaging and its backends using python -X importtime
+
+Each import runs in a fresh interpreter. The median cumulative time is
+reported along with the time taken by the backend's initialize(), which is
+now paid on first use rather than at import.
+"""
+from __future__ import absolute_import, division, print_function
+
+import statistics
+import subprocess
+import sys
+from optparse import OptionParser
+
+from .processes import child_environment, import_times
+
+MODULES = (
+    "NativeImaging",
+    "NativeImaging.backends.GraphicsMagick",
+    "NativeImaging.backends.aware",
+)
+
+INITIALIZE = """
+from timeit import default_timer
+import %s as backend
+start_time = default_timer()
+try:
+    backend.initialize()
+except ImportError:
+    print("n/a")
+else:
+    print(default_timer() - start_time)
+"""
+
+
+def time_initialize(module):
+    output = subprocess.check_output([sys.executable, "-c", INITIALIZE % module],
+                                     env=child_environment(), universal_newlines=True)
+    output = output.strip()
+
+    return None if output == "n/a" else float(output)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [MODULE...]")
+    parser.add_option("-n", "--repeat", type="int", default=10,
+                      help="Number of fresh interpreters per module (default: %default)")
+
+    (options, modules) = parser.parse_args()
+
+    if not modules:
+        modules = MODULES
+
+    print("%-40s %12s %12s" % ("module", "import", "initialize"))
+
+    for module in modules:
+        times = [import_times("import %s" % module)[module] for i in range(options.repeat)]
+
+        if module.startswith("NativeImaging.backends."):
+            initialize_time = time_initialize(module)
+        else:
+            initialize_time = None
+
+        print("%-40s %10.1fms %12s" % (module, statistics.median(times) / 1000,
+                                        "n/a" if initialize_time is None
+                                        else "%0.1fms" % (initialize_time * 1000)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Measure the effect of GraphicsMagickImage.wand_pool on small-image workloads
+"""
+from __future__ import absolute_import, division, print_function
+
+import sys
+from io import BytesIO
+from optparse import OptionParser
+from timeit import default_timer
+
+from ..backends.GraphicsMagick import GraphicsMagickImage, WandPool
+from .corpus import SAMPLE_JPG
+
+
+def make_small_image(size):
+    img = GraphicsMagickImage.open(SAMPLE_JPG)
+    img.thumbnail((size, size))
+    return memoryview(img.encode("PNG")).tobytes()
+
+
+def run(data, iterations):
+    source = memoryview(data)
+
+    start_time = default_timer()
+
+    for _ in range(iterations):
+        img = GraphicsMagickImage.open(source)
+        img.thumbnail((32, 32))
+        img.save(BytesIO(), "PNG")
+        del img
+
+    return iterations / (default_timer() - start_time)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--iterations", type="int", default=5000)
+    parser.add_option("--pool-size", type="int", default=32)
+
+    (options, args) = parser.parse_args()
+
+    print("%10s\t%12s\t%12s" % ("source", "no pool", "pooled"))
+
+    for size in (64, 128, 256):
+        data = make_small_image(size)
+
+        GraphicsMagickImage.wand_pool = None
+        unpooled = run(data, options.iterations)
+
+        GraphicsMagickImage.wand_pool = pool = WandPool(maxsize=options.pool_size)
+        pooled = run(data, options.iterations)
+        GraphicsMagickImage.wand_pool = None
+        pool.clear()
+
+        print("%10s\t%8.1f/sec\t%8.1f/sec\t%s" % ("%dpx" % size, unpooled, pooled,
+                                                  pool.stats()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
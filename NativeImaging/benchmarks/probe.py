@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Measure how many files per second NativeImaging.probe() can describe
+
+Compares parsing headers with the lazy open() of the requested backends. The
+corpus is the sample images copied --copies times into a temporary directory
+so the files are on local disk and, after the first pass, in the page cache.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+from optparse import OptionParser
+from timeit import default_timer
+
+from .. import get_image_class, probe
+from .corpus import SAMPLE_DIRECTORY, find_images
+
+
+def make_corpus(directory, samples, copies):
+    filenames = []
+
+    for sample in samples:
+        for i in range(copies):
+            filename = os.path.join(directory, "%d-%s" % (i, os.path.basename(sample)))
+            shutil.copyfile(sample, filename)
+            filenames.append(filename)
+
+    return filenames
+
+
+def describe_with_backend(image_class, filename):
+    img = image_class.open(filename)
+    try:
+        return img.format, img.size, getattr(img, "n_frames", 1)
+    finally:
+        if hasattr(img, "close"):
+            img.close()
+
+
+def time_pass(func, filenames, passes):
+    best = None
+
+    for i in range(passes):
+        start_time = default_timer()
+        for filename in filenames:
+            func(filename)
+        elapsed = default_timer() - start_time
+
+        if best is None or elapsed < best:
+            best = elapsed
+
+    return best
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [BACKEND...]")
+    parser.add_option('--sample-dir', default=SAMPLE_DIRECTORY,
+                      help="Path to test images (default: %default)")
+    parser.add_option("--copies", type="int", default=1000,
+                      help="Copies of each sample image (default: %default)")
+    parser.add_option("--passes", type="int", default=3,
+                      help="Report the fastest of this many passes (default: %default)")
+
+    (options, backend_names) = parser.parse_args()
+
+    if not backend_names:
+        backend_names = ('PIL', 'GraphicsMagick')
+
+    candidates = [("probe", probe)]
+
+    for backend_name in backend_names:
+        try:
+            image_class = get_image_class(backend_name)
+        except (ImportError, KeyError):
+            print("Can't load %s backend" % backend_name, file=sys.stderr)
+            continue
+
+        candidates.append(("%s open" % backend_name,
+                           lambda filename, image_class=image_class:
+                               describe_with_backend(image_class, filename)))
+
+    corpus_dir = tempfile.mkdtemp(prefix="probe-bench")
+
+    try:
+        filenames = make_corpus(corpus_dir, find_images(options.sample_dir), options.copies)
+
+        print("%d files" % len(filenames))
+
+        for name, func in candidates:
+            elapsed = time_pass(func, filenames, options.passes)
+            print("%-24s %10.0f files/sec" % (name, len(filenames) / elapsed))
+    finally:
+        shutil.rmtree(corpus_dir)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# encoding: utf-8
+"""
+Running benchmarks in fresh interpreters
+
+Peak RSS is a process-wide high-water mark and some settings, such as the
+GraphicsMagick binding or thread limit, can only be chosen before a backend is
+initialized, so benchmarks which compare them run each variant in its own
+process.
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import subprocess
+import sys
+
+
+def child_environment(**environment):
+    """
+    Returns a copy of os.environ, updated with environment, which lets a child
+    interpreter import this copy of NativeImaging
+    """
+
+    env = dict(os.environ)
+    env.update(environment)
+
+    package_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, env.get("PYTHONPATH")]))
+
+    return env
+
+
+def run_module(module, *args, **environment):
+    """
+    Runs ``python -m module args`` in a fresh interpreter and returns its
+    stdout. Any keyword arguments are added to the child's environment.
+    """
+
+    return subprocess.check_output([sys.executable, "-m", module] + list(args),
+                                   env=child_environment(**environment),
+                                   universal_newlines=True)
+
+
+def import_times(statement):
+    """
+    Runs statement in a fresh interpreter using ``python -X importtime`` and
+    returns a dictionary of the cumulative import time in microseconds for
+    each module it imported
+    """
+
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             env=child_environment(), check=True,
+                             universal_newlines=True)
+
+    times = {}
+
+    # Lines look like "import time: self [us] | cumulative | imported package":
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        fields = line[len("import time:"):].split("|")
+
+        try:
+            times[fields[2].strip()] = int(fields[1])
+        except (IndexError, ValueError):
+            # The column headings
+            continue
+
+    return times
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare ways of finding the best JPEG quality which fits within a size limit
+
+"linear" re-encodes at decreasing quality until the output fits, as a caller
+would using save() with a BytesIO, while "bisect" uses save(max_bytes=...)
+"""
+from __future__ import absolute_import, division, print_function
+
+import os
+import sys
+from io import BytesIO
+from optparse import OptionParser
+from timeit import default_timer
+
+from ..backends.GraphicsMagick import GraphicsMagickImage
+from .corpus import SAMPLE_DIRECTORY, find_images
+
+
+def linear_search(img, format, max_bytes, step=5):
+    passes = 0
+
+    for quality in range(95, 9, -step):
+        output = BytesIO()
+        img.save(output, format, quality=quality)
+        passes += 1
+
+        if len(output.getvalue()) <= max_bytes:
+            break
+
+    return passes
+
+
+def bisect_search(img, format, max_bytes):
+    try:
+        img.save(BytesIO(), format, max_bytes=max_bytes)
+    except ValueError:
+        pass
+
+    return img.info["encode_passes"]
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [max_kb ...]")
+    parser.add_option('--sample-dir', default=SAMPLE_DIRECTORY,
+                      help="Path to test images (default: %default)")
+    parser.add_option("--size", type="int", default=1024,
+                      help="Thumbnail size to encode (default: %default)")
+    parser.add_option("--format", default="JPEG")
+    parser.add_option("-n", "--repeat", type="int", default=5)
+
+    (options, args) = parser.parse_args()
+
+    limits = [int(i) * 1024 for i in args] or [20 * 1024, 50 * 1024, 100 * 1024]
+
+    samples = find_images(options.sample_dir)
+
+    print("%40s\t%8s\t%8s\t%8s\t%10s" % ("sample", "max KB", "method", "passes", "ms"))
+
+    for sample in samples:
+        img = GraphicsMagickImage.open(sample)
+        img.thumbnail((options.size, options.size))
+        img.load()
+
+        for max_bytes in limits:
+            for name, search in (("linear", linear_search), ("bisect", bisect_search)):
+                start_time = default_timer()
+                for _ in range(options.repeat):
+                    passes = search(img, options.format, max_bytes)
+                elapsed = (default_timer() - start_time) / options.repeat
+
+                print("%40s\t%8d\t%8s\t%8d\t%10.1f" % (os.path.basename(sample), max_bytes // 1024,
+                                                        name, passes, 1000 * elapsed))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+Benchmark opening, thumbnailing and encoding images with one or more backends
+
+Run ``python -m NativeImaging.benchmarks.run --help`` for the options.
+"""
+from __future__ import absolute_import, division, print_function
+
+import json
+import logging
+import os
+import platform
+import sys
+import time
+from collections import OrderedDict
+from io import BytesIO
+from optparse import SUPPRESS_HELP, OptionParser
+from timeit import default_timer
+
+from .. import get_image_class
+from .corpus import DEFAULT_DIRECTORY, find_images, generate_corpus
+from .processes import run_module
+from .stats import format_bytes, peak_rss, summarize
+
+# Bump this if the structure of the results changes incompatibly:
+RESULTS_VERSION = 1
+
+# Backends which decode lazily do so during thumbnail unless --load is used, so
+# only the total is comparable between backends without it:
+PHASES = ("open", "thumbnail", "encode")
+
+DEFAULT_BACKENDS = ("PIL", "GraphicsMagick", "aware", "java")
+
+
+def time_image(image_class, filename, size, format, load=False):
+    """
+    Returns the (open, thumbnail, encode) times in seconds for filename
+
+    Images are thumbnailed as soon as they are opened, as an application would,
+    so backends which defer decoding can draft it at a reduced size and the
+    decode is counted in the thumbnail phase. If load is true they are
+    explicitly decoded at full size during the open phase instead.
+    """
+
+    start_time = default_timer()
+
+    image = image_class.open(filename)
+    if load and hasattr(image, "load"):
+        image.load()
+
+    opened = default_timer()
+
+    # thumbnail() works in place for most backends but returns a new image for some:
+    thumbnail = image.thumbnail(size)
+    if thumbnail is not None:
+        image = thumbnail
+
+    thumbnailed = default_timer()
+
+    if format == "JPEG" and getattr(image, "mode", "RGB") not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+
+    image.save(BytesIO(), format=format)
+
+    encoded = default_timer()
+
+    if hasattr(image, "close"):
+        image.close()
+
+    return opened - start_time, thumbnailed - opened, encoded - thumbnailed
+
+
+def benchmark_backend(image_class, filenames, size=(256, 256), format="JPEG",
+                      repetitions=10, warmup=2, load=False):
+    """
+    Times each phase for every file in filenames repetitions times after
+    warmup passes which aren't recorded
+
+    Returns a dictionary containing summary statistics for each phase and
+    their total per file and per pass over the corpus, and the error message
+    for any file which couldn't be processed
+    """
+
+    samples = OrderedDict((filename, dict((phase, []) for phase in PHASES))
+                          for filename in filenames)
+    errors = {}
+
+    for iteration in range(warmup + repetitions):
+        for filename in filenames:
+            if filename in errors:
+                continue
+
+            try:
+                timings = time_image(image_class, filename, size, format, load=load)
+            except Exception as exc:
+                logging.info("%s cannot process %s: %s", image_class, filename, exc)
+                errors[filename] = "%s: %s" % (exc.__class__.__name__, exc)
+                continue
+
+            if iteration >= warmup:
+                for phase, elapsed in zip(PHASES, timings):
+                    samples[filename][phase].append(elapsed)
+
+    files = OrderedDict()
+    passes = dict((phase, [0.0] * repetitions) for phase in PHASES + ("total", ))
+
+    for filename, phases in samples.items():
+        if filename in errors:
+            continue
+
+        phases["total"] = [sum(timings) for timings in zip(*(phases[p] for p in PHASES))]
+
+        files[os.path.basename(filename)] = dict((phase, summarize(values))
+                                                 for phase, values in phases.items())
+
+        for phase, values in phases.items():
+            for i, elapsed in enumerate(values):
+                passes[phase][i] += elapsed
+
+    if files:
+        phases = dict((phase, summarize(values)) for phase, values in passes.items())
+    else:
+        phases = {}
+
+    return {
+        "phases": phases,
+        "files": files,
+        "errors": dict((os.path.basename(k), v) for k, v in errors.items()),
+    }
+
+
+def run_child(backend_name, filenames, options):
+    """
+    Benchmarks a backend in a new interpreter so its peak RSS isn't affected by
+    any other backend and returns its results
+    """
+
+    args = ["--child", backend_name,
+            "--repetitions", str(options.repetitions), "--warmup", str(options.warmup),
+            "--size", "%dx%d" % options.size, "--format", options.format]
+
+    if options.load:
+        args.append("--load")
+
+    output = run_module("NativeImaging.benchmarks.run", *(args + list(filenames)))
+
+    return json.loads(output)
+
+
+def child(backend_name, filenames, options):
+    """Benchmarks a single backend and writes its results to stdout as JSON"""
+
+    image_class = get_image_class(backend_name)
+
+    # Backends load their native libraries on first use, which shouldn't be
+    # counted against the memory used by the benchmark itself:
+    if filenames:
+        try:
+            image_class.open(filenames[0])
+        except Exception:
+            pass
+
+    baseline_rss = peak_rss()
+
+    results = benchmark_backend(image_class, filenames, size=options.size,
+                                format=options.format, repetitions=options.repetitions,
+                                warmup=options.warmup, load=options.load)
+
+    results["baseline_rss"] = baseline_rss
+    results["peak_rss"] = peak_rss()
+
+    json.dump(results, sys.stdout)
+
+
+def metadata():
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def print_results(results):
+    for backend_name, backend in results["backends"].items():
+        print("%s: peak RSS %s (%s after loading)" % (backend_name,
+                                                     format_bytes(backend.get("peak_rss")),
+                                                     format_bytes(backend.get("baseline_rss"))))
+
+        for filename, error in sorted(backend["errors"].items()):
+            print("    %s failed: %s" % (filename, error))
+
+        if not backend["phases"]:
+            continue
+
+        print("    %-10s %10s %10s %10s" % ("", "median", "p95", "stddev"))
+        for phase in PHASES + ("total", ):
+            stats = backend["phases"][phase]
+            print("    %-10s %9.1fms %9.1fms %9.1fms" % (phase, stats["median"] * 1000,
+                                                      stats["p95"] * 1000,
+                                                      stats["stddev"] * 1000))
+        print()
+
+
+def parse_size(value):
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main():
+    parser = OptionParser(usage="%prog [options] [BACKEND...]",
+                          description="Times each backend on every image in the corpus. "
+                                      "The times reported for each phase are per pass over "
+                                      "the entire corpus.")
+    parser.add_option("-v", default=0, dest="verbosity", action="count")
+    parser.add_option("--corpus",
+                      help="Directory of images to use rather than a generated corpus")
+    parser.add_option("--corpus-dir", default=DEFAULT_DIRECTORY,
+                      help="Where the generated corpus is kept (default: %default)")
+    parser.add_option("--corpus-backend", default="PIL",
+                      help="Backend used to generate the corpus (default: %default)")
+    parser.add_option("-n", "--repetitions", type="int", default=10,
+                      help="Timed passes over the corpus (default: %default)")
+    parser.add_option("--warmup", type="int", default=2,
+                      help="Untimed passes before the timed ones (default: %default)")
+    parser.add_option("--size", default="256x256",
+                      help="Thumbnail size (default: %default)")
+    parser.add_option("--format", default="JPEG",
+                      help="Output format (default: %default)")
+    parser.add_option("--load", action="store_true", default=False,
+                      help="load() each image at full size as part of the open phase")
+    parser.add_option("--in-process", action="store_true", default=False,
+                      help="Run every backend in this process; peak RSS is not reported")
+    parser.add_option("-o", "--output", help="Save the results as JSON")
+    parser.add_option("--child", help=SUPPRESS_HELP)
+
+    (options, args) = parser.parse_args()
+
+    options.size = parse_size(options.size)
+
+    if options.verbosity > 1:
+        log_level = logging.DEBUG
+    elif options.verbosity > 0:
+        log_level = logging.INFO
+    else:
+        log_level = logging.WARNING
+
+    logging.basicConfig(format="%(asctime)s [%(levelname)s]: %(message)s",
+                        level=log_level)
+
+    if options.child:
+        return child(options.child, args, options)
+
+    if options.corpus:
+        filenames = find_images(options.corpus)
+    else:
+        filenames = generate_corpus(options.corpus_dir, backend=options.corpus_backend)
+
+    backend_names = args or DEFAULT_BACKENDS
+
+    results = {
+        "version": RESULTS_VERSION,
+        "metadata": metadata(),
+        "settings": {
+            "corpus": [os.path.basename(filename) for filename in filenames],
+            "repetitions": options.repetitions,
+            "warmup": options.warmup,
+            "size": options.size,
+            "format": options.format,
+            "load": options.load,
+        },
+        "backends": OrderedDict(),
+    }
+
+    for backend_name in backend_names:
+        try:
+            image_class = get_image_class(backend_name)
+        except (ImportError, KeyError):
+            print("Can't load %s backend" % backend_name, file=sys.stderr)
+            continue
+
+        logging.info("Benchmarking %s", backend_name)
+
+        if options.in_process:
+            backend = benchmark_backend(image_class, filenames, size=options.size,
+                                        format=options.format,
+                                        repetitions=options.repetitions,
+                                        warmup=options.warmup, load=options.load)
+        else:
+            backend = run_child(backend_name, filenames, options)
+
+        results["backends"][backend_name] = backend
+
+    print_results(results)
+
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Saved results to %s" % options.output)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# encoding: utf-8
+"""
+Summary statistics and memory measurement for benchmark results
+"""
+from __future__ import absolute_import, division, print_function
+
+import math
+import os
+import statistics
+import sys
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def percentile(samples, percent):
+    """Returns the nearest-rank percentile of samples"""
+
+    ordered = sorted(samples)
+    rank = max(int(math.ceil(percent / 100 * len(ordered))) - 1, 0)
+    return ordered[rank]
+
+
+def summarize(samples):
+    """Returns a dictionary of summary statistics for a list of timings"""
+
+    return {
+        "n": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "p95": percentile(samples, 95),
+        "max": max(samples),
+        "stddev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def peak_rss():
+    """Returns this process' peak resident set size in bytes or None if unknown"""
+
+    if resource is None:
+        return None
+
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS reports bytes:
+    if sys.platform == "darwin":
+        return max_rss
+    else:
+        return max_rss * 1024
+
+
+def current_rss():
+    """Returns this process' current resident set size in bytes or None if unknown"""
+
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (IOError, OSError):
+        return None
+
+    return resident_pages * os.sysconf("SC_PAGE_SIZE")
+
+
+def format_bytes(value):
+    if value is None:
+        return "n/a"
+
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(value) < 1024:
+            return "%.1f%s" % (value, unit)
+        value /= 1024
+
+    return "%.1fTB" % value
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""Compare GraphicsMagick OpenMP threads against Python worker threads
+
+Runs the same thumbnailing workload with 1 GraphicsMagick thread per
+operation and N Python worker threads and vice versa. Each configuration
+runs in its own process since the thread limit is process-wide.
+"""
+from __future__ import absolute_import, division, print_function
+
+import multiprocessing
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from optparse import SUPPRESS_HELP, OptionParser
+from timeit import default_timer
+
+from .corpus import SAMPLE_JPG
+from .processes import run_module
+
+
+def child(workers, jobs):
+    from ..backends.GraphicsMagick import GraphicsMagickImage, get_resource_limits
+
+    def thumbnail(_):
+        # Decode at full size so resizing dominates:
+        img = GraphicsMagickImage.open(SAMPLE_JPG, lazy=False)
+        img.thumbnail((256, 256))
+        img.save(BytesIO(), "JPEG")
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        start_time = default_timer()
+        list(executor.map(thumbnail, range(jobs)))
+        elapsed = default_timer() - start_time
+
+    print(get_resource_limits()["threads"], jobs / elapsed)
+
+
+def main():
+    parser = OptionParser()
+    parser.add_option("-n", "--jobs", type="int", default=200)
+    parser.add_option("--threads", type="int", default=multiprocessing.cpu_count(),
+                      help="Total number of threads to use (default: %default)")
+    parser.add_option("--child", type="int", help=SUPPRESS_HELP)
+
+    (options, args) = parser.parse_args()
+
+    if options.child:
+        return child(options.child, options.jobs)
+
+    n = options.threads
+
+    print("%12s\t%14s\t%16s" % ("GM threads", "Python workers", "thumbnails/sec"))
+
+    for gm_threads, workers in ((1, n), (n, 1), (1, 1)):
+        output = run_module("NativeImaging.benchmarks.threads", "--child", str(workers),
+                            "--jobs", str(options.jobs),
+                            NATIVEIMAGING_GM_LIMIT_THREADS=str(gm_threads))
+        actual_threads, throughput = output.split()
+        print("%12s\t%14d\t%16.1f" % (actual_threads, workers, float(throughput)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
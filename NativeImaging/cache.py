@@ -0,0 +1,301 @@
+# encoding: utf-8
+"""
+A content-addressed, size-bounded disk cache of encoded derivatives
+
+Derivatives are keyed on the identity of the source and a canonical
+description of the operations and output settings used to create them, using
+the same ``(method_name, args[, kwargs])`` operations as :mod:`NativeImaging.batch`::
+
+    from NativeImaging.cache import DerivativeCache
+
+    cache = DerivativeCache("/var/cache/thumbnails", max_bytes=2 * 1024 ** 3)
+
+    data = cache.get("master.tif", [("thumbnail", ((256, 256), ))],
+                     format="JPEG", quality=85)
+
+Filename and path-like sources are identified by their path, modification time
+and size unless ``hash_content=True`` in which case, like in-memory sources,
+their contents are hashed. The least recently used entries are removed once the
+cache exceeds max_bytes. Entries are written to a temporary file and renamed
+into place so concurrent readers, including other processes, never see a
+partially-written file.
+"""
+from __future__ import absolute_import, division, print_function
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+from .batch import apply_operations, resolve_backend
+
+# Bump this to invalidate existing caches if the key format changes:
+KEY_VERSION = 1
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Entries are named after their key, a 40 digit hex digest, in a subdirectory
+# named after its first two digits. Nothing else in the directory is ours:
+KEY_PATTERN = re.compile(r"[0-9a-f]{40}\Z")
+
+
+def _canonical(value):
+    """Converts value into something with a single, stable JSON encoding"""
+
+    if isinstance(value, (tuple, list)):
+        return [_canonical(i) for i in value]
+    elif isinstance(value, dict):
+        return dict((str(k), _canonical(v)) for k, v in value.items())
+    elif isinstance(value, bytes):
+        return value.decode("latin-1")
+    else:
+        return value
+
+
+def describe_operations(operations, format, save_kwargs):
+    """Returns a canonical string describing an operation chain and its output"""
+
+    chain = []
+    for operation in operations:
+        name, args = operation[:2]
+        kwargs = operation[2] if len(operation) > 2 else {}
+        chain.append([name, _canonical(args), _canonical(kwargs)])
+
+    if isinstance(format, bytes):
+        format = format.decode("ascii")
+
+    return json.dumps([chain, format.upper(), _canonical(save_kwargs)],
+                      sort_keys=True, separators=(",", ":"))
+
+
+def _fspath(source):
+    """Returns path-like sources as a filename and anything else unchanged"""
+
+    if isinstance(source, os.PathLike):
+        return os.fsdecode(source)
+    else:
+        return source
+
+
+def hash_file(path):
+    digest = hashlib.blake2b(digest_size=20)
+
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+class DerivativeCache(object):
+    """
+    Caches encoded derivatives of images in directory, which is created if
+    necessary, using the given backend name or image class to create them
+    """
+
+    def __init__(self, directory, max_bytes=1024 ** 3, backend="GraphicsMagick",
+                 hash_content=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.image_class = resolve_backend(backend)
+        self.hash_content = hash_content
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+        self._scan()
+
+    def _scan(self):
+        """Rebuilds the LRU index from the entries on disk, oldest first"""
+
+        entries = []
+
+        for prefix in os.listdir(self.directory):
+            subdirectory = os.path.join(self.directory, prefix)
+
+            if len(prefix) != 2 or not os.path.isdir(subdirectory):
+                continue
+
+            for key in os.listdir(subdirectory):
+                # Skips other files, including abandoned temporary files from
+                # interrupted writes:
+                if not KEY_PATTERN.match(key) or key[:2] != prefix:
+                    continue
+
+                try:
+                    stat = os.stat(os.path.join(subdirectory, key))
+                except OSError:
+                    continue
+
+                entries.append((stat.st_mtime, key, stat.st_size))
+
+        for mtime, key, size in sorted(entries):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def source_id(self, source):
+        """Returns a string identifying the content of source"""
+
+        source = _fspath(source)
+
+        if isinstance(source, str):
+            if self.hash_content:
+                return "sha:" + hash_file(source)
+
+            stat = os.stat(source)
+            return "file:%s:%d:%d" % (os.path.abspath(source), stat.st_mtime_ns, stat.st_size)
+        else:
+            return "sha:" + hashlib.blake2b(source, digest_size=20).hexdigest()
+
+    def key(self, source, operations=(), format="JPEG", **save_kwargs):
+        """Returns the cache key for a derivative of source"""
+
+        # Backends don't produce identical output so each has its own entries.
+        # PIL's "image class" is the PIL.Image module, which has no __module__:
+        backend = ".".join(filter(None, [getattr(self.image_class, "__module__", None),
+                                         self.image_class.__name__]))
+
+        description = "%d\n%s\n%s\n%s" % (KEY_VERSION, backend, self.source_id(source),
+                                          describe_operations(operations, format, save_kwargs))
+
+        return hashlib.blake2b(description.encode("utf-8"), digest_size=20).hexdigest()
+
+    def get(self, source, operations=(), format="JPEG", **save_kwargs):
+        """
+        Returns the encoded derivative of source, creating and storing it if it
+        is not already cached
+
+        source is a filename, path-like object or bytes-like object containing
+        an encoded image; file-like objects should be read() first so their
+        contents can be hashed.
+        """
+
+        source = _fspath(source)
+
+        if not isinstance(source, (str, bytes)):
+            source = memoryview(source)
+
+        key = self.key(source, operations, format, **save_kwargs)
+
+        data = self._read(key)
+        if data is not None:
+            return data
+
+        data = self.render(source, operations, format, **save_kwargs)
+        self._write(key, data)
+
+        return data
+
+    def render(self, source, operations=(), format="JPEG", **save_kwargs):
+        """Creates a derivative without using the cache"""
+
+        source = _fspath(source)
+
+        if not isinstance(source, str):
+            source = BytesIO(source)
+
+        image = apply_operations(self.image_class.open(source), operations)
+
+        output = BytesIO()
+        image.save(output, format=format, **save_kwargs)
+
+        return output.getvalue()
+
+    def _read(self, key):
+        path = self._path(key)
+
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except (IOError, OSError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # The modification time records the LRU order across restarts:
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+
+        with self._lock:
+            self.hits += 1
+
+            if key not in self._entries:
+                # Written by another process sharing the directory:
+                self._entries[key] = len(data)
+                self._total_bytes += len(data)
+
+            self._entries.move_to_end(key)
+
+        return data
+
+    def _write(self, key, data):
+        path = self._path(key)
+        directory = os.path.dirname(path)
+
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(prefix=".", dir=directory)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        with self._lock:
+            self._total_bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+
+            evicted = []
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                self.evictions += 1
+                evicted.append(old_key)
+
+        for old_key in evicted:
+            try:
+                os.unlink(self._path(old_key))
+            except OSError:
+                pass
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        """Removes every cached derivative"""
+
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+            self._total_bytes = 0
+
+        for key in keys:
+            try:
+                os.unlink(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "entries": len(self._entries),
+                "bytes": self._total_bytes, "max_bytes": self.max_bytes}
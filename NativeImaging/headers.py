@@ -0,0 +1,510 @@
+# encoding: utf-8
+"""
+Identification of image formats and their basic properties from file headers
+
+Format names and modes match PIL's (``Image.format``, ``Image.mode``) so they
+can be compared with the values reported by any backend.
+
+:func:`probe` reads only the headers needed to describe an image, without
+decoding pixels or loading a backend::
+
+    >>> NativeImaging.probe("master.tif")
+    ImageInfo(format='TIFF', size=(6000, 4000), mode='RGB', bits=8, n_frames=1, orientation=1)
+
+It understands JPEG, PNG, GIF, TIFF, JPEG 2000, WebP and BMP. Other formats
+can be described by a backend's lazy open(), which the GraphicsMagick backend
+implements with a ping, by passing ``backend``.
+"""
+from __future__ import absolute_import, division, print_function
+
+import struct
+from collections import namedtuple
+from io import BytesIO
+
+# Enough bytes to identify every format below:
+HEADER_BYTES = 32
+
+# (offset, magic bytes, format) in the order they're checked:
+SIGNATURES = (
+    (0, b"\xff\xd8\xff", "JPEG"),
+    (0, b"\x89PNG\r\n\x1a\n", "PNG"),
+    (0, b"GIF87a", "GIF"),
+    (0, b"GIF89a", "GIF"),
+    (0, b"II*\x00", "TIFF"),
+    (0, b"MM\x00*", "TIFF"),
+    # BigTIFF:
+    (0, b"II+\x00", "TIFF"),
+    (0, b"MM\x00+", "TIFF"),
+    # The JP2 container and a bare JPEG 2000 codestream:
+    (0, b"\x00\x00\x00\x0cjP  \r\n\x87\n", "JPEG2000"),
+    (0, b"\xff\x4f\xff\x51", "JPEG2000"),
+    (8, b"WEBP", "WEBP"),
+    (0, b"BM", "BMP"),
+)
+
+
+def sniff_format(header):
+    """Returns the format of an image starting with header or None if unknown"""
+
+    header = bytes(header[:HEADER_BYTES])
+
+    for offset, magic, format in SIGNATURES:
+        if header[offset:offset + len(magic)] == magic:
+            if format == "WEBP" and not header.startswith(b"RIFF"):
+                continue
+            return format
+
+    return None
+
+
+def read_header(fp):
+    """
+    Returns the first HEADER_BYTES of fp without consuming them
+
+    As with the backends, str and bytes are filenames and other objects
+    supporting the buffer protocol contain the image. Returns None for
+    file-like objects which cannot seek.
+    """
+
+    if isinstance(fp, (str, bytes)):
+        with open(fp, "rb") as f:
+            return f.read(HEADER_BYTES)
+
+    if hasattr(fp, "read"):
+        if not (hasattr(fp, "seekable") and fp.seekable()):
+            return None
+
+        position = fp.tell()
+        try:
+            return fp.read(HEADER_BYTES)
+        finally:
+            fp.seek(position)
+
+    return memoryview(fp)[:HEADER_BYTES].tobytes()
+
+
+ImageInfo = namedtuple("ImageInfo", ["format", "size", "mode", "bits", "n_frames", "orientation"])
+ImageInfo.__doc__ = """
+The properties of an image returned by :func:`probe`
+
+bits is the number of bits per sample, or None if it isn't known, and
+orientation is the EXIF orientation, which is 1 for images without one
+"""
+
+
+class _Truncated(Exception):
+    pass
+
+
+def _read(f, size):
+    data = f.read(size)
+    if len(data) < size:
+        raise _Truncated()
+    return data
+
+
+def _read_tiff_ifds(f, base, first_ifd=False):
+    """
+    Returns (tags, n_ifds) for the TIFF stream starting at base where tags
+    holds the first value of each tag in the first IFD. n_ifds is only
+    counted if first_ifd is false.
+    """
+
+    f.seek(base)
+    header = _read(f, 8)
+
+    if header[:2] == b"II":
+        endian = "<"
+    elif header[:2] == b"MM":
+        endian = ">"
+    else:
+        raise _Truncated()
+
+    version = struct.unpack(endian + "H", header[2:4])[0]
+
+    if version == 43:
+        # BigTIFF uses 64-bit offsets and counts:
+        f.seek(base + 8)
+        offset = struct.unpack(endian + "Q", _read(f, 8))[0]
+        count_format, entry_format, entry_size, offset_format = "Q", "HHQ8s", 20, "Q"
+    else:
+        offset = struct.unpack(endian + "I", header[4:8])[0]
+        count_format, entry_format, entry_size, offset_format = "H", "HHI4s", 12, "I"
+
+    count_size = struct.calcsize(count_format)
+    offset_size = struct.calcsize(offset_format)
+    value_formats = {1: "B", 3: "H", 4: "I", 16: "Q"}
+
+    tags = {}
+    n_ifds = 0
+    seen = set()
+
+    while offset and offset not in seen:
+        seen.add(offset)
+        f.seek(base + offset)
+        entry_count = struct.unpack(endian + count_format, _read(f, count_size))[0]
+        entries = _read(f, entry_count * entry_size)
+
+        if not n_ifds:
+            for i in range(entry_count):
+                tag, value_type, count, value = struct.unpack(
+                    endian + entry_format, entries[i * entry_size:(i + 1) * entry_size])
+
+                value_format = value_formats.get(value_type)
+                if value_format is None or not count:
+                    continue
+
+                if struct.calcsize(value_format) > len(value):
+                    continue
+
+                # The first value is always stored inline or, for
+                # BitsPerSample, at the start of the block it points to:
+                if struct.calcsize(value_format) * count > len(value):
+                    location = struct.unpack(endian + offset_format, value)[0]
+                    position = f.tell()
+                    f.seek(base + location)
+                    value = _read(f, struct.calcsize(value_format))
+                    f.seek(position)
+
+                tags[tag] = struct.unpack_from(endian + value_format, value)[0]
+
+        n_ifds += 1
+
+        if first_ifd:
+            break
+
+        offset = struct.unpack(endian + offset_format, _read(f, offset_size))[0]
+
+    return tags, n_ifds
+
+
+def _exif_orientation(data):
+    """Returns the orientation from an EXIF block or 1 if it doesn't have one"""
+
+    try:
+        tags = _read_tiff_ifds(BytesIO(data), 0, first_ifd=True)[0]
+    except (_Truncated, struct.error):
+        return 1
+
+    orientation = tags.get(0x0112, 1)
+    return orientation if 1 <= orientation <= 8 else 1
+
+
+def _probe_jpeg(f):
+    _read(f, 2)
+    orientation = 1
+
+    while True:
+        marker = _read(f, 2)
+
+        while marker[1:] == b"\xff":
+            # Fill bytes:
+            marker = marker[1:] + _read(f, 1)
+
+        if marker[0:1] != b"\xff":
+            raise _Truncated()
+
+        code = marker[1]
+
+        if code in (0x01, 0xd8) or 0xd0 <= code <= 0xd7:
+            continue
+
+        length = struct.unpack(">H", _read(f, 2))[0] - 2
+
+        # SOF markers other than DHT, JPG and DAC:
+        if 0xc0 <= code <= 0xcf and code not in (0xc4, 0xc8, 0xcc):
+            bits, height, width, components = struct.unpack(">BHHB", _read(f, 6))
+            mode = {1: "L", 3: "RGB", 4: "CMYK"}.get(components, "RGB")
+            return "JPEG", (width, height), mode, bits, 1, orientation
+
+        if code == 0xe1 and length > 6:
+            segment = _read(f, length)
+            if segment.startswith(b"Exif\x00\x00"):
+                orientation = _exif_orientation(segment[6:])
+        elif code == 0xda:
+            # Start of scan without a frame header:
+            raise _Truncated()
+        else:
+            f.seek(length, 1)
+
+
+PNG_MODES = {2: "RGB", 3: "P", 4: "LA", 6: "RGBA"}
+
+
+def _probe_png(f):
+    f.seek(8, 1)
+    length, chunk_type = struct.unpack(">I4s", _read(f, 8))
+
+    if chunk_type != b"IHDR":
+        raise _Truncated()
+
+    width, height, bits, color_type = struct.unpack(">IIBB", _read(f, 10))
+    f.seek(length - 10 + 4, 1)
+
+    if color_type == 0:
+        mode = {1: "1", 16: "I;16"}.get(bits, "L")
+    else:
+        mode = PNG_MODES.get(color_type, "RGB")
+
+    n_frames = 1
+    orientation = 1
+
+    # APNG frame counts and EXIF data must precede the image data:
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            break
+
+        length, chunk_type = struct.unpack(">I4s", chunk)
+
+        if chunk_type in (b"IDAT", b"IEND"):
+            break
+        elif chunk_type == b"acTL":
+            n_frames = struct.unpack(">I", _read(f, 4))[0]
+            f.seek(length - 4 + 4, 1)
+        elif chunk_type == b"eXIf":
+            orientation = _exif_orientation(_read(f, length))
+            f.seek(4, 1)
+        else:
+            f.seek(length + 4, 1)
+
+    return "PNG", (width, height), mode, bits, n_frames, orientation
+
+
+def _skip_gif_sub_blocks(f):
+    while True:
+        size = _read(f, 1)[0]
+        if not size:
+            return
+        f.seek(size, 1)
+
+
+def _probe_gif(f):
+    width, height, flags = struct.unpack("<6xHHB2x", _read(f, 13))
+    bits = (flags & 7) + 1
+
+    if flags & 0x80:
+        f.seek(3 << bits, 1)
+
+    # Count the frames by skipping over their compressed data:
+    n_frames = 0
+
+    while True:
+        block = f.read(1)
+
+        if block == b"\x2c":
+            n_frames += 1
+            flags = _read(f, 9)[8]
+            if flags & 0x80:
+                f.seek(3 << ((flags & 7) + 1), 1)
+            f.seek(1, 1)
+            _skip_gif_sub_blocks(f)
+        elif block == b"\x21":
+            f.seek(1, 1)
+            _skip_gif_sub_blocks(f)
+        else:
+            # The trailer or the end of a truncated file:
+            break
+
+    return "GIF", (width, height), "P", bits, max(n_frames, 1), 1
+
+
+def _probe_tiff(f):
+    tags, n_ifds = _read_tiff_ifds(f, f.tell())
+
+    if 256 not in tags or 257 not in tags:
+        raise _Truncated()
+
+    bits = tags.get(258, 1)
+    samples = tags.get(277, 1)
+    photometric = tags.get(262, 1 if samples < 3 else 2)
+
+    if photometric in (0, 1):
+        if samples > 1:
+            mode = "LA"
+        else:
+            mode = {1: "1", 16: "I;16"}.get(bits, "L")
+    elif photometric == 3:
+        mode = "P"
+    elif photometric == 5:
+        mode = "CMYK"
+    else:
+        mode = "RGBA" if samples > 3 else "RGB"
+
+    return "TIFF", (tags[256], tags[257]), mode, bits, n_ifds, tags.get(274, 1)
+
+
+JPEG2000_MODES = {1: "L", 2: "LA", 3: "RGB", 4: "RGBA"}
+
+
+def _probe_jpeg2000(f):
+    start = f.tell()
+
+    if _read(f, 4) == b"\xff\x4f\xff\x51":
+        # A bare codestream's SIZ marker:
+        f.seek(2, 1)
+        (width, height, x_offset, y_offset) = struct.unpack(">2x4I", _read(f, 18))
+        f.seek(16, 1)
+        components, depth = struct.unpack(">HB", _read(f, 3))
+        return ("JPEG2000", (width - x_offset, height - y_offset),
+                JPEG2000_MODES.get(components, "RGB"), (depth & 0x7f) + 1, 1, 1)
+
+    f.seek(start)
+
+    # Find the image header box inside the JP2 header superbox:
+    end = None
+    while end is None or f.tell() < end:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+
+        length, box_type = struct.unpack(">I4s", header)
+        header_length = 8
+
+        if length == 1:
+            length = struct.unpack(">Q", _read(f, 8))[0]
+            header_length = 16
+
+        if box_type == b"jp2h":
+            end = f.tell() + length - header_length if length else None
+            continue
+        elif box_type == b"ihdr":
+            height, width, components, depth = struct.unpack(">IIHB", _read(f, 11))
+            return ("JPEG2000", (width, height), JPEG2000_MODES.get(components, "RGB"),
+                    (depth & 0x7f) + 1, 1, 1)
+        elif not length:
+            break
+
+        f.seek(length - header_length, 1)
+
+    raise _Truncated()
+
+
+def _probe_webp(f):
+    f.seek(12, 1)
+    chunk_type, length = struct.unpack("<4sI", _read(f, 8))
+    chunk = _read(f, min(length, 30))
+
+    if chunk_type == b"VP8 ":
+        width, height = struct.unpack("<HH", chunk[6:10])
+        return "WEBP", (width & 0x3fff, height & 0x3fff), "RGB", 8, 1, 1
+    elif chunk_type == b"VP8L":
+        value = struct.unpack("<I", chunk[1:5])[0]
+        width = (value & 0x3fff) + 1
+        height = ((value >> 14) & 0x3fff) + 1
+        mode = "RGBA" if value & (1 << 28) else "RGB"
+        return "WEBP", (width, height), mode, 8, 1, 1
+    elif chunk_type == b"VP8X":
+        flags = chunk[0]
+        width = int.from_bytes(chunk[4:7], "little") + 1
+        height = int.from_bytes(chunk[7:10], "little") + 1
+        mode = "RGBA" if flags & 0x10 else "RGB"
+
+        n_frames = 1
+        if flags & 0x02:
+            # Count the animation frames:
+            n_frames = 0
+            f.seek(length + (length & 1) - len(chunk), 1)
+            while True:
+                header = f.read(8)
+                if len(header) < 8:
+                    break
+                chunk_type, length = struct.unpack("<4sI", header)
+                if chunk_type == b"ANMF":
+                    n_frames += 1
+                f.seek(length + (length & 1), 1)
+
+        return "WEBP", (width, height), mode, 8, max(n_frames, 1), 1
+
+    raise _Truncated()
+
+
+def _probe_bmp(f):
+    header = _read(f, 30)
+    header_size = struct.unpack_from("<I", header, 14)[0]
+
+    if header_size == 12:
+        # OS/2 BITMAPCOREHEADER:
+        width, height, bit_count = struct.unpack_from("<HH2xH", header, 18)
+    else:
+        width, height, bit_count = struct.unpack_from("<ii2xH", header, 18)
+
+    mode = {1: "1", 32: "RGBA"}.get(bit_count, "P" if bit_count <= 8 else "RGB")
+    bits = bit_count if bit_count < 8 else 8
+
+    return "BMP", (width, abs(height)), mode, bits, 1, 1
+
+
+PROBES = {
+    "JPEG": _probe_jpeg,
+    "PNG": _probe_png,
+    "GIF": _probe_gif,
+    "TIFF": _probe_tiff,
+    "JPEG2000": _probe_jpeg2000,
+    "WEBP": _probe_webp,
+    "BMP": _probe_bmp,
+}
+
+
+def _probe_file(f):
+    """Returns an ImageInfo for the image at f's current position or None"""
+
+    start = f.tell()
+    format = sniff_format(f.read(HEADER_BYTES))
+
+    if format is None:
+        return None
+
+    f.seek(start)
+
+    try:
+        return ImageInfo(*PROBES[format](f))
+    except (_Truncated, struct.error, IndexError):
+        return None
+
+
+def _probe_backend(source, backend):
+    # Deferred to avoid importing anything heavyweight until it's needed:
+    from .batch import resolve_backend
+
+    image = resolve_backend(backend).open(source)
+
+    try:
+        return ImageInfo(image.format, tuple(image.size), image.mode,
+                         None, getattr(image, "n_frames", 1), 1)
+    finally:
+        close = getattr(image, "close", None)
+        if close is not None:
+            close()
+
+
+def probe(source, backend=None):
+    """
+    Returns an :class:`ImageInfo` describing source from its headers
+
+    source may be a filename, a seekable file-like object, which is left at
+    its original position, or an object supporting the buffer protocol which
+    contains the image. If the headers are not recognized the image is opened
+    using backend, a backend name or image class, if one is given; otherwise
+    IOError is raised.
+    """
+
+    if isinstance(source, (str, bytes)):
+        with open(source, "rb") as f:
+            info = _probe_file(f)
+    elif hasattr(source, "read"):
+        position = source.tell()
+        try:
+            info = _probe_file(source)
+        finally:
+            source.seek(position)
+    else:
+        info = _probe_file(BytesIO(memoryview(source)))
+
+    if info is not None:
+        return info
+    elif backend is not None:
+        return _probe_backend(source, backend)
+    else:
+        raise IOError("cannot identify image file %r" % (source if isinstance(source, str)
+                                                         else source.__class__.__name__))
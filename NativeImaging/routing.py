@@ -0,0 +1,143 @@
+# encoding: utf-8
+"""
+Per-format backend routing for ``get_image_class("auto")``
+
+Each open() sniffs the image format from its first few bytes and uses the
+first available backend listed for that format in the routing table. The
+default table reflects the README's benchmarks;
+``python -m NativeImaging.benchmarks.calibrate_routing`` measures the backends
+installed on a given machine and writes a table which is used in preference
+to the defaults if the NATIVEIMAGING_ROUTING_TABLE environment variable
+contains its path::
+
+    {"JPEG": ["PIL", "GraphicsMagick"], "TIFF": ["GraphicsMagick", "PIL"], ...}
+
+The ``"*"`` entry is used for formats which aren't listed or recognized. A
+table which can't be loaded is reported with a warning and the defaults are
+used instead.
+"""
+from __future__ import absolute_import, division, print_function
+
+import json
+import os
+import threading
+from io import BytesIO
+from warnings import warn
+
+from . import get_image_class
+from .headers import read_header, sniff_format
+
+ROUTING_TABLE_ENVIRONMENT = "NATIVEIMAGING_ROUTING_TABLE"
+
+DEFAULT_ROUTES = {
+    "JPEG2000": ["aware", "GraphicsMagick", "PIL"],
+    "JPEG": ["PIL", "GraphicsMagick"],
+    "TIFF": ["GraphicsMagick", "PIL"],
+    "*": ["GraphicsMagick", "PIL"],
+}
+
+
+class Router(object):
+    """Opens each image with the preferred available backend for its format"""
+
+    def __init__(self, routes=None):
+        self.routes = dict(DEFAULT_ROUTES if routes is None else routes)
+        self._backends = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Returns a Router using the routing table saved in path"""
+
+        with open(path) as f:
+            routes = json.load(f)
+
+        return cls(dict(DEFAULT_ROUTES, **routes))
+
+    @classmethod
+    def from_environment(cls, environ=None):
+        if environ is None:
+            environ = os.environ
+
+        path = environ.get(ROUTING_TABLE_ENVIRONMENT)
+        if not path:
+            return cls()
+
+        try:
+            return cls.load(path)
+        except (IOError, ValueError, TypeError) as exc:
+            warn("Using the default routing table as %s cannot be loaded: %s" % (path, exc),
+                 RuntimeWarning)
+            return cls()
+
+    def save(self, path):
+        """Atomically writes the routing table to path"""
+
+        temp_path = "%s.%d.tmp" % (path, os.getpid())
+
+        with open(temp_path, "w") as f:
+            json.dump(self.routes, f, indent=4, sort_keys=True)
+
+        os.replace(temp_path, path)
+
+    def _load_backend(self, name):
+        with self._lock:
+            if name not in self._backends:
+                try:
+                    self._backends[name] = get_image_class(name)
+                except (ImportError, KeyError):
+                    # Not installed on this machine:
+                    self._backends[name] = None
+
+            return self._backends[name]
+
+    def backend_for(self, format):
+        """Returns the image class used for format"""
+
+        names = self.routes.get(format) or self.routes.get("*", [])
+
+        for name in names:
+            image_class = self._load_backend(name)
+            if image_class is not None:
+                return image_class
+
+        if format in self.routes and "*" in self.routes:
+            return self.backend_for(None)
+
+        raise ImportError("No backend is available for %s images" % (format or "unknown"))
+
+    def open(self, fp, *args, **kwargs):
+        header = read_header(fp)
+
+        if header is None:
+            # We need to look at the data before choosing a backend:
+            fp = BytesIO(fp.read())
+            header = read_header(fp)
+
+        image_class = self.backend_for(sniff_format(header))
+
+        if (not isinstance(fp, (str, bytes)) and not hasattr(fp, "read")
+                and not getattr(image_class, "opens_buffers", False)):
+            # PIL and others only accept filenames and file-like objects:
+            fp = BytesIO(fp)
+
+        return image_class.open(fp, *args, **kwargs)
+
+
+class AutoImage(object):
+    """
+    The class returned by ``get_image_class("auto")``
+
+    open() returns an image from whichever backend :attr:`router` chooses for
+    its format. Assign a different :class:`Router` to change the routing.
+    """
+
+    # Created by Router.from_environment() when it's first needed:
+    router = None
+
+    @classmethod
+    def open(cls, fp, *args, **kwargs):
+        if cls.router is None:
+            cls.router = Router.from_environment()
+
+        return cls.router.open(fp, *args, **kwargs)
@@ -19,7 +19,7 @@ setup(
     license='http://www.opensource.org/licenses/mit-license.php',
     description='PIL-like interface for system imaging libraries',
     long_description=read_file("README.rst"),
-    packages=['NativeImaging', 'NativeImaging.backends'],
+    packages=['NativeImaging', 'NativeImaging.backends', 'NativeImaging.benchmarks'],
     test_suite='tests',
     setup_requires=['setuptools_scm'],
 )
@@ -6,6 +6,11 @@ import os
 import tempfile
 from io import BytesIO
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 SAMPLE_DIR = os.path.realpath(os.path.join(os.path.dirname(__file__), "samples"))
 
 
@@ -68,6 +73,23 @@ class ApiConformanceTests(object):
         with tempfile.TemporaryFile() as f:
             img.save(f, format="PNG")
 
+    def test_array_interface(self):
+        if numpy is None:
+            self.skipTest("numpy is not available")
+
+        pixels = numpy.asarray(self.open_sample_image())
+        self.assertEqual(pixels.shape[:2], (680, 1024))
+        self.assertEqual(pixels.dtype, numpy.uint8)
+
+        region = numpy.ascontiguousarray(pixels[100:110, 200:220])
+        try:
+            img = self.IMAGE_CLASS.fromarray(region)
+        except NotImplementedError:
+            self.skipTest("%s cannot create images from arrays" % self.IMAGE_CLASS.__name__)
+
+        self.assertEqual(img.size, (20, 10))
+        self.assertTrue((numpy.asarray(img) == region).all())
+
     def test_resize(self):
         img = self.open_sample_image()
         small = img.resize((128, 256))
@@ -0,0 +1,155 @@
+from __future__ import absolute_import, division, print_function
+
+import asyncio
+import os
+import threading
+import unittest
+from io import BytesIO
+
+from NativeImaging import get_image_class
+from NativeImaging.aio import AsyncBackend, AsyncImage
+
+from .api import SAMPLE_DIR
+
+try:
+    PIL_IMAGE_CLASS = get_image_class("PIL")
+except ImportError:
+    PIL_IMAGE_CLASS = None
+
+
+class SlowImage(object):
+    """A stand-in backend whose open() blocks until released"""
+
+    started = threading.Event()
+    release = threading.Event()
+    closed = []
+
+    size = (1, 1)
+
+    @classmethod
+    def open(cls, fp):
+        cls.started.set()
+        cls.release.wait()
+        return cls()
+
+    def save(self, fp, format=None):
+        pass
+
+    def close(self):
+        self.closed.append(self)
+
+
+class BlockingImage(object):
+    """A stand-in backend whose thumbnail() blocks until released"""
+
+    started = threading.Event()
+    release = threading.Event()
+    events = []
+
+    size = (1, 1)
+
+    @classmethod
+    def open(cls, fp):
+        return cls()
+
+    def thumbnail(self, size):
+        self.started.set()
+        self.release.wait()
+        self.events.append("thumbnail")
+
+    def save(self, fp, format=None):
+        pass
+
+    def close(self):
+        self.events.append("close")
+
+
+@unittest.skipUnless(PIL_IMAGE_CLASS, 'PIL is not available')
+class AsyncBackendTests(unittest.TestCase):
+    def setUp(self):
+        self.sample_jpg = os.path.join(SAMPLE_DIR, "5071384885_c5f331d337_b.jpg")
+
+    def test_operations(self):
+        async def main():
+            async with AsyncBackend("PIL", max_workers=2) as images:
+                img = await images.open(self.sample_jpg)
+                self.assertIsInstance(img, AsyncImage)
+
+                small = await img.resize((32, 16))
+                self.assertIsInstance(small, AsyncImage)
+                self.assertEqual(small.image.size, (32, 16))
+
+                await img.thumbnail((64, 64))
+                self.assertEqual(img.image.size[0], 64)
+
+                output = BytesIO()
+                await img.save(output, format="PNG")
+                img.close()
+
+                return output.getvalue()
+
+        data = asyncio.run(main())
+        self.assertEqual(data[:4], b"\x89PNG")
+
+
+class CancellationTests(unittest.TestCase):
+    def test_cancellation(self):
+        SlowImage.started.clear()
+        SlowImage.release.clear()
+        del SlowImage.closed[:]
+
+        images = AsyncBackend(SlowImage, max_workers=1)
+
+        async def main():
+            running = asyncio.ensure_future(images.open("first"))
+            queued = asyncio.ensure_future(images.open("second"))
+
+            await asyncio.get_running_loop().run_in_executor(None, SlowImage.started.wait)
+
+            running.cancel()
+            queued.cancel()
+
+            # Neither task waits for the blocked open() to finish:
+            for task in (running, queued):
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+            SlowImage.release.set()
+
+        asyncio.run(main())
+        images.close()
+
+        # The queued open() never ran and the running one was closed:
+        self.assertEqual(len(SlowImage.closed), 1)
+
+    def test_close_while_running(self):
+        BlockingImage.started.clear()
+        BlockingImage.release.clear()
+        del BlockingImage.events[:]
+
+        images = AsyncBackend(BlockingImage, max_workers=1)
+
+        async def main():
+            img = await images.open("image")
+
+            running = asyncio.ensure_future(img.thumbnail((8, 8)))
+            await asyncio.get_running_loop().run_in_executor(None, BlockingImage.started.wait)
+
+            running.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await running
+
+            # The image mustn't be freed while thumbnail() is still using it:
+            img.close()
+            self.assertEqual(BlockingImage.events, [])
+
+            BlockingImage.release.set()
+
+        asyncio.run(main())
+        images.close()
+
+        self.assertEqual(BlockingImage.events, ["thumbnail", "close"])
+
+
+if __name__ == "__main__":
+    unittest.main()
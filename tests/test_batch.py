@@ -0,0 +1,148 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import sys
+import tempfile
+import types
+import unittest
+from io import BytesIO
+
+from NativeImaging import batch, get_image_class
+
+from .api import SAMPLE_DIR
+
+try:
+    PIL_IMAGE_CLASS = get_image_class("PIL")
+except ImportError:
+    PIL_IMAGE_CLASS = None
+
+
+@unittest.skipUnless(PIL_IMAGE_CLASS, 'PIL is not available')
+class BatchTests(unittest.TestCase):
+    def setUp(self):
+        self.sample_jpg = os.path.join(SAMPLE_DIR, "5071384885_c5f331d337_b.jpg")
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir)
+
+    def test_run(self):
+        jobs = [(self.sample_jpg, [("thumbnail", ((64, 64), ))],
+                 os.path.join(self.output_dir, "%d.png" % i))
+                for i in range(10)]
+
+        results = list(batch.run(iter(jobs), PIL_IMAGE_CLASS, max_workers=3))
+
+        self.assertEqual(len(results), len(jobs))
+        self.assertEqual(sorted(r.destination for r in results),
+                         sorted(job[2] for job in jobs))
+
+        for result in results:
+            self.assertIsNone(result.error)
+            self.assertGreater(result.elapsed, 0)
+            with PIL_IMAGE_CLASS.open(result.destination) as img:
+                self.assertEqual(img.size[0], 64)
+
+    def test_file_destination(self):
+        output = BytesIO()
+        job = (self.sample_jpg, [("resize", ((32, 16), )), ("crop", ((0, 0, 16, 16), ))],
+               (output, {"format": "PNG"}))
+
+        result, = batch.run([job], "PIL")
+        self.assertIsNone(result.error)
+
+        output.seek(0)
+        img = PIL_IMAGE_CLASS.open(output)
+        self.assertEqual((img.format, img.size), ("PNG", (16, 16)))
+
+    def test_errors(self):
+        jobs = [("this test image does not exist.jpg", [], BytesIO()),
+                (self.sample_jpg, [("no_such_operation", ())], BytesIO()),
+                (self.sample_jpg, [], BytesIO())]
+
+        errors = [type(r.error) for r in batch.run(jobs, "PIL", max_workers=2)]
+
+        self.assertEqual(len(errors), 3)
+        self.assertIn(type(None), errors)
+        self.assertIn(AttributeError, errors)
+        self.assertTrue(any(issubclass(e, IOError) for e in errors))
+
+    def test_processes(self):
+        outputs = [BytesIO() for i in range(4)]
+        filename = os.path.join(self.output_dir, "thumb.png")
+        jobs = [(self.sample_jpg, [("thumbnail", ((64, 64), ))], (output, {"format": "PNG"}))
+                for output in outputs]
+        jobs.append((self.sample_jpg, [("thumbnail", ((32, 32), ))], filename))
+        jobs.append(("this test image does not exist.jpg", [], BytesIO()))
+
+        results = list(batch.run(jobs, "PIL", max_workers=2, processes=True))
+
+        self.assertEqual(len(results), len(jobs))
+        errors = [r for r in results if r.error is not None]
+        self.assertEqual([r.source for r in errors], [jobs[-1][0]])
+        self.assertIsInstance(errors[0].error, IOError)
+
+        for output in outputs:
+            output.seek(0)
+            img = PIL_IMAGE_CLASS.open(output)
+            self.assertEqual((img.format, img.size[0]), ("PNG", 64))
+
+        with PIL_IMAGE_CLASS.open(filename) as img:
+            self.assertEqual(img.size[0], 32)
+
+    def test_processes_invalid_destination(self):
+        jobs = [(self.sample_jpg, [], (BytesIO(), None)),
+                (self.sample_jpg, [], (BytesIO(), {"format": "PNG"}))]
+
+        results = list(batch.run(jobs, "PIL", max_workers=1, processes=True))
+
+        self.assertEqual(len(results), 2)
+        self.assertIsInstance(results[0].error, TypeError)
+        self.assertIsNone(results[1].error)
+
+    @unittest.skipUnless(os.path.isdir("/dev/shm"), "Requires /dev/shm")
+    def test_processes_abandoned(self):
+        def shared_memory_blocks():
+            return set(name for name in os.listdir("/dev/shm") if name.startswith("psm_"))
+
+        before = shared_memory_blocks()
+
+        jobs = [(self.sample_jpg, [("thumbnail", ((64, 64), ))], (BytesIO(), {"format": "PNG"}))
+                for i in range(8)]
+
+        results = batch.run(jobs, "PIL", max_workers=2, processes=True)
+        self.assertIsNone(next(results).error)
+        results.close()
+
+        self.assertEqual(shared_memory_blocks() - before, set())
+
+    def test_split_destination(self):
+        self.assertEqual(batch.split_destination("foo.jpg"), ("foo.jpg", {"format": "JPEG"}))
+        self.assertEqual(batch.split_destination("foo.png"), ("foo.png", {"format": "PNG"}))
+        self.assertEqual(batch.split_destination(("foo.jpg", {"quality": 50})),
+                         ("foo.jpg", {"format": "JPEG", "quality": 50}))
+
+
+
+class InitializeWorkerTests(unittest.TestCase):
+    def test_initialize_worker(self):
+        # A backend module which loads its library on first use:
+        module = types.ModuleType("lazy_backend")
+        module.initialized = 0
+
+        def initialize():
+            module.initialized += 1
+
+        module.initialize = initialize
+        module.LazyImage = type("LazyImage", (object, ), {"__module__": module.__name__})
+
+        sys.modules[module.__name__] = module
+        self.addCleanup(sys.modules.pop, module.__name__)
+
+        batch.initialize_worker(module.LazyImage)
+
+        self.assertEqual(module.initialized, 1)
+        self.assertIs(batch._worker_image_class, module.LazyImage)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from NativeImaging import get_image_class, probe
+from NativeImaging.benchmarks.compare import compare
+from NativeImaging.benchmarks.corpus import generate_corpus
+from NativeImaging.benchmarks.run import PHASES, benchmark_backend, time_image
+from NativeImaging.benchmarks.stats import percentile, summarize
+
+from .api import SAMPLE_DIR
+
+try:
+    PIL_IMAGE_CLASS = get_image_class("PIL")
+except ImportError:
+    PIL_IMAGE_CLASS = None
+
+
+def make_results(backend_name, median, p95, peak_rss=100):
+    stats = {"median": median, "p95": p95}
+    return {"backends": {backend_name: {"phases": dict((phase, stats)
+                                                       for phase in PHASES + ("total", )),
+                                        "files": {}, "errors": {}, "peak_rss": peak_rss}}}
+
+
+class StatsTests(unittest.TestCase):
+    def test_summarize(self):
+        stats = summarize([4.0, 1.0, 3.0, 2.0, 100.0])
+
+        self.assertEqual((stats["n"], stats["min"], stats["median"], stats["max"]),
+                         (5, 1.0, 3.0, 100.0))
+        self.assertEqual(stats["p95"], 100.0)
+        self.assertEqual(summarize([1.0])["stddev"], 0.0)
+
+    def test_percentile(self):
+        samples = list(range(1, 101))
+
+        self.assertEqual(percentile(samples, 95), 95)
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile([7], 95), 7)
+
+
+class CompareTests(unittest.TestCase):
+    def test_regression(self):
+        changes = list(compare(make_results("PIL", 1.0, 1.1), make_results("PIL", 1.5, 1.6)))
+
+        self.assertTrue(all(change.regression for change in changes
+                            if change.metric != "peak_rss"))
+
+    def test_noise(self):
+        # Slower than the threshold but within the baseline's spread:
+        changes = compare(make_results("PIL", 1.0, 2.0), make_results("PIL", 1.5, 1.6))
+        self.assertFalse(any(change.regression for change in changes))
+
+        # Faster:
+        changes = compare(make_results("PIL", 1.0, 1.1), make_results("PIL", 0.5, 0.6))
+        self.assertFalse(any(change.regression for change in changes))
+
+    def test_peak_rss(self):
+        changes = compare(make_results("PIL", 1.0, 1.1, peak_rss=100),
+                          make_results("PIL", 1.0, 1.1, peak_rss=200))
+
+        self.assertEqual([change.metric for change in changes if change.regression],
+                         ["peak_rss"])
+
+    def test_missing_backend(self):
+        self.assertEqual(list(compare(make_results("PIL", 1.0, 1.1),
+                                      make_results("GraphicsMagick", 1.0, 1.1))), [])
+
+
+@unittest.skipUnless(PIL_IMAGE_CLASS, 'PIL is not available')
+class BenchmarkTests(unittest.TestCase):
+    def setUp(self):
+        self.corpus_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.corpus_dir)
+
+    def test_generate_corpus(self):
+        filenames = generate_corpus(self.corpus_dir, sizes=((64, 48), ),
+                                    formats=("JPEG", "PNG"))
+
+        self.assertEqual([probe(filename)[:2] for filename in filenames],
+                         [("JPEG", (64, 48)), ("PNG", (64, 48))])
+
+        # Existing images are reused:
+        mtimes = [os.stat(filename).st_mtime_ns for filename in filenames]
+        self.assertEqual(generate_corpus(self.corpus_dir, sizes=((64, 48), ),
+                                         formats=("JPEG", "PNG")), filenames)
+        self.assertEqual([os.stat(filename).st_mtime_ns for filename in filenames], mtimes)
+
+    def test_benchmark_backend(self):
+        filenames = [os.path.join(SAMPLE_DIR, "5071384885_c5f331d337_b.jpg"),
+                     os.path.join(SAMPLE_DIR, "missing.jpg")]
+
+        results = benchmark_backend(PIL_IMAGE_CLASS, filenames, size=(32, 32),
+                                    repetitions=3, warmup=1)
+
+        self.assertEqual(set(results["phases"]), set(PHASES + ("total", )))
+        self.assertEqual(results["phases"]["total"]["n"], 3)
+        self.assertEqual(list(results["files"]), ["5071384885_c5f331d337_b.jpg"])
+        self.assertEqual(list(results["errors"]), ["missing.jpg"])
+
+    def test_load(self):
+        filename = os.path.join(SAMPLE_DIR, "5071384885_c5f331d337_b.jpg")
+
+        for load in (False, True):
+            timings = time_image(PIL_IMAGE_CLASS, filename, (32, 32), "JPEG", load=load)
+            self.assertEqual(len(timings), len(PHASES))
+            self.assertTrue(all(elapsed >= 0 for elapsed in timings))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import pathlib
+import shutil
+import tempfile
+import unittest
+
+from NativeImaging import get_image_class
+from NativeImaging.cache import DerivativeCache, describe_operations
+
+from .api import SAMPLE_DIR
+
+try:
+    PIL_IMAGE_CLASS = get_image_class("PIL")
+except ImportError:
+    PIL_IMAGE_CLASS = None
+
+THUMBNAIL = [("thumbnail", ((64, 64), ))]
+
+
+@unittest.skipUnless(PIL_IMAGE_CLASS, 'PIL is not available')
+class DerivativeCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.sample_jpg = os.path.join(SAMPLE_DIR, "5071384885_c5f331d337_b.jpg")
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+
+    def test_hit_and_miss(self):
+        cache = DerivativeCache(self.cache_dir, backend="PIL")
+
+        first = cache.get(self.sample_jpg, THUMBNAIL, format="PNG")
+        second = cache.get(self.sample_jpg, THUMBNAIL, format="PNG")
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, cache.render(self.sample_jpg, THUMBNAIL, format="PNG"))
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 1, 1))
+
+        # Different operations or output settings are different entries:
+        cache.get(self.sample_jpg, [("thumbnail", ((32, 32), ))], format="PNG")
+        cache.get(self.sample_jpg, THUMBNAIL, format="JPEG", quality=50)
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 3, 3))
+
+        # The index is rebuilt from disk:
+        cache = DerivativeCache(self.cache_dir, backend="PIL")
+        self.assertEqual(len(cache), 3)
+        cache.get(self.sample_jpg, THUMBNAIL, format="PNG")
+        self.assertEqual(cache.stats()["hits"], 1)
+
+        # Files which aren't entries are ignored:
+        with open(os.path.join(self.cache_dir, "README"), "w") as f:
+            f.write("Thumbnails")
+        os.mkdir(os.path.join(self.cache_dir, "ab"))
+        with open(os.path.join(self.cache_dir, "ab", "notes.txt"), "w") as f:
+            f.write("Not an entry")
+        self.assertEqual(len(DerivativeCache(self.cache_dir, backend="PIL")), 3)
+
+        # No temporary files are left behind:
+        for dirpath, dirnames, filenames in os.walk(self.cache_dir):
+            self.assertFalse([i for i in filenames if i.startswith(".")])
+
+    def test_source_identity(self):
+        cache = DerivativeCache(self.cache_dir, backend="PIL")
+
+        with open(self.sample_jpg, "rb") as f:
+            data = f.read()
+
+        self.assertEqual(cache.get(data, THUMBNAIL), cache.get(bytearray(data), THUMBNAIL))
+        self.assertEqual(cache.hits, 1)
+
+        copy = os.path.join(self.cache_dir, "copy.jpg")
+        shutil.copy(self.sample_jpg, copy)
+        key = cache.key(copy, THUMBNAIL)
+
+        os.utime(copy, (0, 0))
+        self.assertNotEqual(cache.key(copy, THUMBNAIL), key)
+
+        self.assertEqual(cache.key(pathlib.Path(copy), THUMBNAIL), cache.key(copy, THUMBNAIL))
+        self.assertEqual(cache.get(pathlib.Path(self.sample_jpg), THUMBNAIL),
+                         cache.get(self.sample_jpg, THUMBNAIL))
+
+        # Each backend has its own entries:
+        other_backend = DerivativeCache(self.cache_dir, backend=type("Other", (object, ), {}))
+        self.assertNotEqual(other_backend.key(copy, THUMBNAIL), cache.key(copy, THUMBNAIL))
+
+        cache.hash_content = True
+        self.assertEqual(cache.key(copy, THUMBNAIL), cache.key(self.sample_jpg, THUMBNAIL))
+        self.assertEqual(cache.key(copy, THUMBNAIL), cache.key(data, THUMBNAIL))
+
+    def test_eviction(self):
+        cache = DerivativeCache(self.cache_dir, backend="PIL")
+        size = len(cache.get(self.sample_jpg, THUMBNAIL))
+        cache.clear()
+
+        cache.max_bytes = 2 * size + size // 2
+
+        for quality in (70, 80, 90):
+            cache.get(self.sample_jpg, THUMBNAIL, quality=quality)
+        self.assertEqual(cache.evictions, 1)
+
+        # The oldest entry is gone but the others are still cached:
+        cache.get(self.sample_jpg, THUMBNAIL, quality=90)
+        self.assertEqual(cache.hits, 1)
+        cache.get(self.sample_jpg, THUMBNAIL, quality=70)
+        self.assertEqual(cache.hits, 1)
+
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+
+    def test_describe_operations(self):
+        self.assertEqual(describe_operations([("resize", ((10, 20), ), {"resample": 1})],
+                                             b"jpeg", {"quality": 85}),
+                         describe_operations([["resize", [[10, 20]], {"resample": 1}]],
+                                             "JPEG", {"quality": 85}))
+
+
+if __name__ == "__main__":
+    unittest.main()
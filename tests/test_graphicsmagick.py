@@ -1,11 +1,38 @@
 from __future__ import absolute_import, division, print_function
 
+import ctypes
+import mmap
+import os
+import tempfile
 import unittest
+from io import BytesIO
 
-from NativeImaging.backends.GraphicsMagick import GraphicsMagickImage
+from NativeImaging.backends.GraphicsMagick import (GraphicsMagickImage, MasterCache, WandPool,
+                                                   configure_resources_from_environment,
+                                                   get_resource_limits, get_resource_usage,
+                                                   initialize, set_resource_limits,
+                                                   wand_wrapper)
 
 from .api import ApiConformanceTests
 
+# Importing the backend doesn't load GraphicsMagick; do so now so these tests
+# fail to import if it isn't available:
+initialize()
+
+try:
+    from PIL import Image as PILImage
+except ImportError:
+    PILImage = None
+
+
+def wand_address(wand):
+    """Returns the address of a wand from either binding for comparisons"""
+
+    if hasattr(wand_wrapper, "ffi"):
+        return int(wand_wrapper.ffi.cast("uintptr_t", wand))
+    else:
+        return ctypes.cast(wand, ctypes.c_void_p).value
+
 
 class GraphicsMagickTests(ApiConformanceTests, unittest.TestCase):
     IMAGE_CLASS = GraphicsMagickImage
@@ -22,6 +49,402 @@ class GraphicsMagickTests(ApiConformanceTests, unittest.TestCase):
     def test_rotate_90(*args, **kwargs):
         return super().test_rotate_90(*args, **kwargs)
 
+    def test_open_buffers(self):
+        with open(self.sample_jpg, 'rb') as f:
+            data = f.read()
+
+        for buf in (bytearray(data), memoryview(data), memoryview(bytearray(data))):
+            img = self.IMAGE_CLASS.open(buf)
+            self.assertEqual(img.size, (1024, 680))
+
+    def test_open_mmap(self):
+        with open(self.sample_jpg, 'rb') as f:
+            for access in (mmap.ACCESS_COPY, mmap.ACCESS_READ):
+                m = mmap.mmap(f.fileno(), 0, access=access)
+                img = self.IMAGE_CLASS.open(m)
+                self.assertEqual(img.size, (1024, 680))
+
+                # The mapping is only read by load() and must have been
+                # released by the time it returns:
+                img.load()
+                m.close()
+                self.assertEqual(img.size, (1024, 680))
+                self.assertEqual(len(img.tobytes()), 1024 * 680 * 3)
+
+    def test_encode(self):
+        img = self.open_sample_image()
+        data = img.encode("PNG")
+
+        view = memoryview(data)
+        self.assertEqual(view.tobytes()[:8], b"\x89PNG\r\n\x1a\n")
+
+        with BytesIO() as f:
+            f.write(data)
+            self.assertEqual(len(f.getvalue()), len(data))
+
+        del view
+        data.release()
+
+    def test_output_settings_not_shared(self):
+        img = self.open_sample_image()
+        img.thumbnail((200, 200))
+        default_size = len(img.encode("JPEG"))
+
+        # Copies share the wand but not the quality or format used to encode:
+        other = img.copy()
+        self.assertLess(len(other.encode("JPEG", quality=10)), default_size)
+        self.assertEqual(len(img.encode("JPEG")), default_size)
+
+        other.encode("PNG")
+        self.assertEqual(img.format, "JPEG")
+
+    def test_save_max_bytes(self):
+        img = self.open_sample_image()
+        img.thumbnail((400, 400))
+
+        default_size = len(img.encode("JPEG"))
+        full_size = len(img.encode("JPEG", quality=95))
+
+        output = BytesIO()
+        img.save(output, "JPEG", max_bytes=full_size // 2)
+
+        self.assertLessEqual(len(output.getvalue()), full_size // 2)
+        self.assertLess(img.info["quality"], 95)
+        self.assertGreater(img.info["encode_passes"], 1)
+
+        # The first pass is at the requested quality and is often enough:
+        img.save(BytesIO(), "JPEG", max_bytes=full_size)
+        self.assertEqual((img.info["quality"], img.info["encode_passes"]), (95, 1))
+
+        self.assertRaises(ValueError, img.encode, "JPEG", max_bytes=100)
+
+        # The search doesn't leave its last quality behind on the shared wand:
+        other = img.copy()
+        other.encode("JPEG", max_bytes=full_size // 2)
+        self.assertEqual(len(img.encode("JPEG")), default_size)
+
+    def test_resize_filters(self):
+        img = self.open_sample_image()
+
+        for resample in (self.IMAGE_CLASS.NEAREST, self.IMAGE_CLASS.FAST,
+                         self.IMAGE_CLASS.BILINEAR, self.IMAGE_CLASS.BICUBIC,
+                         self.IMAGE_CLASS.ANTIALIAS):
+            self.assertEqual(img.resize((100, 60), resample).size, (100, 60))
+
+    def test_draft(self):
+        img = self.IMAGE_CLASS.open(self.sample_jpg, lazy=True)
+        img.draft("RGB", (128, 128))
+
+        # libjpeg can only scale by powers of two and must not go below the
+        # requested size:
+        self.assertEqual(img.size, (256, 170))
+
+    def test_draft_after_load(self):
+        img = self.open_sample_image()
+        img.load()
+        img.draft("RGB", (128, 128))
+        self.assertEqual(img.size, (1024, 680))
+
+    def test_lazy_thumbnail(self):
+        img = self.IMAGE_CLASS.open(self.sample_jpg, lazy=True)
+        img.thumbnail((128, 256))
+        self.assertEqual(img.size, (128, 85))
+
+    def test_derivatives(self):
+        img = self.open_sample_image()
+        sizes = [(100, 100), (640, 640), (320, 200)]
+
+        outputs = img.derivatives(sizes, "JPEG", quality=80)
+
+        thumbs = [self.IMAGE_CLASS.open(memoryview(data)) for data in outputs]
+        self.assertEqual([i.size for i in thumbs], [(100, 66), (640, 425), (301, 200)])
+        self.assertEqual(set(i.format for i in thumbs), set(["JPEG"]))
+
+        # The original was never decoded:
+        self.assertIsNotNone(img._source)
+        self.assertEqual(img.size, (1024, 680))
+
+    def test_header_metadata(self):
+        img = self.open_sample_image()
+
+        self.assertEqual(img.size, (1024, 680))
+        self.assertEqual(img.format, "JPEG")
+        self.assertEqual(img.n_frames, 1)
+
+        # None of the above should have required decoding the image:
+        self.assertIsNotNone(img._source)
+
+        img.load()
+        self.assertIsNone(img._source)
+        self.assertEqual(img.size, (1024, 680))
+        self.assertEqual(img.format, "JPEG")
+
+    def make_multipage_tiff(self):
+        """Returns the filename of a TIFF with three pages of different widths"""
+
+        fd, filename = tempfile.mkstemp(suffix=".tif")
+        os.close(fd)
+        self.addCleanup(os.unlink, filename)
+
+        pages = [PILImage.new("RGB", (width, 20)) for width in (30, 40, 50)]
+        pages[0].save(filename, save_all=True, append_images=pages[1:])
+
+        return filename
+
+    @unittest.skipUnless(PILImage, "PIL is needed to create the sample")
+    def test_frames(self):
+        img = self.IMAGE_CLASS.open(self.make_multipage_tiff())
+
+        self.assertEqual((img.n_frames, img.tell()), (3, 0))
+        self.assertEqual([i.size[0] for i in img.frames()], [30, 40, 50])
+        self.assertEqual(img.tell(), 2)
+
+        # Only the current page is decoded:
+        img.seek(1)
+        img.load()
+        self.assertEqual(img.size, (40, 20))
+        self.assertEqual(wand_wrapper.MagickGetNumberImages(img._wand), 1)
+
+        copy = img.copy()
+        img.seek(0)
+        self.assertEqual((img.size, copy.size), ((30, 20), (40, 20)))
+
+        self.assertRaises(EOFError, img.seek, 3)
+
+    @unittest.skipUnless(PILImage, "PIL is needed to create the sample")
+    def test_frames_blob(self):
+        with open(self.make_multipage_tiff(), "rb") as f:
+            img = self.IMAGE_CLASS.open(f)
+
+        self.assertEqual(img.n_frames, 3)
+        img.seek(2)
+        self.assertEqual(img.size, (50, 20))
+
+        thumb = img.copy()
+        thumb.thumbnail((10, 10))
+        img.seek(1)
+        self.assertEqual((img.tell(), img.size, thumb.size), (1, (40, 20), (10, 4)))
+
+    def test_eager_open(self):
+        img = self.IMAGE_CLASS.open(self.sample_jpg, lazy=False)
+        self.assertIsNone(img._source)
+        self.assertEqual(img.size, (1024, 680))
+
+    def test_crop_before_load(self):
+        img = self.open_sample_image()
+
+        cropped = img.crop((32, 32, 96, 96)).crop((16, 16, 48, 32))
+        self.assertEqual(cropped.size, (32, 16))
+        self.assertIsNotNone(cropped._source)
+
+        cropped.load()
+        self.assertEqual(cropped.size, (32, 16))
+
+        # The original is unaffected:
+        self.assertEqual(img.size, (1024, 680))
+
+    def test_open_region(self):
+        img = self.IMAGE_CLASS.open(self.sample_jpg, region=(100, 50, 164, 82))
+        self.assertEqual(img.size, (64, 32))
+        self.assertIsNotNone(img._source)
+
+        img.load()
+        self.assertEqual(img.size, (64, 32))
+
+        with open(self.sample_jpg, "rb") as f:
+            img = self.IMAGE_CLASS.open(f, lazy=False, region=(0, 0, 10, 20))
+        self.assertEqual(img.size, (10, 20))
+
+        self.assertRaises(ValueError, self.IMAGE_CLASS.open, self.sample_jpg,
+                          region=(10, 10, 5, 20))
+
+    def test_crop_after_load(self):
+        img = self.open_sample_image()
+        img.load()
+
+        cropped = img.crop((32, 32, 96, 64))
+        self.assertEqual(cropped.size, (64, 32))
+        self.assertNotEqual(wand_address(cropped._wand), wand_address(img._wand))
+        self.assertEqual(img.size, (1024, 680))
+
+        # Changing the cropped image must not affect the original:
+        original = bytes(img.readpixels(box=(32, 32, 96, 64)))
+        cropped.writepixels(bytes(64 * 32 * 3))
+        self.assertEqual(bytes(img.readpixels(box=(32, 32, 96, 64))), original)
+
+    def test_invalid_crop(self):
+        for lazy in (True, False):
+            img = self.IMAGE_CLASS.open(self.sample_jpg, lazy=lazy)
+
+            # The unloaded path must reject the same boxes as the loaded one:
+            for box in ((10, 10, 5, 20), (-10, 0, 10, 10), (1000, 0, 1100, 10)):
+                self.assertRaises(ValueError, img.crop, box)
+
+            self.assertRaises(ValueError, img.crop((32, 32, 96, 96)).crop, (0, 0, 65, 10))
+
+    def test_subclass(self):
+        class SubclassImage(self.IMAGE_CLASS):
+            pass
+
+        img = SubclassImage.open(self.sample_jpg)
+        self.assertIsInstance(img.copy(), SubclassImage)
+        self.assertIsInstance(img.crop((0, 0, 10, 10)), SubclassImage)
+
+        img.load()
+        self.assertIsInstance(img.copy(), SubclassImage)
+        self.assertIsInstance(img.crop((0, 0, 10, 10)), SubclassImage)
+
+    def test_raw_pixels(self):
+        data = bytes(bytearray(range(4 * 2 * 3)))
+        img = self.IMAGE_CLASS.frombuffer("RGB", (4, 2), memoryview(data), "raw", "RGB", 0, 1)
+
+        self.assertEqual(img.size, (4, 2))
+        self.assertEqual(img.tobytes(), data)
+        self.assertEqual(bytes(img.readpixels(rawmode="RGB", box=(1, 1, 3, 2))), data[15:21])
+
+        buf = bytearray(4 * 2 + 10)
+        self.assertIs(img.readpixels(buf, "L"), buf)
+
+        img.writepixels(b"\xff" * 6, "RGB", box=(0, 0, 2, 1))
+        self.assertEqual(img.tobytes()[:9], b"\xff" * 6 + data[6:9])
+
+        self.assertRaises(ValueError, img.readpixels, bytearray(10))
+        self.assertRaises(ValueError, img.readpixels, rawmode="YCbCr;K")
+        self.assertRaises(ValueError, img.tobytes, "jpeg")
+        self.assertRaises(TypeError, img.readpixels, b"x" * 24)
+
+    def test_array_interface_modes(self):
+        data = bytes(bytearray(range(4 * 2 * 4)))
+
+        for mode, shape in (("L", (2, 4)), ("RGB", (2, 4, 3)), ("RGBA", (2, 4, 4))):
+            length = 4 * 2 * len(mode)
+            img = self.IMAGE_CLASS.frombuffer(mode, (4, 2), data[:length], "raw", mode, 0, 1)
+            interface = img.__array_interface__
+
+            self.assertEqual(interface["shape"], shape)
+            self.assertEqual(bytes(interface["data"]), data[:length])
+
+    def test_strips(self):
+        img = self.open_sample_image()
+        expected = img.tobytes("raw", "RGB")
+
+        strips = [(top, bytes(pixels)) for top, pixels in img.strips(100)]
+
+        self.assertEqual([top for top, pixels in strips], list(range(0, 680, 100)))
+        self.assertEqual(len(strips[-1][1]), 80 * 1024 * 3)
+        self.assertEqual(b"".join(pixels for top, pixels in strips), expected)
+
+    def test_copy_on_write(self):
+        img = self.open_sample_image()
+        img.load()
+
+        copies = [img.copy() for _ in range(3)]
+        for i in copies:
+            self.assertEqual(wand_address(i._wand), wand_address(img._wand))
+
+        thumb = copies.pop()
+        thumb.thumbnail((128, 128))
+        self.assertNotEqual(wand_address(thumb._wand), wand_address(img._wand))
+        self.assertEqual(thumb.size, (128, 85))
+
+        del img
+        for i in copies:
+            self.assertEqual(i.size, (1024, 680))
+
+    def test_wand_pool(self):
+        pool = WandPool(maxsize=1)
+        self.IMAGE_CLASS.wand_pool = pool
+        try:
+            img = self.open_sample_image()
+            img.thumbnail((64, 64))
+            del img
+
+            img = self.open_sample_image()
+            self.assertEqual(img.size, (1024, 680))
+            img.load()
+            del img
+        finally:
+            self.IMAGE_CLASS.wand_pool = None
+            pool.clear()
+
+        stats = pool.stats()
+        self.assertGreater(stats["hits"], 0)
+        self.assertLessEqual(stats["size"], 1)
+        self.assertEqual(len(pool), 0)
+
+    def test_master_cache(self):
+        cache = MasterCache()
+        self.IMAGE_CLASS.master_cache = cache
+        self.addCleanup(setattr, self.IMAGE_CLASS, "master_cache", None)
+
+        first = self.open_sample_image()
+        second = self.open_sample_image()
+        tile = self.IMAGE_CLASS.open(self.sample_jpg, region=(0, 0, 32, 16))
+
+        self.assertEqual((cache.hits, cache.misses, len(cache)), (2, 1, 1))
+        self.assertEqual(wand_address(first._wand), wand_address(second._wand))
+        self.assertEqual(tile.size, (32, 16))
+        self.assertEqual(cache.stats()["bytes"], MasterCache.footprint(first))
+
+        # Callers' changes don't affect the cached image:
+        first.thumbnail((64, 64))
+        self.assertEqual(self.open_sample_image().size, (1024, 680))
+
+        # Nor do the settings they encode with:
+        default_size = len(second.encode("JPEG"))
+        second.encode("PNG")
+        second.encode("JPEG", quality=10)
+        self.assertEqual(len(self.open_sample_image().encode("JPEG")), default_size)
+        self.assertEqual(self.open_sample_image().format, "JPEG")
+
+        # Regions are validated as they are without the cache:
+        self.assertRaises(ValueError, self.IMAGE_CLASS.open, self.sample_jpg,
+                          region=(10, 10, 5, 20))
+
+        cache.max_bytes = cache.stats()["bytes"] - 1
+        cache.clear()
+        self.open_sample_image()
+        self.assertEqual((len(cache), cache.stats()["bytes"]), (0, 0))
+
+    def test_master_cache_eviction(self):
+        cache = MasterCache()
+        self.IMAGE_CLASS.master_cache = cache
+        self.addCleanup(setattr, self.IMAGE_CLASS, "master_cache", None)
+
+        fd, copy = tempfile.mkstemp(suffix=".jpg")
+        os.close(fd)
+        self.addCleanup(os.unlink, copy)
+        with open(self.sample_jpg, "rb") as src, open(copy, "wb") as dst:
+            dst.write(src.read())
+
+        img = self.open_sample_image()
+        cache.max_bytes = MasterCache.footprint(img) + 1
+
+        self.IMAGE_CLASS.open(copy)
+        self.assertEqual((len(cache), cache.evictions), (1, 1))
+
+        # The evicted image remains usable by its copies:
+        self.assertEqual(img.size, (1024, 680))
+        self.assertGreater(len(img.encode("PNG")), 0)
+
+    def test_resource_limits(self):
+        original = get_resource_limits()
+        try:
+            set_resource_limits(threads=1, memory="256MB")
+            limits = get_resource_limits()
+            self.assertEqual(limits["threads"], 1)
+            self.assertEqual(limits["memory"], 256 * 1024 * 1024)
+
+            configure_resources_from_environment({"NATIVEIMAGING_GM_LIMIT_THREADS": "2"})
+            self.assertEqual(get_resource_limits()["threads"], 2)
+
+            self.assertRaises(KeyError, set_resource_limits, bogus=1)
+            self.assertRaises(ValueError, set_resource_limits, memory="lots")
+        finally:
+            set_resource_limits(threads=original["threads"], memory=original["memory"])
+
+        self.assertIn("memory", get_resource_usage())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,133 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+from io import BytesIO
+
+from NativeImaging import get_image_class, probe
+from NativeImaging.headers import ImageInfo
+
+from .api import SAMPLE_DIR
+
+try:
+    PIL_IMAGE_CLASS = get_image_class("PIL")
+except ImportError:
+    PIL_IMAGE_CLASS = None
+
+
+class ProbeSampleTests(unittest.TestCase):
+    def test_samples(self):
+        expected = {
+            "5071384885_c5f331d337_b.jpg": ImageInfo("JPEG", (1024, 680), "RGB", 8, 1, 1),
+            "g8960_ct000508.png": ImageInfo("PNG", (1375, 1024), "RGB", 8, 1, 1),
+            "leaves.jp2": ImageInfo("JPEG2000", (3264, 2177), "RGB", 8, 1, 1),
+        }
+
+        for filename, info in expected.items():
+            self.assertEqual(probe(os.path.join(SAMPLE_DIR, filename)), info)
+
+    def test_sources(self):
+        filename = os.path.join(SAMPLE_DIR, "g8960_ct000508.png")
+
+        with open(filename, "rb") as f:
+            data = f.read()
+            f.seek(0)
+
+            self.assertEqual(probe(f).size, (1375, 1024))
+            self.assertEqual(f.tell(), 0)
+
+        self.assertEqual(probe(memoryview(data)).size, (1375, 1024))
+        self.assertEqual(probe(bytearray(data)).size, (1375, 1024))
+
+    def test_unknown(self):
+        self.assertRaises(IOError, probe, memoryview(b"Not an image"))
+        # Truncated headers are not identified either:
+        self.assertRaises(IOError, probe, memoryview(b"\x89PNG\r\n\x1a\n\x00\x00"))
+
+
+@unittest.skipUnless(PIL_IMAGE_CLASS, 'PIL is not available')
+class ProbeFormatTests(unittest.TestCase):
+    """Checks probe() against PIL for images in each format PIL can write"""
+
+    def assertMatchesPIL(self, img, format, **save_kwargs):
+        output = BytesIO()
+        img.save(output, format=format, **save_kwargs)
+
+        info = probe(memoryview(output.getvalue()))
+        expected = PIL_IMAGE_CLASS.open(output)
+
+        self.assertEqual((info.format, info.size, info.mode, info.n_frames),
+                         (expected.format, img.size, expected.mode,
+                          getattr(expected, "n_frames", 1)))
+
+        return info
+
+    def setUp(self):
+        self.img = PIL_IMAGE_CLASS.new("RGB", (123, 45), "red")
+        self.frames = [PIL_IMAGE_CLASS.new("RGB", (123, 45), color)
+                       for color in ("green", "blue")]
+
+        self.exif = PIL_IMAGE_CLASS.Exif()
+        self.exif[0x0112] = 6
+
+    def test_jpeg(self):
+        for mode in ("RGB", "L", "CMYK"):
+            self.assertMatchesPIL(self.img.convert(mode), "JPEG")
+
+        self.assertMatchesPIL(self.img, "JPEG", progressive=True)
+
+        info = self.assertMatchesPIL(self.img, "JPEG", exif=self.exif)
+        self.assertEqual(info.orientation, 6)
+
+    def test_png(self):
+        for mode in ("RGB", "RGBA", "L", "LA", "P", "1"):
+            self.assertMatchesPIL(self.img.convert(mode), "PNG")
+
+        info = self.assertMatchesPIL(PIL_IMAGE_CLASS.new("I;16", (7, 9)), "PNG")
+        self.assertEqual(info.bits, 16)
+
+        # APNG:
+        info = self.assertMatchesPIL(self.img, "PNG", save_all=True,
+                                     append_images=self.frames, exif=self.exif)
+        self.assertEqual((info.n_frames, info.orientation), (3, 6))
+
+    def test_gif(self):
+        self.assertMatchesPIL(self.img, "GIF")
+        self.assertMatchesPIL(self.img, "GIF", save_all=True, append_images=self.frames)
+
+    def test_tiff(self):
+        for mode in ("RGB", "RGBA", "L", "1", "CMYK"):
+            self.assertMatchesPIL(self.img.convert(mode), "TIFF")
+
+        self.assertMatchesPIL(self.img, "TIFF", compression="tiff_lzw")
+
+        info = self.assertMatchesPIL(self.img, "TIFF", save_all=True,
+                                     append_images=self.frames, exif=self.exif)
+        self.assertEqual((info.n_frames, info.orientation), (3, 6))
+
+    def test_webp(self):
+        try:
+            self.img.save(BytesIO(), format="WEBP")
+        except (IOError, KeyError):
+            self.skipTest("PIL was built without WebP support")
+
+        self.assertMatchesPIL(self.img, "WEBP")
+        self.assertMatchesPIL(self.img, "WEBP", lossless=True)
+        self.assertMatchesPIL(self.img, "WEBP", save_all=True, append_images=self.frames)
+
+    def test_bmp(self):
+        for mode in ("RGB", "P", "1"):
+            self.assertMatchesPIL(self.img.convert(mode), "BMP")
+
+    def test_backend_fallback(self):
+        output = BytesIO()
+        self.img.save(output, format="PPM")
+
+        self.assertRaises(IOError, probe, output)
+
+        info = probe(output, backend=PIL_IMAGE_CLASS)
+        self.assertEqual((info.format, info.size, info.bits), ("PPM", (123, 45), None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import unittest
+
+from NativeImaging.benchmarks.processes import import_times
+
+# The modules which load native libraries:
+BINDING_MODULES = (
+    "NativeImaging.backends.wand_wrapper",
+    "NativeImaging.backends.wand_cffi",
+    "NativeImaging.backends.aware_wrapper",
+)
+
+# Modules which should only be imported once a backend is used:
+DEFERRED_MODULES = BINDING_MODULES + ("PIL", "cffi", "ctypes.util")
+
+
+class LazyImportTests(unittest.TestCase):
+    def assertDeferred(self, statement, modules=DEFERRED_MODULES):
+        imported = import_times(statement)
+
+        self.assertTrue(imported, "No -X importtime output for %r" % statement)
+
+        for module in modules:
+            self.assertNotIn(module, imported, "%r imported %s" % (statement, module))
+
+    def test_package(self):
+        self.assertDeferred("import NativeImaging")
+
+    def test_graphicsmagick(self):
+        self.assertDeferred("import NativeImaging.backends.GraphicsMagick")
+
+    def test_aware(self):
+        self.assertDeferred("import NativeImaging.backends.aware")
+
+    def test_aware_introspection(self):
+        # Only the binding's own names are forwarded to it:
+        self.assertDeferred("from NativeImaging.backends import aware\n"
+                            "assert not hasattr(aware, 'missing')\n"
+                            "from NativeImaging.backends.aware import *",
+                            BINDING_MODULES)
+
+    def test_get_image_class(self):
+        # Only the library's path is checked, which fails if it isn't installed:
+        self.assertDeferred("import NativeImaging\n"
+                            "try:\n"
+                            "    NativeImaging.get_image_class('GraphicsMagick')\n"
+                            "except ImportError:\n"
+                            "    pass",
+                            BINDING_MODULES)
+
+
+@unittest.skipUnless(hasattr(os, "fork") and hasattr(os, "register_at_fork"),
+                     "fork() is not available")
+class ForkTests(unittest.TestCase):
+    def setUp(self):
+        from NativeImaging.backends.GraphicsMagick import GraphicsMagickImage, WandPool
+
+        self.addCleanup(setattr, GraphicsMagickImage, "wand_pool", GraphicsMagickImage.wand_pool)
+        GraphicsMagickImage.wand_pool = WandPool()
+        self.pool = GraphicsMagickImage.wand_pool
+
+    def test_locks_are_reset_in_child(self):
+        from NativeImaging.backends import GraphicsMagick
+
+        # As if another thread was using the pool when the process forked:
+        self.pool._lock.acquire()
+        self.addCleanup(self.pool._lock.release)
+
+        pid = os.fork()
+
+        if not pid:
+            try:
+                usable = (self.pool._lock.acquire(timeout=5)
+                          and GraphicsMagick._initialize_lock.acquire(timeout=5))
+            finally:
+                os._exit(0 if usable else 1)
+
+        self.assertEqual(os.waitpid(pid, 0)[1], 0)
+
+        # The parent's lock is unaffected:
+        self.assertFalse(GraphicsMagick._initialize_lock.locked())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,10 @@
 from __future__ import absolute_import, division, print_function
 
 import unittest
+from io import BytesIO
 
 from NativeImaging import get_image_class
+from NativeImaging.api import fit_size, save_derivatives
 
 from .api import ApiConformanceTests
 
@@ -10,6 +12,16 @@ from .api import ApiConformanceTests
 class PILTests(ApiConformanceTests, unittest.TestCase):
     IMAGE_CLASS = get_image_class("PIL")
 
+    def test_save_derivatives(self):
+        img = self.open_sample_image()
+        sizes = [(100, 100), (640, 640), (320, 200)]
+
+        outputs = save_derivatives(img, sizes, "PNG")
+
+        thumbs = [self.IMAGE_CLASS.open(BytesIO(data)) for data in outputs]
+        self.assertEqual([i.size for i in thumbs], [fit_size(img.size, s) for s in sizes])
+        self.assertEqual(img.size, (1024, 680))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,128 @@
+from __future__ import absolute_import, division, print_function
+
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+from io import BytesIO
+
+from NativeImaging import get_image_class
+from NativeImaging.headers import read_header, sniff_format
+from NativeImaging.routing import ROUTING_TABLE_ENVIRONMENT, AutoImage, Router
+
+from .api import SAMPLE_DIR
+
+try:
+    PIL_IMAGE_CLASS = get_image_class("PIL")
+except ImportError:
+    PIL_IMAGE_CLASS = None
+
+
+class NonSeekable(object):
+    def __init__(self, data):
+        self._data = BytesIO(data)
+
+    def read(self, *args):
+        return self._data.read(*args)
+
+    def seekable(self):
+        return False
+
+
+class SniffingTests(unittest.TestCase):
+    def test_sample_formats(self):
+        expected = {"5071384885_c5f331d337_b.jpg": "JPEG",
+                    "g8960_ct000508.png": "PNG",
+                    "leaves.jp2": "JPEG2000"}
+
+        for filename, format in expected.items():
+            path = os.path.join(SAMPLE_DIR, filename)
+            self.assertEqual(sniff_format(read_header(path)), format)
+
+    def test_signatures(self):
+        self.assertEqual(sniff_format(b"GIF89a\x01\x00"), "GIF")
+        self.assertEqual(sniff_format(b"MM\x00*\x00\x00\x00\x08"), "TIFF")
+        self.assertEqual(sniff_format(b"RIFF\x00\x00\x00\x00WEBPVP8 "), "WEBP")
+        self.assertIsNone(sniff_format(b"RIFF\x00\x00\x00\x00WAVEfmt "))
+        self.assertIsNone(sniff_format(b""))
+
+    def test_read_header_preserves_position(self):
+        fp = BytesIO(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64)
+        fp.seek(0)
+
+        self.assertEqual(sniff_format(read_header(fp)), "PNG")
+        self.assertEqual(fp.tell(), 0)
+
+        self.assertEqual(sniff_format(read_header(memoryview(fp.getvalue()))), "PNG")
+        self.assertIsNone(read_header(NonSeekable(fp.getvalue())))
+
+
+class RouterTests(unittest.TestCase):
+    def setUp(self):
+        self.sample_jpg = os.path.join(SAMPLE_DIR, "5071384885_c5f331d337_b.jpg")
+
+    def test_unavailable_backends_are_skipped(self):
+        router = Router({"JPEG": ["no-such-backend", "PIL"], "*": ["PIL"]})
+
+        if PIL_IMAGE_CLASS is None:
+            self.assertRaises(ImportError, router.backend_for, "JPEG")
+        else:
+            self.assertIs(router.backend_for("JPEG"), PIL_IMAGE_CLASS)
+            self.assertIs(router.backend_for("TIFF"), PIL_IMAGE_CLASS)
+            self.assertIs(router.backend_for(None), PIL_IMAGE_CLASS)
+
+    def test_no_backend(self):
+        router = Router({"*": ["no-such-backend"]})
+        self.assertRaises(ImportError, router.backend_for, "JPEG")
+
+    def test_save_and_load(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, "routing.json")
+
+        Router({"JPEG": ["PIL"]}).save(path)
+        router = Router.load(path)
+
+        self.assertEqual(router.routes["JPEG"], ["PIL"])
+        # Formats missing from the file keep their defaults:
+        self.assertIn("*", router.routes)
+
+        self.assertEqual(Router.from_environment({ROUTING_TABLE_ENVIRONMENT: path}).routes,
+                         router.routes)
+
+    def test_invalid_table(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        path = os.path.join(temp_dir, "routing.json")
+
+        with open(path, "w") as f:
+            f.write("{not JSON")
+
+        for table in (path, os.path.join(temp_dir, "missing.json")):
+            with warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter("always")
+                router = Router.from_environment({ROUTING_TABLE_ENVIRONMENT: table})
+
+            self.assertEqual(router.routes, Router().routes)
+            self.assertEqual([w.category for w in caught], [RuntimeWarning])
+
+    def test_get_image_class(self):
+        self.assertIs(get_image_class("auto"), AutoImage)
+
+    @unittest.skipUnless(PIL_IMAGE_CLASS, 'PIL is not available')
+    def test_open(self):
+        router = Router({"JPEG": ["PIL"], "*": ["PIL"]})
+
+        with open(self.sample_jpg, "rb") as f:
+            data = f.read()
+
+        for source in (self.sample_jpg, BytesIO(data), NonSeekable(data), bytearray(data),
+                       memoryview(data)):
+            img = router.open(source)
+            self.assertEqual(img.format, "JPEG")
+            self.assertEqual(img.size, PIL_IMAGE_CLASS.open(self.sample_jpg).size)
+
+
+if __name__ == '__main__':
+    unittest.main()